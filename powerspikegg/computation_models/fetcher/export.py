@@ -0,0 +1,379 @@
+""" Export the rawdata fetcher cache for training
+
+Scan the matches cached by the rawdata fetcher directly from the Mongo database
+and dump them as compressed columnar chunks, one row per participant. Each
+chunk is a NumPy archive (.npz) holding one array per column, so training jobs
+can load the statistics they need from local files instead of fetching and
+converting matches through the gRPC server.
+
+The cache is split in ranges of _id of similar sizes, scanned in parallel by a
+pool of processes.
+
+Example:
+    bazel run //powerspikegg/computation_models/fetcher:export -- \\
+        --export_directory /tmp/powerspikegg/export --restrict_patch 7.6
+
+"""
+
+import gflags
+import glob
+import logging
+import multiprocessing
+import numpy
+import os
+import pymongo
+import re
+import sys
+
+from collections import OrderedDict
+
+from powerspikegg.computation_models.fetcher import fetcher
+from powerspikegg.rawdata.fetcher import cache  # pylint: disable=unused-import
+from powerspikegg.rawdata.fetcher import converter
+from powerspikegg.rawdata.public import constants_pb2
+
+
+FLAGS = gflags.FLAGS
+
+gflags.DEFINE_string("export_directory", "/tmp/powerspikegg/export",
+                     "Directory in which the chunks are written.")
+gflags.DEFINE_integer("export_workers", multiprocessing.cpu_count(),
+                      "Number of processes scanning the cache.")
+gflags.DEFINE_integer("export_ranges_per_worker", 4,
+                      "Number of _id ranges scanned by each process. More "
+                      "ranges balance better the load between processes.")
+gflags.DEFINE_integer("export_chunk_size", 100000,
+                      "Maximum number of participants per chunk.")
+gflags.DEFINE_string("restrict_patch", None,
+                     "Restrict exported matches per patch (e.g. 7.6). If not "
+                     "provided, any patch is exported.")
+
+
+# Columns of the exported chunks and their type. Statistics are stored as
+# float32, ready to be fed to the models.
+COLUMNS = OrderedDict([
+    ("match_id", numpy.int64),
+    ("participant_id", numpy.int8),
+    ("region", "U4"),
+    ("patch", "U8"),
+    ("league", numpy.int8),
+    ("winner", numpy.bool_),
+] + [(label, numpy.float32) for label in fetcher.STATISTIC_LABELS])
+
+# Fields of the Riot API ParticipantStats DTO matching the statistics labels.
+_STATISTIC_FIELDS = OrderedDict([
+    ("kills", "kills"),
+    ("deaths", "deaths"),
+    ("assists", "assists"),
+    ("minions_killed", "minionsKilled"),
+    ("neutral_minions_killed", "neutralMinionsKilled"),
+    ("total_damages", "totalDamageDealt"),
+    ("total_heal", "totalHeal"),
+    ("wards_placed", "wardsPlaced"),
+    ("tower_kills", "towerKills"),
+    ("champion_level", "champLevel"),
+])
+
+# Only fetch from the database the fields used by the export.
+_PROJECTION = dict(
+    [(key, True) for key in [
+        "matchId",
+        "region",
+        "matchVersion",
+        "teams.teamId",
+        "teams.winner",
+        "participants.participantId",
+        "participants.teamId",
+        "participants.championId",
+        "participants.highestAchievedSeasonTier",
+        "participants.timeline.lane",
+        "participants.timeline.role",
+    ]] + [("participants.stats.%s" % field, True)
+          for field in _STATISTIC_FIELDS.values()])
+
+
+def get_patch(match_version):
+    """Extract the patch (major and minor version) of a game version."""
+    return ".".join(match_version.split(".")[:2])
+
+
+def participant_rows(json_match, league=None, champion=0):
+    """Convert a cached match to the exported rows.
+
+    Parameters:
+        json_match: a JSON formated as the Riot API's MatchDetail DTO.
+        league: Optional restriction onto the participants league.
+        champion: Optional restriction onto the participants champion id.
+    Returns:
+        A generator of dictionaries, one per participant, indexed by columns.
+    """
+    winners = dict((team["teamId"], team["winner"])
+                   for team in json_match["teams"])
+    patch = get_patch(json_match["matchVersion"])
+
+    for participant in json_match["participants"]:
+        participant_league = constants_pb2.League.Value(
+            participant["highestAchievedSeasonTier"])
+        if league is not None and league != participant_league:
+            continue
+        if champion and champion != participant["championId"]:
+            continue
+
+        row = dict(
+            match_id=json_match["matchId"],
+            participant_id=participant["participantId"],
+            region=json_match["region"],
+            patch=patch,
+            league=participant_league,
+            winner=winners[participant["teamId"]],
+            champion_id=participant["championId"],
+            role=converter.get_role(participant["timeline"]),
+        )
+        for label, field in _STATISTIC_FIELDS.items():
+            row[label] = participant["stats"][field]
+
+        yield row
+
+
+class ChunkWriter:
+    """Accumulates rows and writes them as compressed columnar chunks."""
+
+    def __init__(self, path_prefix, chunk_size):
+        """Constructor.
+
+        Parameters:
+            path_prefix: prefix of the chunk files paths.
+            chunk_size: maximum number of rows per chunk.
+        """
+        self.path_prefix = path_prefix
+        self.chunk_size = chunk_size
+        self.paths = []
+        self.row_count = 0
+        self._columns = dict((column, []) for column in COLUMNS)
+
+    def append(self, row):
+        """Add a row, writing a chunk once enough rows are accumulated."""
+        for column, values in self._columns.items():
+            values.append(row[column])
+        self.row_count += 1
+
+        if len(self._columns["match_id"]) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        """Write the accumulated rows as a chunk."""
+        if not self._columns["match_id"]:
+            return
+
+        path = "%s-%05d.npz" % (self.path_prefix, len(self.paths))
+        arrays = dict((column, numpy.array(values, dtype=COLUMNS[column]))
+                      for column, values in self._columns.items())
+        numpy.savez_compressed(path, **arrays)
+
+        self.paths.append(path)
+        for values in self._columns.values():
+            del values[:]
+
+
+def create_mongo_filter(league=None, champion=0, patch=None):
+    """Create the Mongo DB filter selecting the matches to export.
+
+    As in the fetcher aggregator, this only ensures one of the participants
+    matches the restrictions. Participants are filtered by participant_rows.
+    """
+    mongo_filter = {}
+
+    matcher = {}
+    if league is not None:
+        matcher["highestAchievedSeasonTier"] = constants_pb2.League.Name(
+            league)
+    if champion:
+        matcher["championId"] = champion
+    if matcher:
+        mongo_filter["participants"] = {"$elemMatch": matcher}
+
+    if patch:
+        mongo_filter["matchVersion"] = {"$regex": "^%s\\." % re.escape(patch)}
+
+    return mongo_filter
+
+
+def compute_id_ranges(collection, mongo_filter, range_count):
+    """Split the matching documents in _id ranges of similar sizes.
+
+    Boundaries are taken from the quantiles of a random sample of _id.
+
+    Returns:
+        A list of (lower, upper) bounds, where lower is inclusive and upper
+        exclusive. None means the range is unbounded on this side.
+    """
+    sampled_ids = sorted(document["_id"] for document in collection.aggregate([
+        {"$match": mongo_filter},
+        {"$sample": {"size": range_count * 100}},
+        {"$project": {"_id": True}},
+    ]))
+
+    boundaries = []
+    if sampled_ids:
+        step = len(sampled_ids) * 1. / range_count
+        boundaries = sorted(set(sampled_ids[int(i * step)]
+                                for i in range(1, range_count)))
+
+    boundaries = [None] + boundaries + [None]
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+
+def iter_range_rows(collection, mongo_filter, lower, upper, league=None,
+                    champion=0):
+    """Iterate over the rows of the matches of an _id range.
+
+    Parameters:
+        collection: the collection of the cached matches.
+        mongo_filter: Mongo DB filter, as create_mongo_filter.
+        lower: inclusive lower bound of the range, or None.
+        upper: exclusive upper bound of the range, or None.
+        league: Optional restriction onto the participants league.
+        champion: Optional restriction onto the participants champion id.
+    Returns:
+        A generator of rows, as participant_rows.
+    """
+    selector = dict(mongo_filter)
+    id_range = {}
+    if lower is not None:
+        id_range["$gte"] = lower
+    if upper is not None:
+        id_range["$lt"] = upper
+    if id_range:
+        selector["_id"] = id_range
+
+    for json_match in collection.find(selector, projection=_PROJECTION):
+        for row in participant_rows(json_match, league, champion):
+            yield row
+
+
+def export_range(task):
+    """Export the matches of an _id range. Run in a pool of processes.
+
+    Parameters:
+        task: tuple of the cache address, database name, Mongo DB filter,
+            league and champion restrictions, range bounds, chunks path prefix
+            and chunk size.
+    Returns:
+        The number of exported rows and the paths of the written chunks.
+    """
+    (address, database_name, mongo_filter, league, champion, lower, upper,
+     path_prefix, chunk_size) = task
+
+    # Clients must not be shared between processes.
+    client = pymongo.MongoClient("mongodb://%s/" % address)
+    try:
+        writer = ChunkWriter(path_prefix, chunk_size)
+        for row in iter_range_rows(client[database_name].matches,
+                                   mongo_filter, lower, upper, league,
+                                   champion):
+            writer.append(row)
+        writer.flush()
+    finally:
+        client.close()
+
+    return writer.row_count, writer.paths
+
+
+def exported_chunk_paths(directory):
+    """Get the sorted paths of the chunks written by the export."""
+    return sorted(glob.glob(os.path.join(directory, "*.npz")))
+
+
+def load_chunk(path, columns=None):
+    """Load a chunk written by the export.
+
+    Parameters:
+        path: path of the chunk.
+        columns: Optional list of columns to load. Defaults to all columns.
+    Returns:
+        A dictionary mapping columns to arrays.
+    """
+    if columns is None:
+        columns = list(COLUMNS)
+
+    with numpy.load(path) as chunk:
+        return dict((column, chunk[column]) for column in columns)
+
+
+def iter_exported_chunks(directory, columns=None):
+    """Iterate over the chunks written by the export.
+
+    Parameters:
+        directory: directory containing the chunks.
+        columns: Optional list of columns to load. Defaults to all columns.
+    Returns:
+        A generator of dictionaries mapping columns to arrays.
+    """
+    for path in exported_chunk_paths(directory):
+        yield load_chunk(path, columns)
+
+
+def load_exported_features(directory, columns=None):
+    """Load and concatenate the chunks written by the export.
+
+    Parameters:
+        directory: directory containing the chunks.
+        columns: Optional list of columns to load. Defaults to all columns.
+    Returns:
+        A dictionary mapping columns to arrays.
+    """
+    if columns is None:
+        columns = list(COLUMNS)
+
+    chunks = list(iter_exported_chunks(directory, columns))
+    return dict(
+        (column, numpy.concatenate([chunk[column] for chunk in chunks])
+         if chunks else numpy.array([], dtype=COLUMNS[column]))
+        for column in columns)
+
+
+def main():
+    league = None
+    if FLAGS.restrict_league is not None:
+        league = constants_pb2.League.Value(FLAGS.restrict_league)
+    mongo_filter = create_mongo_filter(
+        league, FLAGS.restrict_champion, FLAGS.restrict_patch)
+
+    if not os.path.isdir(FLAGS.export_directory):
+        os.makedirs(FLAGS.export_directory)
+
+    client = pymongo.MongoClient(
+        "mongodb://%s/" % FLAGS.rawdata_cache_server_address)
+    try:
+        id_ranges = compute_id_ranges(
+            client[FLAGS.rawdata_cache_database_name].matches, mongo_filter,
+            FLAGS.export_workers * FLAGS.export_ranges_per_worker)
+    finally:
+        client.close()
+
+    tasks = [(FLAGS.rawdata_cache_server_address,
+              FLAGS.rawdata_cache_database_name, mongo_filter, league,
+              FLAGS.restrict_champion, lower, upper,
+              os.path.join(FLAGS.export_directory, "part-%05d" % index),
+              FLAGS.export_chunk_size)
+             for index, (lower, upper) in enumerate(id_ranges)]
+
+    pool = multiprocessing.Pool(FLAGS.export_workers)
+    try:
+        total_rows = total_chunks = 0
+        for row_count, paths in pool.imap_unordered(export_range, tasks):
+            total_rows += row_count
+            total_chunks += len(paths)
+            logging.info("Exported %d participants in %d chunks.",
+                         row_count, len(paths))
+    finally:
+        pool.close()
+        pool.join()
+
+    print("%d participants exported in %d chunks to %s." % (
+        total_rows, total_chunks, FLAGS.export_directory))
+
+
+if __name__ == '__main__':
+    FLAGS(sys.argv)
+    main()
@@ -0,0 +1,98 @@
+import numpy
+import shutil
+import tempfile
+import unittest
+
+from powerspikegg.computation_models.fetcher import export
+from powerspikegg.computation_models.fetcher import fetcher
+from powerspikegg.rawdata.public import constants_pb2
+from third_party.python.riotwatcher.rwmock import SAMPLES
+
+
+class TestCacheExport(unittest.TestCase):
+    """Tests the cache export converts and stores the participants."""
+
+    def setUp(self):
+        """Create a directory receiving the chunks."""
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """Remove the chunks."""
+        shutil.rmtree(self.directory)
+
+    def test_participant_rows(self):
+        """Tests a match is converted to one row per participant."""
+        json_match = SAMPLES["match"]
+        rows = list(export.participant_rows(json_match))
+
+        self.assertEqual(len(rows), len(json_match["participants"]))
+        for row, participant in zip(rows, json_match["participants"]):
+            self.assertEqual(set(row), set(export.COLUMNS))
+            self.assertEqual(row["match_id"], json_match["matchId"])
+            self.assertEqual(row["patch"], "6.23")
+            self.assertEqual(row["kills"], participant["stats"]["kills"])
+            self.assertEqual(row["total_damages"],
+                             participant["stats"]["totalDamageDealt"])
+            self.assertEqual(row["champion_id"], participant["championId"])
+
+    def test_participant_filtering(self):
+        """Tests participants are filtered by league and champion."""
+        json_match = SAMPLES["match"]
+        participant = json_match["participants"][0]
+        league = constants_pb2.League.Value(
+            participant["highestAchievedSeasonTier"])
+
+        rows = list(export.participant_rows(json_match, league=league))
+        self.assertTrue(rows)
+        self.assertTrue(all(row["league"] == league for row in rows))
+
+        rows = list(export.participant_rows(
+            json_match, champion=participant["championId"]))
+        self.assertTrue(rows)
+        self.assertTrue(all(row["champion_id"] == participant["championId"]
+                            for row in rows))
+
+    def test_chunks_round_trip(self):
+        """Tests written chunks are loaded back column by column."""
+        rows = list(export.participant_rows(SAMPLES["match"]))
+        writer = export.ChunkWriter(self.directory + "/part", 3)
+        for row in rows:
+            writer.append(row)
+        writer.flush()
+
+        self.assertEqual(writer.row_count, len(rows))
+        self.assertEqual(len(writer.paths), (len(rows) + 2) // 3)
+
+        features = export.load_exported_features(
+            self.directory, ["kills", "role"])
+        self.assertEqual(set(features), set(["kills", "role"]))
+        self.assertEqual(features["kills"].dtype, numpy.float32)
+        self.assertEqual(list(features["kills"]),
+                         [row["kills"] for row in rows])
+
+    def test_empty_export(self):
+        """Tests loading an empty export returns empty columns."""
+        features = export.load_exported_features(self.directory)
+        self.assertEqual(len(features["match_id"]), 0)
+
+    def test_mongo_filter(self):
+        """Tests the restrictions are converted to a Mongo DB filter."""
+        self.assertEqual(export.create_mongo_filter(), {})
+
+        mongo_filter = export.create_mongo_filter(
+            constants_pb2.GOLD, 42, "7.6")
+        self.assertEqual(mongo_filter["participants"], {"$elemMatch": {
+            "highestAchievedSeasonTier": "GOLD",
+            "championId": 42,
+        }})
+        self.assertEqual(mongo_filter["matchVersion"],
+                         {"$regex": "^7\\.6\\."})
+
+    def test_columns_follow_statistic_labels(self):
+        """Tests every statistic mapped for training is exported."""
+        for label in fetcher.STATISTIC_LABELS:
+            self.assertIn(label, export.COLUMNS)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,210 @@
+""" Memory-mapped store of participant features
+
+Materialize the participants statistics as a float32 matrix stored in a .npy
+file, one row per participant and one column per statistic label (see
+fetcher.STATISTIC_LABELS). The matrix is memory-mapped when the store is
+opened, so training batches are read from the file rather than Python objects
+rebuilt at every step. The batches of contiguous rows are read through slices
+of the mapping, the others by indexing the selected rows. Either way, the
+inputs and answers of a batch are copied once, to split the label column
+from the other ones.
+
+A small index is stored next to the matrix: the label of each column in
+index.json, and the league, champion, role and winner flag of each row as
+separate arrays, used to select the training rows.
+
+Example:
+    bazel run //powerspikegg/computation_models/fetcher:feature_store -- \\
+        --export_directory /tmp/powerspikegg/export \\
+        --feature_store /tmp/powerspikegg/features
+
+"""
+
+import gflags
+import json
+import numpy
+import os
+import sys
+
+from powerspikegg.computation_models.fetcher import export
+from powerspikegg.computation_models.fetcher import fetcher
+from powerspikegg.rawdata.public import constants_pb2
+
+
+FLAGS = gflags.FLAGS
+
+gflags.DEFINE_string("feature_store", None,
+                     "Directory of the memory-mapped feature store.")
+
+_STATISTICS_FILENAME = "statistics.npy"
+_INDEX_FILENAME = "index.json"
+
+# Per row metadata stored along the statistics, and their type.
+_METADATA = [
+    ("league", numpy.int8),
+    ("champion_id", numpy.int32),
+    ("role", numpy.int8),
+    ("winner", numpy.bool_),
+]
+
+
+def create_feature_store(directory, chunks, labels=None):
+    """Materialize exported chunks as a feature store.
+
+    Parameters:
+        directory: directory in which the store is written.
+        chunks: callable returning an iterable of dictionaries mapping columns
+            to arrays, as export.iter_exported_chunks. It is called twice: the
+            matrix size is computed before writing the rows.
+        labels: Optional list of statistic labels stored as columns. Defaults
+            to fetcher.STATISTIC_LABELS.
+    Returns:
+        The opened FeatureStore.
+    """
+    if labels is None:
+        labels = list(fetcher.STATISTIC_LABELS)
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+
+    row_count = sum(len(chunk[labels[0]]) for chunk in chunks())
+
+    statistics = numpy.lib.format.open_memmap(
+        os.path.join(directory, _STATISTICS_FILENAME), mode="w+",
+        dtype=numpy.float32, shape=(row_count, len(labels)))
+    metadata = dict(
+        (name, numpy.lib.format.open_memmap(
+            os.path.join(directory, "%s.npy" % name), mode="w+",
+            dtype=dtype, shape=(row_count,)))
+        for name, dtype in _METADATA)
+
+    offset = 0
+    for chunk in chunks():
+        size = len(chunk[labels[0]])
+        for column, label in enumerate(labels):
+            statistics[offset:offset + size, column] = chunk[label]
+        for name, _ in _METADATA:
+            metadata[name][offset:offset + size] = chunk[name]
+        offset += size
+
+    statistics.flush()
+    for array in metadata.values():
+        array.flush()
+    del statistics, metadata
+
+    with open(os.path.join(directory, _INDEX_FILENAME), "w") as f:
+        json.dump({"labels": labels, "rows": row_count}, f)
+
+    return FeatureStore(directory)
+
+
+class FeatureStore:
+    """Read-only access to a memory-mapped feature store."""
+
+    def __init__(self, directory):
+        """Constructor. Memory-map the store.
+
+        Parameters:
+            directory: directory containing the store.
+        """
+        self.directory = directory
+
+        with open(os.path.join(directory, _INDEX_FILENAME)) as f:
+            index = json.load(f)
+        self.labels = index["labels"]
+
+        self.statistics = numpy.load(
+            os.path.join(directory, _STATISTICS_FILENAME), mmap_mode="r")
+        self.metadata = dict(
+            (name, numpy.load(os.path.join(directory, "%s.npy" % name),
+                              mmap_mode="r"))
+            for name, _ in _METADATA)
+
+    def __len__(self):
+        """Number of rows in the store."""
+        return self.statistics.shape[0]
+
+    def column(self, label):
+        """Get the column index of a statistic label.
+
+        Raises:
+            ValueError: If the label is not stored.
+        """
+        return self.labels.index(label)
+
+    def rows(self, league=None, champion=0, role=None, winner=None):
+        """Select the rows matching restrictions.
+
+        Parameters:
+            league: Optional restriction onto the league.
+            champion: Optional restriction onto the champion id.
+            role: Optional restriction onto the role.
+            winner: Optional restriction onto the participants team result.
+        Returns:
+            A sorted array of row indices.
+        """
+        mask = numpy.ones(len(self), dtype=numpy.bool_)
+        if league is not None:
+            mask &= self.metadata["league"] == league
+        if champion:
+            mask &= self.metadata["champion_id"] == champion
+        if role is not None:
+            mask &= self.metadata["role"] == role
+        if winner is not None:
+            mask &= self.metadata["winner"] == winner
+        return numpy.flatnonzero(mask)
+
+    def batches(self, label, batch_size, rows=None):
+        """Iterate over batches of inputs and answers to train a label.
+
+        The batches whose rows are contiguous (e.g. all of them if no rows are
+        selected) are sliced from the memory-mapped matrix instead of being
+        gathered row by row.
+
+        Parameters:
+            label: statistic label to predict.
+            batch_size: maximum number of rows per batch.
+            rows: Optional array of row indices, as returned by rows().
+        Returns:
+            A generator of (inputs, answers) float32 arrays, of respective
+            shape (batch, labels - 1) and (batch, 1).
+        """
+        column = self.column(label)
+        row_count = len(self) if rows is None else len(rows)
+
+        for start in range(0, row_count, batch_size):
+            if rows is None:
+                batch = self.statistics[start:start + batch_size]
+            else:
+                batch_rows = rows[start:start + batch_size]
+                first, last = batch_rows[0], batch_rows[-1]
+                if last - first + 1 == len(batch_rows):
+                    batch = self.statistics[first:last + 1]
+                else:
+                    batch = self.statistics[batch_rows]
+
+            yield fetcher.leave_one_out(batch, column)
+
+
+def training_rows(store):
+    """Select the rows used for training, as fetcher.fetch_and_sanitize does.
+
+    Only the winners are kept, restricted by the restrict_league and
+    restrict_champion flags.
+    """
+    league = None
+    if FLAGS.restrict_league is not None:
+        league = constants_pb2.League.Value(FLAGS.restrict_league)
+    return store.rows(league=league, champion=FLAGS.restrict_champion,
+                      winner=True)
+
+
+def main():
+    store = create_feature_store(
+        FLAGS.feature_store,
+        lambda: export.iter_exported_chunks(FLAGS.export_directory))
+    print("%d participants stored in %s." % (len(store), FLAGS.feature_store))
+
+
+if __name__ == '__main__':
+    FLAGS(sys.argv)
+    main()
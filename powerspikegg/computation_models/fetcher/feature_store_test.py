@@ -0,0 +1,115 @@
+import numpy
+import shutil
+import tempfile
+import unittest
+
+from powerspikegg.computation_models.fetcher import export
+from powerspikegg.computation_models.fetcher import feature_store
+from powerspikegg.computation_models.fetcher import fetcher
+from powerspikegg.rawdata.public import constants_pb2
+from third_party.python.riotwatcher.rwmock import SAMPLES
+
+
+def _create_chunks():
+    """Creates two exported chunks from the match sample."""
+    rows = list(export.participant_rows(SAMPLES["match"]))
+    chunks = []
+    for chunk_rows in (rows[:4], rows[4:]):
+        chunks.append(dict(
+            (column, numpy.array([row[column] for row in chunk_rows],
+                                 dtype=dtype))
+            for column, dtype in export.COLUMNS.items()))
+    return rows, chunks
+
+
+class TestFeatureStore(unittest.TestCase):
+    """Tests the feature store materializes and slices the statistics."""
+
+    def setUp(self):
+        """Create a feature store from the match sample."""
+        self.directory = tempfile.mkdtemp()
+        self.rows, chunks = _create_chunks()
+        self.store = feature_store.create_feature_store(
+            self.directory, lambda: chunks)
+
+    def tearDown(self):
+        """Remove the feature store."""
+        shutil.rmtree(self.directory)
+
+    def test_materialization(self):
+        """Tests every participant is stored as a float32 row."""
+        store = feature_store.FeatureStore(self.directory)
+
+        self.assertEqual(len(store), len(self.rows))
+        self.assertEqual(store.labels, fetcher.STATISTIC_LABELS)
+        self.assertEqual(store.statistics.dtype, numpy.float32)
+        self.assertIsInstance(store.statistics, numpy.memmap)
+
+        kills = store.statistics[:, store.column("kills")]
+        self.assertEqual(list(kills), [row["kills"] for row in self.rows])
+
+    def test_rows_selection(self):
+        """Tests rows are selected from the metadata index."""
+        winners = self.store.rows(winner=True)
+        self.assertEqual(list(winners), [
+            index for index, row in enumerate(self.rows) if row["winner"]])
+
+        champion = self.rows[0]["champion_id"]
+        self.assertEqual(list(self.store.rows(champion=champion)), [
+            index for index, row in enumerate(self.rows)
+            if row["champion_id"] == champion])
+
+        self.assertEqual(
+            len(self.store.rows(league=constants_pb2.CHALLENGER,
+                                winner=False)),
+            len([row for row in self.rows
+                 if row["league"] == constants_pb2.CHALLENGER and
+                 not row["winner"]]))
+
+    def test_batches(self):
+        """Tests batches split the inputs and the answers of a label."""
+        column = self.store.column("deaths")
+        batches = list(self.store.batches("deaths", 3))
+
+        self.assertEqual(len(batches), (len(self.rows) + 2) // 3)
+        inputs = numpy.concatenate([data for data, _ in batches])
+        answers = numpy.concatenate([answer for _, answer in batches])
+
+        self.assertEqual(inputs.shape,
+                         (len(self.rows), len(fetcher.STATISTIC_LABELS) - 1))
+        self.assertEqual(answers.shape, (len(self.rows), 1))
+        numpy.testing.assert_array_equal(
+            answers[:, 0], self.store.statistics[:, column])
+        numpy.testing.assert_array_equal(
+            inputs, numpy.delete(self.store.statistics, column, axis=1))
+
+    def test_batches_on_rows(self):
+        """Tests batches only contain the selected rows."""
+        rows = self.store.rows(winner=True)
+        answers = numpy.concatenate(
+            [answer for _, answer in self.store.batches("kills", 2, rows)])
+
+        numpy.testing.assert_array_equal(
+            answers[:, 0],
+            self.store.statistics[rows, self.store.column("kills")])
+
+    def test_batches_on_contiguous_rows(self):
+        """Tests the batches sliced from contiguous rows and the batches
+        gathered from scattered rows contain the selected rows."""
+        all_rows = numpy.arange(len(self.store))
+        scattered_rows = numpy.array([0, 1, 2, 4, len(self.store) - 1])
+        column = self.store.column("kills")
+
+        for rows in (all_rows, scattered_rows):
+            batches = list(self.store.batches("kills", 3, rows))
+            answers = numpy.concatenate([answer for _, answer in batches])
+            numpy.testing.assert_array_equal(
+                answers[:, 0], self.store.statistics[rows, column])
+            inputs = numpy.concatenate([data for data, _ in batches])
+            numpy.testing.assert_array_equal(
+                inputs, numpy.delete(self.store.statistics[rows], column,
+                                     axis=1))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -24,6 +24,23 @@ gflags.DEFINE_integer("restrict_champion", 0,
                       "provided, any champion is fetched.")
 
 
+# Labels of the statistics mapped by _map_stats, in the same order.
+STATISTIC_LABELS = [
+    "kills",
+    "deaths",
+    "assists",
+    "minions_killed",
+    "neutral_minions_killed",
+    "total_damages",
+    "total_heal",
+    "wards_placed",
+    "tower_kills",
+    "champion_level",
+    "champion_id",
+    "role",
+]
+
+
 class ComputationFetcher:
     """Utility to fetch the matches."""
 
@@ -76,6 +93,39 @@ def _map_stats(participant_pb):
     ]
 
 
+def participant_statistics(participant_pb):
+    """Get the statistics of a participant, ordered as STATISTIC_LABELS."""
+    return [s["value"] for s in _map_stats(participant_pb)]
+
+
+def _other_columns(column_count):
+    """Index matrix whose row i lists every column but the i-th one."""
+    columns = numpy.arange(column_count)
+    return numpy.array([columns[columns != i] for i in columns])
+
+
+def leave_one_out(statistics, label_index):
+    """Split a statistics matrix into the inputs and targets of a label.
+
+    Parameters:
+        statistics: (participants x statistics) matrix, with columns ordered
+            as STATISTIC_LABELS.
+        label_index: column of the label to predict.
+    Returns:
+        A tuple of contiguous float32 arrays: the inputs, made of all other
+        columns, of shape (participants, statistics - 1) and the targets of
+        shape (participants, 1).
+    """
+    statistics = numpy.asarray(statistics, dtype=numpy.float32)
+    mask = numpy.ones(statistics.shape[1], dtype=numpy.bool_)
+    mask[label_index] = False
+
+    inputs = numpy.ascontiguousarray(statistics[:, mask])
+    targets = numpy.ascontiguousarray(
+        statistics[:, label_index:label_index + 1])
+    return inputs, targets
+
+
 def _prepare_data(labelled_stats):
     """Create a tensorflow friendly data structure.
 
@@ -85,18 +135,15 @@ def _prepare_data(labelled_stats):
         Exemple:
             [{'label': 'kill', 'expected': 10, 'data': [1, 2, 3, ...]}, ...]
     """
-    raw_stats = [s["value"] for s in labelled_stats]
+    raw_stats = numpy.array([s["value"] for s in labelled_stats])
 
-    result = []
-    for index, labelled_stat in enumerate(labelled_stats):
-        result.append(dict(
-            label=labelled_stat["label"],
-            expected=raw_stats[index],
-            data=numpy.array([v for i, v in enumerate(raw_stats)
-                              if i != index])
-        ))
+    # Build every "all other stats" vector at once.
+    others = raw_stats[_other_columns(len(raw_stats))]
 
-    return result
+    return [dict(label=labelled_stat["label"],
+                 expected=raw_stats[index],
+                 data=others[index])
+            for index, labelled_stat in enumerate(labelled_stats)]
 
 
 def _is_valid_participant(participant_pb):
@@ -122,6 +169,50 @@ def _sanitize_match(match_pb):
             yield _prepare_data(_map_stats(participant_pb))
 
 
+def fetch_statistics(sample_size):
+    """Fetch random matches and build the statistics matrix of the winners.
+
+    Returns:
+        A float32 matrix with one row per valid winner and one column per
+        label of STATISTIC_LABELS.
+    """
+    fetcher = ComputationFetcher(FLAGS.fetcher_address)
+
+    rows = []
+    for match_pb in fetcher.fetch_random_sample(sample_size):
+        teams = match_pb.detail.teams
+        winners = teams[0] if teams[0].winner else teams[1]
+        rows.extend(participant_statistics(participant_pb)
+                    for participant_pb in winners.participants
+                    if _is_valid_participant(participant_pb))
+
+    return numpy.array(rows, dtype=numpy.float32).reshape(
+        len(rows), len(STATISTIC_LABELS))
+
+
+def fetch_statistics_batch(batch_size):
+    """Fetch random matches until batch_size winners statistics are built.
+
+    Returns:
+        A float32 matrix of at most batch_size rows, as fetch_statistics. It
+        has less rows if a sample brings no valid winner (e.g. the cache is
+        empty or no match fulfills the restrictions).
+    """
+    # Winning teams have 5 participants.
+    sample_size = max(1, -(-batch_size // 5))
+
+    batches = [numpy.zeros((0, len(STATISTIC_LABELS)), dtype=numpy.float32)]
+    row_count = 0
+    while row_count < batch_size:
+        statistics = fetch_statistics(sample_size)
+        if not len(statistics):
+            break
+        batches.append(statistics)
+        row_count += len(statistics)
+
+    return numpy.concatenate(batches)[:batch_size]
+
+
 def fetch_and_sanitize(sample_size):
     """Fetch and sanitize random matches.
 
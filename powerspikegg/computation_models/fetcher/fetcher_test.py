@@ -108,6 +108,50 @@ class TestComputationFetcher(unittest.TestCase):
         results = fetcher.fetch_and_sanitize(10)
         self.assertEqual(len(list(results)), len(labels))
 
+    def test_leave_one_out(self):
+        """Tests inputs and targets are split from the statistics matrix."""
+        statistics = numpy.arange(12, dtype=numpy.float32).reshape(3, 4)
+
+        inputs, targets = fetcher.leave_one_out(statistics, 1)
+        self.assertTrue(inputs.flags["C_CONTIGUOUS"])
+        self.assertTrue(targets.flags["C_CONTIGUOUS"])
+        self.assertEqual(inputs.dtype, numpy.float32)
+        numpy.testing.assert_array_equal(
+            inputs, [[0, 2, 3], [4, 6, 7], [8, 10, 11]])
+        numpy.testing.assert_array_equal(targets, [[1], [5], [9]])
+
+    def test_fetch_statistics(self):
+        """Tests the winners statistics are fetched as a matrix."""
+        match_pb = _create_mock_match()
+        fetcher.ComputationFetcher.stub = mock.Mock()
+        fetcher.ComputationFetcher.stub.CacheQuery.return_value = [match_pb]
+
+        statistics = fetcher.fetch_statistics(10)
+        self.assertEqual(statistics.shape,
+                         (5, len(fetcher.STATISTIC_LABELS)))
+
+        winners = match_pb.detail.teams[1].participants
+        for row, participant_pb in zip(statistics, winners):
+            self.assertEqual(list(row), [
+                s["value"] for s in fetcher._map_stats(participant_pb)])
+
+    def test_fetch_statistics_batch(self):
+        """Tests samples are fetched until the batch is full."""
+        fetcher.ComputationFetcher.stub = mock.Mock()
+        fetcher.ComputationFetcher.stub.CacheQuery.return_value = [
+            _create_mock_match()]
+
+        statistics = fetcher.fetch_statistics_batch(12)
+        self.assertEqual(statistics.shape,
+                         (12, len(fetcher.STATISTIC_LABELS)))
+        self.assertEqual(
+            fetcher.ComputationFetcher.stub.CacheQuery.call_count, 3)
+
+        fetcher.ComputationFetcher.stub.CacheQuery.return_value = []
+        statistics = fetcher.fetch_statistics_batch(12)
+        self.assertEqual(statistics.shape,
+                         (0, len(fetcher.STATISTIC_LABELS)))
+
 
 if __name__ == "__main__":
     unittest.main()
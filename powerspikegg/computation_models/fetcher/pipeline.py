@@ -0,0 +1,102 @@
+""" Prefetching input pipeline
+
+Produce training batches in background threads and keep a bounded queue of
+ready batches, so the training session does not wait for matches to be fetched
+and sanitized between two steps.
+
+"""
+
+import threading
+import time
+
+try:
+    import queue  # Python 3.x
+except ImportError:
+    import Queue as queue  # Python 2.x
+
+
+class _Failure:
+    """Wraps an exception raised by a producer, to re-raise it on get()."""
+
+    def __init__(self, exception):
+        self.exception = exception
+
+
+class PrefetchPipeline:
+    """Bounded queue of batches filled by worker threads.
+
+    Batches are produced by calling a function without arguments. Workers
+    stop once the pipeline is closed; an exception raised by the function is
+    forwarded to the consumer.
+    """
+
+    def __init__(self, produce_batch, prefetch_depth=2, workers=1):
+        """Constructor. Start the workers.
+
+        Parameters:
+            produce_batch: function returning a new batch on each call.
+            prefetch_depth: maximum number of ready batches kept in memory.
+            workers: number of threads producing batches.
+        """
+        self.produce_batch = produce_batch
+        self.stall_time = 0.
+        self.batch_count = 0
+
+        self._queue = queue.Queue(maxsize=prefetch_depth)
+        self._keep_alive = True
+        self._threads = [threading.Thread(target=self._produce)
+                         for _ in range(workers)]
+        for thread in self._threads:
+            thread.daemon = True
+            thread.start()
+
+    def __enter__(self):
+        """Context management support."""
+        return self
+
+    def __exit__(self, unused_type, unused_value, unused_traceback):
+        """Context management support. Forward to close."""
+        self.close()
+
+    def _produce(self):
+        """Worker loop filling the queue."""
+        while self._keep_alive:
+            try:
+                item = self.produce_batch()
+            except Exception as e:  # Forwarded to the consumer.
+                item = _Failure(e)
+
+            # Do not block forever on a full queue, so the worker notices
+            # when the pipeline is closed.
+            while self._keep_alive:
+                try:
+                    self._queue.put(item, timeout=0.1)
+                    break
+                except queue.Full:
+                    pass
+
+            if isinstance(item, _Failure):
+                return
+
+    def get(self):
+        """Get the next ready batch, waiting for one if required.
+
+        The time spent waiting is accumulated in stall_time.
+
+        Raises:
+            Any exception raised by the batch production.
+        """
+        start = time.time()
+        item = self._queue.get()
+        self.stall_time += time.time() - start
+        self.batch_count += 1
+
+        if isinstance(item, _Failure):
+            raise item.exception
+        return item
+
+    def close(self):
+        """Stop the workers. Batches not consumed yet are discarded."""
+        self._keep_alive = False
+        for thread in self._threads:
+            thread.join()
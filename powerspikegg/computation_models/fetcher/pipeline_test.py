@@ -0,0 +1,65 @@
+import itertools
+import threading
+import time
+import unittest
+
+from powerspikegg.computation_models.fetcher import pipeline
+
+
+class SomeException(Exception):
+    """Some specific exception raised by a batch producer."""
+
+
+class TestPrefetchPipeline(unittest.TestCase):
+    """Tests the pipeline produces batches ahead of their consumption."""
+
+    def test_batches_are_produced(self):
+        """Tests every produced batch is consumed once."""
+        counter = itertools.count()
+        lock = threading.Lock()
+
+        def produce():
+            with lock:
+                return next(counter)
+
+        with pipeline.PrefetchPipeline(produce, 2, workers=3) as batches:
+            values = [batches.get() for _ in range(20)]
+
+        self.assertEqual(len(set(values)), 20)
+        self.assertEqual(batches.batch_count, 20)
+
+    def test_prefetch_is_bounded(self):
+        """Tests the workers stop producing once the queue is full."""
+        produced = []
+
+        def produce():
+            produced.append(None)
+            return len(produced)
+
+        with pipeline.PrefetchPipeline(produce, 3):
+            time.sleep(0.2)
+            # The queue holds 3 batches and the worker waits with the 4th.
+            self.assertEqual(len(produced), 4)
+
+    def test_stall_time(self):
+        """Tests the time waiting for batches is reported."""
+        def produce():
+            time.sleep(0.05)
+            return None
+
+        with pipeline.PrefetchPipeline(produce, 1) as batches:
+            batches.get()
+        self.assertGreaterEqual(batches.stall_time, 0.04)
+
+    def test_exception_forwarded(self):
+        """Tests an exception raised by the producer reaches the consumer."""
+        def produce():
+            raise SomeException("Whoops!")
+
+        with pipeline.PrefetchPipeline(produce, 1) as batches:
+            with self.assertRaises(SomeException):
+                batches.get()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,124 @@
+""" Compare the cost of the network architectures
+
+For every predefined architecture (see graph.ARCHITECTURES), generate a graph
+in a temporary directory, measure its training step time on random data, and
+its inference latency with TensorFlow and with the NumPy runtime once folded.
+
+Example:
+    bazel run //powerspikegg/computation_models/match:benchmark -- \\
+        --benchmark_architectures deep,shallow --benchmark_steps 200
+
+"""
+
+import gflags
+import numpy
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import tensorflow as tf
+
+from powerspikegg.computation_models.match import flags
+from powerspikegg.computation_models.match import folding
+from powerspikegg.computation_models.match import graph
+from powerspikegg.computation_models.match import numpy_model
+from powerspikegg.computation_models.match.train import GraphTrainer
+
+gflags.DEFINE_list("benchmark_architectures", sorted(graph.ARCHITECTURES),
+                   "Predefined architectures to compare")
+gflags.DEFINE_integer("benchmark_input_size", 11,
+                      "Number of columns of the inputs")
+gflags.DEFINE_integer("benchmark_steps", 100,
+                      "Number of measured training steps")
+gflags.DEFINE_integer("benchmark_runs", 100,
+                      "Number of measured inference runs per batch size")
+gflags.DEFINE_list("inference_batch_sizes", ["1", "256"],
+                   "Batch sizes of the measured inferences")
+FLAGS = gflags.FLAGS
+
+
+def _mean_time(function, runs):
+    """Mean time of a call to a function, after a warm-up call."""
+    function()
+    start = time.time()
+    for _ in range(runs):
+        function()
+    return (time.time() - start) / max(runs, 1)
+
+
+def benchmark_architecture(architecture, directory):
+    """Measure the cost of an architecture.
+
+    Parameters:
+        architecture: the graph.Architecture to measure.
+        directory: empty directory in which the graph is generated.
+    Returns:
+        A dictionary with the parameter count, the training step time and,
+        for each inference batch size, the TensorFlow and NumPy latencies.
+    """
+    input_size = FLAGS.benchmark_input_size
+    graph.GraphBuilder(input_size, architecture).generate_graph(directory)
+
+    random = numpy.random.RandomState(42)
+    inputs = random.rand(FLAGS.batch_size, input_size).astype(numpy.float32)
+    answers = random.rand(FLAGS.batch_size, 1).astype(numpy.float32)
+
+    result = {"inference": {}}
+    with tf.Graph().as_default():
+        trainer = GraphTrainer(os.path.join(directory, "model.ckpt"))
+        try:
+            result["parameters"] = sum(
+                int(numpy.prod(variable.get_shape().as_list()))
+                for variable in tf.trainable_variables())
+            result["train_step"] = _mean_time(
+                lambda: trainer.train(inputs, answers), FLAGS.benchmark_steps)
+            trainer.save()
+
+            for batch_size in FLAGS.inference_batch_sizes:
+                batch = random.rand(int(batch_size),
+                                    input_size).astype(numpy.float32)
+                result["inference"][batch_size] = [_mean_time(
+                    lambda: trainer.predict(batch), FLAGS.benchmark_runs)]
+        finally:
+            trainer.close()
+
+    path = os.path.join(directory, numpy_model.WEIGHTS_FILENAME)
+    numpy_model.save_weights(
+        path, folding.fold_layers(os.path.join(directory, "model.ckpt")),
+        architecture.activation)
+    model = numpy_model.NumpyModel(path)
+    for batch_size in FLAGS.inference_batch_sizes:
+        batch = random.rand(int(batch_size), input_size).astype(numpy.float32)
+        result["inference"][batch_size].append(_mean_time(
+            lambda: model.predict(batch), FLAGS.benchmark_runs))
+
+    return result
+
+
+def main():
+    print("%-20s %10s %12s %s" % (
+        "architecture", "parameters", "train step", " ".join(
+            "%24s" % ("inference %s (TF/NumPy)" % batch_size)
+            for batch_size in FLAGS.inference_batch_sizes)))
+
+    for name in FLAGS.benchmark_architectures:
+        directory = tempfile.mkdtemp()
+        try:
+            result = benchmark_architecture(graph.ARCHITECTURES[name],
+                                            directory)
+        finally:
+            shutil.rmtree(directory)
+
+        print("%-20s %10d %10.3fms %s" % (
+            name, result["parameters"], result["train_step"] * 1000,
+            " ".join("%11.3fms/%9.3fms" % (
+                result["inference"][batch_size][0] * 1000,
+                result["inference"][batch_size][1] * 1000)
+                for batch_size in FLAGS.inference_batch_sizes)))
+
+
+if __name__ == '__main__':
+    FLAGS(sys.argv)
+    main()
@@ -0,0 +1,91 @@
+""" Export the folded weights of a checkpoint for the NumPy runtime
+
+The exported model is compared with the TensorFlow graph of the checkpoint on
+random inputs, and the export fails if their outputs differ by more than the
+tolerance.
+
+Example:
+    bazel run //powerspikegg/computation_models/match:export_weights -- \\
+        --model_folder /tmp/powerspikegg/models/kills \\
+        --output_folder /tmp/powerspikegg/models/kills
+
+"""
+
+import gflags
+import numpy
+import os
+import sys
+
+import tensorflow as tf
+
+from powerspikegg.computation_models.match import folding
+from powerspikegg.computation_models.match import graph
+from powerspikegg.computation_models.match import numpy_model
+from powerspikegg.computation_models.match.train import GraphTrainer
+
+gflags.DEFINE_string("model_folder", "/tmp/model",
+                     "Model folder to export")
+gflags.DEFINE_string("output_folder", "/tmp",
+                     "Folder on which the weights will be exported.")
+gflags.DEFINE_float("tolerance", 1e-3,
+                    "Largest difference allowed between the outputs of the "
+                    "exported model and of the checkpoint, relative to the "
+                    "checkpoint outputs magnitude (plus one).")
+gflags.DEFINE_integer("verification_rows", 256,
+                      "Number of random inputs used to compare the exported "
+                      "model with the checkpoint.")
+
+FLAGS = gflags.FLAGS
+
+
+def compare_with_checkpoint(model, checkpoint_path, rows):
+    """Compare the outputs of an exported model and of its checkpoint.
+
+    Returns:
+        The largest difference between both outputs, divided by the
+        magnitude of the checkpoint output plus one.
+    """
+    inputs = numpy.random.rand(rows, model.input_size).astype(numpy.float32)
+
+    with tf.Graph().as_default():
+        trainer = GraphTrainer(checkpoint_path)
+        try:
+            expected, _ = trainer.predict(inputs)
+        finally:
+            trainer.close()
+
+    difference = numpy.abs(model.predict(inputs) - expected)
+    return float((difference / (1 + numpy.abs(expected))).max())
+
+
+def export_weights(model_folder, output_folder):
+    """Export the folded weights of the latest checkpoint of a folder.
+
+    Returns:
+        The path of the exported weights.
+    Raises:
+        ValueError: If the exported model does not match the checkpoint.
+    """
+    checkpoint = tf.train.get_checkpoint_state(model_folder)
+    input_checkpoint = checkpoint.model_checkpoint_path
+
+    path = os.path.join(output_folder, numpy_model.WEIGHTS_FILENAME)
+    numpy_model.save_weights(path, folding.fold_layers(input_checkpoint),
+                             graph.load_architecture(model_folder).activation)
+
+    difference = compare_with_checkpoint(
+        numpy_model.NumpyModel(path), input_checkpoint,
+        FLAGS.verification_rows)
+    print("Largest relative difference with the checkpoint outputs: %g" %
+          difference)
+    if difference > FLAGS.tolerance:
+        os.remove(path)
+        raise ValueError("The exported model does not match the checkpoint.")
+
+    return path
+
+
+if __name__ == '__main__':
+    FLAGS(sys.argv)
+    print("Weights exported to %s." % export_weights(FLAGS.model_folder,
+                                                     FLAGS.output_folder))
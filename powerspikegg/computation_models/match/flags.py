@@ -0,0 +1,47 @@
+""" Flags shared by the training binaries """
+
+import gflags
+
+from powerspikegg.computation_models.match import graph
+
+FLAGS = gflags.FLAGS
+
+gflags.DEFINE_float("learning_rate", 0.01,
+                    "Rate for the optimizer (Addagram)")
+gflags.DEFINE_integer("batch_size", 256,
+                      "Number of participants per iteration")
+gflags.DEFINE_integer("epochs", 0,
+                      "Number of passes over a materialized dataset. If 0, "
+                      "train_graph trains on a new batch at every iteration "
+                      "instead")
+gflags.DEFINE_integer("dataset_size", 100000,
+                      "Number of participants fetched to materialize the "
+                      "dataset, when not training from a feature store")
+gflags.DEFINE_float("validation_split", 0.1,
+                    "Fraction of the dataset held out for evaluation")
+gflags.DEFINE_integer("eval_every", 100,
+                      "Number of steps between two evaluations")
+gflags.DEFINE_integer("checkpoint_every", 1000,
+                      "Number of steps between two checkpoints")
+gflags.DEFINE_enum("architecture", "deep", sorted(graph.ARCHITECTURES),
+                   "Predefined architecture of the generated networks")
+gflags.DEFINE_integer("depth", None,
+                      "Number of hidden layers, overriding the architecture")
+gflags.DEFINE_integer("width", None,
+                      "Number of units per hidden layer, overriding the "
+                      "architecture")
+gflags.DEFINE_boolean("normalization", None,
+                      "Whether the hidden layers inputs are normalized, "
+                      "overriding the architecture")
+gflags.DEFINE_enum("activation", None, sorted(graph.ACTIVATIONS),
+                   "Activation of the hidden layers, overriding the "
+                   "architecture")
+
+
+def architecture_from_flags():
+    """Get the architecture of the networks to generate from the flags."""
+    overrides = dict(
+        (field, getattr(FLAGS, field))
+        for field in graph.Architecture._fields
+        if getattr(FLAGS, field) is not None)
+    return graph.ARCHITECTURES[FLAGS.architecture]._replace(**overrides)
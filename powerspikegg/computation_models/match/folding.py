@@ -0,0 +1,110 @@
+""" Fold the batch normalizations of a trained network into its dense layers
+
+In inference mode, a batch normalization is an affine transformation of its
+input using the moving statistics learned during training:
+
+    normalized = gamma * (x - moving_mean) / sqrt(moving_variance + epsilon)
+                 + beta
+               = scale * x + shift
+
+As GraphBuilder normalizes the input of each hidden dense layer, the
+transformation is merged into the weights of the dense layer that follows:
+
+    dense(normalized) = x * (scale * kernel) + (shift * kernel + bias)
+
+The folded network is a plain stack of dense layers, the activation being
+applied after every layer but the last one.
+
+"""
+
+import collections
+import re
+
+import numpy
+import tensorflow as tf
+
+
+# Default epsilon of tf.layers.batch_normalization.
+BATCH_NORM_EPSILON = 1e-3
+
+# Variables of the dense and batch normalization layers created by tf.layers.
+_VARIABLE_PATTERN = re.compile(
+    r"^(dense|batch_normalization)(?:_(\d+))?/"
+    r"(kernel|bias|gamma|beta|moving_mean|moving_variance)$")
+
+
+def read_layers(checkpoint_path):
+    """Read the weights of the layers stored in a checkpoint.
+
+    Optimizer slots and other variables are ignored.
+
+    Parameters:
+        checkpoint_path: path of the checkpoint (e.g. model_folder/model.ckpt)
+    Returns:
+        A tuple (dense layers, batch normalizations), both dictionaries
+        mapping the layer index to a dictionary of its weights.
+    """
+    reader = tf.train.NewCheckpointReader(checkpoint_path)
+
+    layers = {
+        "dense": collections.defaultdict(dict),
+        "batch_normalization": collections.defaultdict(dict),
+    }
+    for name in reader.get_variable_to_shape_map():
+        match = _VARIABLE_PATTERN.match(name)
+        if match is None:
+            continue
+        layer_type, index, weight = match.groups()
+        layers[layer_type][int(index or 0)][weight] = reader.get_tensor(name)
+
+    return layers["dense"], layers["batch_normalization"]
+
+
+def fold_batch_normalization(dense, batch_normalization,
+                             epsilon=BATCH_NORM_EPSILON):
+    """Fold a batch normalization into the dense layer it feeds.
+
+    Parameters:
+        dense: dictionary with the kernel and bias of the dense layer.
+        batch_normalization: dictionary with the gamma, beta, moving_mean and
+            moving_variance of the normalization.
+        epsilon: epsilon of the normalization.
+    Returns:
+        A tuple of float32 arrays (kernel, bias).
+    """
+    scale = batch_normalization["gamma"] / numpy.sqrt(
+        batch_normalization["moving_variance"] + epsilon)
+    shift = (batch_normalization["beta"] -
+             batch_normalization["moving_mean"] * scale)
+
+    kernel = dense["kernel"] * scale[:, numpy.newaxis]
+    bias = shift.dot(dense["kernel"]) + dense["bias"]
+    return kernel.astype(numpy.float32), bias.astype(numpy.float32)
+
+
+def fold_layers(checkpoint_path, epsilon=BATCH_NORM_EPSILON):
+    """Read a checkpoint and fold its batch normalizations.
+
+    The n-th batch normalization normalizes the input of the n-th dense
+    layer, as built by GraphBuilder.
+
+    Returns:
+        The list of (kernel, bias) float32 arrays of the dense layers, from
+        the input to the logits.
+    Raises:
+        ValueError: If the checkpoint contains no dense layer.
+    """
+    dense_layers, normalizations = read_layers(checkpoint_path)
+    if not dense_layers:
+        raise ValueError("No dense layer in %s." % checkpoint_path)
+
+    layers = []
+    for index in sorted(dense_layers):
+        dense = dense_layers[index]
+        if index in normalizations:
+            layers.append(fold_batch_normalization(
+                dense, normalizations[index], epsilon))
+        else:
+            layers.append((dense["kernel"].astype(numpy.float32),
+                           dense["bias"].astype(numpy.float32)))
+    return layers
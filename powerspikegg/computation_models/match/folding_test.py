@@ -0,0 +1,103 @@
+import shutil
+import tempfile
+import unittest
+
+import numpy
+import tensorflow as tf
+
+from powerspikegg.computation_models.match import folding
+from powerspikegg.computation_models.match import freeze
+from powerspikegg.computation_models.match import graph
+from powerspikegg.computation_models.match import train
+
+
+class FoldingTest(unittest.TestCase):
+    """Checks the folded inference graph computes the trained network."""
+
+    def setUp(self):
+        """Generate a normalized model and train it a few steps, so its
+        normalizations are not the identity."""
+        self.model_directory = tempfile.mkdtemp()
+        self.checkpoint_path = self.model_directory + "/model.ckpt"
+        self.architecture = graph.ARCHITECTURES["normalized_shallow"]
+        builder = graph.GraphBuilder(4, self.architecture)
+        builder.generate_graph(self.model_directory)
+
+        random = numpy.random.RandomState(0)
+        data = random.normal(5, 2, size=(64, 4)).astype(numpy.float32)
+        answers = data.sum(axis=1, keepdims=True)
+        self.inputs = random.normal(5, 2, size=(16, 4)).astype(numpy.float32)
+
+        with tf.Graph().as_default():
+            trainer = train.GraphTrainer(self.checkpoint_path)
+            trainer.train(data, answers, iteration=20)
+            trainer.save()
+            self.expected = trainer.predict(self.inputs)[0]
+            trainer.close()
+
+    def tearDown(self):
+        """Remove the model."""
+        shutil.rmtree(self.model_directory)
+
+    def _fold(self, quantize):
+        """Compute the outputs of the folded inference graph."""
+        graph_def = freeze.build_inference_graph(
+            folding.fold_layers(self.checkpoint_path),
+            activation=graph.ACTIVATIONS[self.architecture.activation],
+            quantize=quantize)
+        outputs, _ = freeze.measure_graph(graph_def, self.inputs,
+                                          "placeholder", "logits", runs=0)
+        return outputs
+
+    def test_read_layers(self):
+        """Tests the layers are recovered from the variable names."""
+        dense_layers, normalizations = folding.read_layers(
+            self.checkpoint_path)
+
+        self.assertEqual(sorted(dense_layers), [0, 1, 2, 3])
+        self.assertEqual(sorted(normalizations), [0, 1, 2])
+        self.assertEqual(dense_layers[0]["kernel"].shape, (4, 64))
+        self.assertEqual(dense_layers[3]["kernel"].shape, (64, 1))
+        self.assertEqual(sorted(normalizations[0]),
+                         ["beta", "gamma", "moving_mean", "moving_variance"])
+
+    def test_fold_batch_normalization(self):
+        """Tests a folded layer computes the normalization then the layer."""
+        random = numpy.random.RandomState(0)
+        dense = {"kernel": random.normal(size=(3, 2)),
+                 "bias": random.normal(size=2)}
+        batch_normalization = {
+            "gamma": random.normal(size=3),
+            "beta": random.normal(size=3),
+            "moving_mean": random.normal(size=3),
+            "moving_variance": random.uniform(.5, 2, size=3),
+        }
+        inputs = random.normal(size=(5, 3))
+
+        normalized = (batch_normalization["gamma"] *
+                      (inputs - batch_normalization["moving_mean"]) /
+                      numpy.sqrt(batch_normalization["moving_variance"] +
+                                 folding.BATCH_NORM_EPSILON) +
+                      batch_normalization["beta"])
+        expected = normalized.dot(dense["kernel"]) + dense["bias"]
+
+        kernel, bias = folding.fold_batch_normalization(
+            dense, batch_normalization)
+        self.assertTrue(numpy.allclose(inputs.dot(kernel) + bias, expected,
+                                       atol=1e-5))
+
+    def test_folded_graph(self):
+        """Tests the folded graph matches the trained network."""
+        outputs = self._fold(quantize=False)
+        self.assertTrue(numpy.allclose(outputs, self.expected, rtol=1e-4,
+                                       atol=1e-4))
+
+    def test_quantized_graph(self):
+        """Tests the quantized graph approximates the trained network."""
+        outputs = self._fold(quantize=True)
+        tolerance = .05 * (1 + numpy.abs(self.expected).max())
+        self.assertLess(numpy.abs(outputs - self.expected).max(), tolerance)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,10 +1,15 @@
 import gflags
+import numpy
 import os
 import sys
+import time
 import tensorflow as tf
 
 from tensorflow.python.framework import graph_util
 
+from powerspikegg.computation_models.match import folding
+from powerspikegg.computation_models.match import graph as graph_builder
+
 gflags.DEFINE_string("model_folder", "/tmp/model",
                      "Model folder to export")
 gflags.DEFINE_string("output_folder", "/tmp",
@@ -13,11 +18,134 @@ gflags.DEFINE_string("output_graph_name", "frozen_model.pb",
                      "Name of the exported file.")
 gflags.DEFINE_string("output_node_name", "logits",
                      "Name of the node executed.")
+gflags.DEFINE_string("input_node_name", "placeholder",
+                     "Name of the input placeholder.")
+gflags.DEFINE_boolean("optimize_for_inference", True,
+                      "Fold the batch normalizations into the dense layers "
+                      "and only keep the operations computing the output.")
+gflags.DEFINE_boolean("quantize_weights", False,
+                      "Store the weights of the optimized graph as 8 bits "
+                      "integers.")
+gflags.DEFINE_integer("benchmark_runs", 100,
+                      "Number of runs used to measure the latency of the "
+                      "graphs. If 0, the latency is not reported.")
+gflags.DEFINE_integer("benchmark_batch_size", 256,
+                      "Number of rows of the batches used to measure the "
+                      "latency of the graphs.")
 
 FLAGS = gflags.FLAGS
 
 
-def freeze_graph(model_folder):
+def _weights_constant(weights, quantize):
+    """Create a constant holding weights, optionally quantized.
+
+    Quantized weights are stored as 8 bits integers, linearly mapped onto the
+    [min, max] range of the weights, and converted back to float at runtime.
+    """
+    if not quantize:
+        return tf.constant(weights)
+
+    minimum = float(weights.min())
+    scale = (float(weights.max()) - minimum) / 255. or 1.
+    quantized = numpy.round((weights - minimum) / scale).astype(numpy.uint8)
+    return tf.cast(tf.constant(quantized), tf.float32) * scale + minimum
+
+
+def build_inference_graph(layers, input_name="placeholder",
+                          output_name="logits", activation=tf.nn.relu,
+                          quantize=False):
+    """Build a graph evaluating a stack of folded dense layers.
+
+    The graph only contains the input placeholder, the dense layers and the
+    output: training and summary operations are not part of it.
+
+    Parameters:
+        layers: list of (kernel, bias) arrays, as folding.fold_layers.
+        input_name: name of the input placeholder.
+        output_name: name of the output.
+        activation: activation applied after every layer but the last.
+        quantize: whether the kernels are stored as 8 bits integers.
+    Returns:
+        The GraphDef of the inference graph.
+    """
+    with tf.Graph().as_default() as graph:
+        hidden = tf.placeholder(tf.float32,
+                                shape=(None, layers[0][0].shape[0]),
+                                name=input_name)
+        for index, (kernel, bias) in enumerate(layers):
+            with tf.name_scope("dense_%d" % index):
+                hidden = tf.nn.bias_add(
+                    tf.matmul(hidden, _weights_constant(kernel, quantize)),
+                    tf.constant(bias))
+                if index < len(layers) - 1:
+                    hidden = activation(hidden)
+        tf.identity(hidden, name=output_name)
+
+    return graph.as_graph_def()
+
+
+def measure_graph(graph_def, inputs, input_name, output_name, runs):
+    """Measure the latency of a frozen graph.
+
+    Returns:
+        A tuple (outputs, mean latency in seconds) of the graph on inputs.
+    """
+    with tf.Graph().as_default() as graph:
+        tf.import_graph_def(graph_def, name="")
+        input_tensor = graph.get_tensor_by_name(input_name + ":0")
+        output_tensor = graph.get_tensor_by_name(output_name + ":0")
+
+        with tf.Session() as sess:
+            feed_dict = {input_tensor: inputs}
+            outputs = sess.run(output_tensor, feed_dict=feed_dict)
+
+            start = time.time()
+            for _ in range(runs):
+                sess.run(output_tensor, feed_dict=feed_dict)
+            latency = (time.time() - start) / max(runs, 1)
+
+    return outputs, latency
+
+
+def report(graph_def, optimized_graph_def, input_name, output_name):
+    """Print the op count and the latency of the graphs before and after the
+    optimization, and the largest difference between their outputs.
+    """
+    print("%d ops before optimization, %d ops after." % (
+        len(graph_def.node), len(optimized_graph_def.node)))
+    if not FLAGS.benchmark_runs:
+        return
+
+    input_size = None
+    for node in optimized_graph_def.node:
+        if node.name == input_name:
+            input_size = node.attr["shape"].shape.dim[1].size
+    inputs = numpy.random.rand(FLAGS.benchmark_batch_size,
+                               input_size).astype(numpy.float32)
+
+    outputs, latency = measure_graph(graph_def, inputs, input_name,
+                                     output_name, FLAGS.benchmark_runs)
+    optimized_outputs, optimized_latency = measure_graph(
+        optimized_graph_def, inputs, input_name, output_name,
+        FLAGS.benchmark_runs)
+
+    print("Latency per batch of %d: %.3fms before, %.3fms after." % (
+        FLAGS.benchmark_batch_size, latency * 1000, optimized_latency * 1000))
+    print("Largest difference between the outputs: %g" %
+          numpy.abs(outputs - optimized_outputs).max())
+
+
+def freeze_graph(model_folder, optimize=False, quantize=False):
+    """Export a checkpoint as a frozen graph.
+
+    Parameters:
+        model_folder: folder containing the checkpoint.
+        optimize: whether the graph is optimized for inference: the batch
+            normalizations are folded into the dense layers, and only the
+            operations computing the output are kept.
+        quantize: whether the weights of the optimized graph are stored as 8
+            bits integers.
+    """
     # We retrieve our checkpoint fullpath
     checkpoint = tf.train.get_checkpoint_state(model_folder)
     input_checkpoint = checkpoint.model_checkpoint_path
@@ -31,6 +159,8 @@ def freeze_graph(model_folder):
     # and what part it can dump
     # NOTE: this variable is plural, because you can have multiple output nodes
     output_node_names = FLAGS.output_node_name
+    if optimize and "," in output_node_names:
+        raise ValueError("An optimized graph has a single output node.")
 
     # We clear devices to allow TensorFlow to control on which device it will
     # load operations
@@ -56,12 +186,26 @@ def freeze_graph(model_folder):
             output_node_names.split(",")
         )
 
-        # Finally we serialize and dump the output graph to the filesystem
-        with tf.gfile.GFile(output_graph, "wb") as f:
-            f.write(output_graph_def.SerializeToString())
-        print("%d ops in the final graph." % len(output_graph_def.node))
+    if optimize:
+        # The inference graph is rebuilt from the folded weights, so the
+        # normalizations training branches are not part of it.
+        architecture = graph_builder.load_architecture(model_folder)
+        optimized_graph_def = build_inference_graph(
+            folding.fold_layers(input_checkpoint),
+            FLAGS.input_node_name, output_node_names,
+            activation=graph_builder.ACTIVATIONS[architecture.activation],
+            quantize=quantize)
+        report(output_graph_def, optimized_graph_def, FLAGS.input_node_name,
+               output_node_names)
+        output_graph_def = optimized_graph_def
+
+    # Finally we serialize and dump the output graph to the filesystem
+    with tf.gfile.GFile(output_graph, "wb") as f:
+        f.write(output_graph_def.SerializeToString())
+    print("%d ops in the final graph." % len(output_graph_def.node))
 
 
 if __name__ == '__main__':
     FLAGS(sys.argv)
-    freeze_graph(FLAGS.model_folder)
+    freeze_graph(FLAGS.model_folder, FLAGS.optimize_for_inference,
+                 FLAGS.quantize_weights)
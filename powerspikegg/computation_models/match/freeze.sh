@@ -7,3 +7,7 @@ MODELS="/tmp/powerspikegg/models"
 for stat in ${stats[@]}; do
     bazel run //powerspikegg/computation_models/match:freeze -- --model_folder "$MODELS/$stat" --output_folder "$MODELS/$stat"
 done
+
+for stat in ${stats[@]}; do
+    bazel run //powerspikegg/computation_models/match:export_weights -- --model_folder "$MODELS/$stat" --output_folder "$MODELS/$stat"
+done
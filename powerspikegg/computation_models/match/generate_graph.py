@@ -5,11 +5,14 @@ NOTE: the graph is not trained
 Args:
     model_dir: Directory to store the created graph
     input_size: Size of the tensor used to store the input
+    architecture: Predefined architecture of the network, which depth,
+                  width, normalization and activation flags override
 """
 
 import gflags
 import sys
 
+from powerspikegg.computation_models.match import flags
 from powerspikegg.computation_models.match.graph import GraphBuilder
 
 gflags.DEFINE_string("model_dir", "/tmp/model",
@@ -21,7 +24,7 @@ FLAGS = gflags.FLAGS
 
 
 def main():
-    builder = GraphBuilder(FLAGS.input_size)
+    builder = GraphBuilder(FLAGS.input_size, flags.architecture_from_flags())
     builder.generate_graph(FLAGS.model_dir)
 
 
@@ -13,23 +13,82 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+import collections
+import json
 import math
 import os
 
 import tensorflow as tf
 
 
+# Shape of the network: number and size of the hidden layers, whether their
+# input is normalized and the name of their activation (see ACTIVATIONS).
+Architecture = collections.namedtuple("Architecture", [
+    "depth", "width", "normalization", "activation"])
+
+# Predefined architectures. "deep" is the historical network. "shallow" is
+# cheap to train and to serve: without normalization, its inference graph is
+# a few matrix multiplications even before folding.
+ARCHITECTURES = {
+    "deep": Architecture(depth=20, width=30, normalization=True,
+                         activation="relu"),
+    "shallow": Architecture(depth=2, width=64, normalization=False,
+                            activation="relu"),
+    "normalized_shallow": Architecture(depth=3, width=64, normalization=True,
+                                       activation="relu"),
+}
+
+ACTIVATIONS = {
+    "relu": tf.nn.relu,
+    "elu": tf.nn.elu,
+    "tanh": tf.nn.tanh,
+}
+
+ARCHITECTURE_FILENAME = "architecture.json"
+
+
+def save_architecture(model_directory, architecture):
+    """Save the architecture of a model next to its checkpoint."""
+    with open(os.path.join(model_directory, ARCHITECTURE_FILENAME), "w") as f:
+        json.dump(architecture._asdict(), f)
+
+
+def load_architecture(model_directory):
+    """Load the architecture of a model.
+
+    Models generated before the architecture was configurable have the
+    "deep" architecture.
+    """
+    path = os.path.join(model_directory, ARCHITECTURE_FILENAME)
+    if not os.path.exists(path):
+        return ARCHITECTURES["deep"]
+    with open(path) as f:
+        return Architecture(**json.load(f))
+
+
 class GraphBuilder:
     """ Generate a graph with all variables initialized """
 
-    def __init__(self, input_size):
+    def __init__(self, input_size, architecture=None):
+        """ Args:
+                input_size: Number of columns of the input data
+                architecture: Optional Architecture of the network, "deep"
+                              by default
+        """
+        if architecture is None:
+            architecture = ARCHITECTURES["deep"]
+        if architecture.activation not in ACTIVATIONS:
+            raise ValueError("Unknown activation %r." %
+                             architecture.activation)
+
         self.input_size = input_size
+        self.architecture = architecture
 
     def add_hidden_layer(self, data, units, name, is_training):
         """ Create a simple layer for a neural network
 
             The layer contains:
-                - A normalization layer
+                - A normalization layer, if the architecture normalizes
                 - A dense layer
 
             Args:
@@ -44,19 +103,18 @@ class GraphBuilder:
                 A tensor computed with all the intermediate layers
         """
         with tf.name_scope(name):
-            norm = tf.layers.batch_normalization(data, training=is_training)
+            if self.architecture.normalization:
+                data = tf.layers.batch_normalization(data,
+                                                     training=is_training)
             hidden = tf.layers.dense(
-                    inputs=norm,
-                    units=layer_size,
-                    kernel_initializer=tf.contrib.layers.xavier_initializer(
-                            uniform=False
-                        ),
-                    activation=tf.nn.relu)
+                    inputs=data,
+                    units=units,
+                    activation=ACTIVATIONS[self.architecture.activation])
 
         return hidden
 
     def create_network(self, data, layers, is_training):
-    	""" Create a deep neural network
+        """ Create a deep neural network
 
             Args:
                 data: A tensor with the input data
@@ -66,10 +124,9 @@ class GraphBuilder:
         """
         # Build the hidden layers of the network
         hidden = data
-        for layer_size in layers:
-            norm = tf.layers.batch_normalization(hidden, training=is_training)
-            hidden = tf.layers.dense(inputs=norm, units=layer_size,
-                                     activation=tf.nn.relu)
+        for index, layer_size in enumerate(layers):
+            hidden = self.add_hidden_layer(hidden, layer_size,
+                                           "hidden_%d" % index, is_training)
 
         # Final layer with only one cell containing the predicted value
         logits = tf.layers.dense(inputs=hidden, units=1)
@@ -87,8 +144,8 @@ class GraphBuilder:
         Returns:
             Output tensor with the logits predicted by the neural network.
         """
-        # Create 20 hidden layers with 30 units
-        layers = [30 for _ in range(20)]
+        layers = [self.architecture.width
+                  for _ in range(self.architecture.depth)]
         logits = self.create_network(data, layers, is_training=is_training)
         return tf.identity(logits, name="logits")
 
@@ -128,8 +185,11 @@ class GraphBuilder:
         # Create a variable to track the global step.
         global_step = tf.Variable(0, name='global_step', trainable=False)
         # Use the optimizer to apply the gradients that minimize the loss
-        # as a single training step.
-        train_op = optimizer.minimize(loss, global_step=global_step)
+        # as a single training step. The moving statistics of the batch
+        # normalizations are updated along, as they are used for inference.
+        with tf.control_dependencies(
+                tf.get_collection(tf.GraphKeys.UPDATE_OPS)):
+            train_op = optimizer.minimize(loss, global_step=global_step)
         return train_op
 
     def evaluation(self, logits, labels):
@@ -218,3 +278,5 @@ class GraphBuilder:
 
                 saver.save(sess, checkpoint_file)
                 saver.export_meta_graph(checkpoint_file + '.meta')
+
+        save_architecture(model_directory, self.architecture)
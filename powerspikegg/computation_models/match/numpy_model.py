@@ -0,0 +1,100 @@
+""" NumPy inference runtime
+
+Evaluate the networks built by GraphBuilder without TensorFlow. The weights
+are exported from a checkpoint by export_weights.py, with the batch
+normalizations folded into the dense layers (see folding.py), as a .npz file:
+
+    kernel_<n>, bias_<n>: weights of the n-th dense layer.
+    layer_count: number of dense layers.
+    activation: name of the activation applied after every layer but the
+        last one.
+
+"""
+
+import numpy
+
+
+WEIGHTS_FILENAME = "model_weights.npz"
+
+
+def _relu(values):
+    """Rectified linear unit, computed in place."""
+    return numpy.maximum(values, 0, out=values)
+
+
+def _elu(values):
+    """Exponential linear unit, computed in place."""
+    negative = values < 0
+    values[negative] = numpy.expm1(values[negative])
+    return values
+
+
+# Activations supported by the runtime, by name, as graph.ACTIVATIONS.
+ACTIVATIONS = {
+    "relu": _relu,
+    "elu": _elu,
+    "tanh": numpy.tanh,
+}
+
+
+def save_weights(path, layers, activation="relu"):
+    """Save the weights of a folded network.
+
+    Parameters:
+        path: path of the .npz file.
+        layers: list of (kernel, bias) arrays, from the input to the logits.
+        activation: name of the activation of the hidden layers.
+    Raises:
+        ValueError: If the activation is not supported by the runtime.
+    """
+    if activation not in ACTIVATIONS:
+        raise ValueError("Unsupported activation %r." % activation)
+
+    weights = {
+        "layer_count": numpy.array(len(layers)),
+        "activation": numpy.array(activation),
+    }
+    for index, (kernel, bias) in enumerate(layers):
+        weights["kernel_%d" % index] = numpy.asarray(kernel, numpy.float32)
+        weights["bias_%d" % index] = numpy.asarray(bias, numpy.float32)
+    numpy.savez_compressed(path, **weights)
+
+
+class NumpyModel:
+    """A folded network evaluated with matrix multiplications."""
+
+    def __init__(self, path):
+        """Constructor. Load the weights.
+
+        Parameters:
+            path: path of the .npz file written by save_weights.
+        """
+        self.path = path
+        with numpy.load(path) as weights:
+            self.layers = [
+                (weights["kernel_%d" % index], weights["bias_%d" % index])
+                for index in range(int(weights["layer_count"]))]
+            self.activation = ACTIVATIONS[str(weights["activation"])]
+
+    @property
+    def input_size(self):
+        """Number of columns of the inputs."""
+        return self.layers[0][0].shape[0]
+
+    def predict(self, inputs):
+        """Predict the statistic of every input row.
+
+        Returns:
+            A float32 array of shape (rows, 1).
+        """
+        hidden = numpy.asarray(inputs, dtype=numpy.float32)
+        for index, (kernel, bias) in enumerate(self.layers):
+            hidden = hidden.dot(kernel)
+            hidden += bias
+            if index < len(self.layers) - 1:
+                hidden = self.activation(hidden)
+        return hidden
+
+    def close(self):
+        """Nothing to release, for compatibility with the TensorFlow
+        models."""
@@ -0,0 +1,55 @@
+import numpy
+import os
+import shutil
+import tempfile
+import unittest
+
+from powerspikegg.computation_models.match import numpy_model
+
+
+class TestNumpyModel(unittest.TestCase):
+    """Tests the NumPy runtime evaluates the exported weights."""
+
+    def setUp(self):
+        """Export the weights of a small random network."""
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory,
+                                 numpy_model.WEIGHTS_FILENAME)
+
+        random = numpy.random.RandomState(42)
+        self.layers = [
+            (random.randn(11, 8), random.randn(8)),
+            (random.randn(8, 8), random.randn(8)),
+            (random.randn(8, 1), random.randn(1)),
+        ]
+        numpy_model.save_weights(self.path, self.layers)
+        self.inputs = random.rand(16, 11)
+
+    def tearDown(self):
+        """Remove the exported weights."""
+        shutil.rmtree(self.directory)
+
+    def test_predict(self):
+        """Tests the logits follow the dense layers and their activation."""
+        expected = self.inputs
+        for index, (kernel, bias) in enumerate(self.layers):
+            expected = expected.dot(kernel) + bias
+            if index < len(self.layers) - 1:
+                expected = numpy.maximum(expected, 0)
+
+        model = numpy_model.NumpyModel(self.path)
+        logits = model.predict(self.inputs)
+
+        self.assertEqual(model.input_size, 11)
+        self.assertEqual(logits.shape, (16, 1))
+        self.assertEqual(logits.dtype, numpy.float32)
+        numpy.testing.assert_allclose(logits, expected, rtol=1e-4, atol=1e-4)
+
+    def test_unsupported_activation(self):
+        """Tests only activations of the runtime are exported."""
+        with self.assertRaises(ValueError):
+            numpy_model.save_weights(self.path, self.layers, "swish")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,23 +1,27 @@
 """Utility to train Tensorflow models"""
 
+import logging
 import os
+import time
 
+import numpy
 import tensorflow as tf
 
 
 class GraphTrainer:
     """ Load an existing graph and expose methods to train and evaluate it"""
 
-    def __init__(self, model_path, learning_rate=None):
+    def __init__(self, model_path, learning_rate=None, session_config=None):
         self.model_path = model_path
         self.learning_rate = learning_rate
+        self.session_config = session_config
         self._load()
 
     def _load(self):
         """ Load a metagraph using Tensorflow loader and inject the graph
             and the variables into a new session
         """
-        self.sess = tf.Session()
+        self.sess = tf.Session(config=self.session_config)
 
         meta_graph_path = self.model_path + '.meta'
         self.saver = tf.train.import_meta_graph(meta_graph_path)
@@ -50,7 +54,8 @@ class GraphTrainer:
         for _ in range(iteration):
             feed_dict = {
                         self.placeholder: data,
-                        self.answer: answer
+                        self.answer: answer,
+                        self.is_training: True
             }
             if self.learning_rate is not None:
                 feed_dict.update({
@@ -58,6 +63,99 @@ class GraphTrainer:
                 })
             self.sess.run(self.train_op, feed_dict=feed_dict)
 
+    def fit(self, inputs, answers, epochs=1, batch_size=256,
+            validation_split=0.1, eval_every=100, checkpoint_every=1000,
+            seed=None):
+        """ Train the model over a materialized dataset
+
+            The dataset is split once between a training and a held-out
+            validation set. Each epoch goes over the whole training set in
+            shuffled mini-batches.
+
+            Args:
+                inputs: An array of input data (each row is an input)
+
+                answers: An array of the expected result for the data
+                         (the indices must matches with the inputs)
+
+                epochs: Number of passes over the training set
+
+                batch_size: Number of rows per training step
+
+                validation_split: Fraction of the dataset held out to
+                                  evaluate the model
+
+                eval_every: Number of steps between two evaluations on the
+                            validation set (0 disables them)
+
+                checkpoint_every: Number of steps between two checkpoints
+                                  (0 disables them)
+
+                seed: Optional seed of the split and the shuffling
+
+            Return: The mean absolute error on the validation set, or None
+                    if the validation set is empty
+        """
+        random = numpy.random.RandomState(seed)
+        indices = random.permutation(len(inputs))
+        validation_size = int(len(inputs) * validation_split)
+        validation = numpy.sort(indices[:validation_size])
+        training = indices[validation_size:]
+
+        validation_inputs = inputs[validation]
+        validation_answers = answers[validation]
+
+        step = 0
+        examples = 0
+        window_start = time.time()
+        for epoch in range(epochs):
+            random.shuffle(training)
+            for begin in range(0, len(training), batch_size):
+                batch = training[begin:begin + batch_size]
+                self.train(inputs[batch], answers[batch])
+                step += 1
+                examples += len(batch)
+
+                if eval_every and step % eval_every == 0:
+                    elapsed = time.time() - window_start
+                    logging.info(
+                        "Step %d (epoch %d): %.0f examples/sec, "
+                        "validation error %s", step, epoch,
+                        examples / max(elapsed, 1e-9),
+                        self.mean_error(validation_inputs,
+                                        validation_answers))
+                    examples = 0
+                    window_start = time.time()
+
+                if checkpoint_every and step % checkpoint_every == 0:
+                    self.save()
+
+        return self.mean_error(validation_inputs, validation_answers)
+
+    def mean_error(self, inputs, answers, batch_size=4096):
+        """ Compute the mean absolute error of the model on the provided data
+
+            Args:
+                inputs: An array of input data (each row is an input)
+
+                answers: An array of the expected result for the data
+
+                batch_size: Number of rows evaluated at once
+
+            Return: The mean absolute error, or None if there is no data
+        """
+        if not len(inputs):
+            return None
+
+        total = 0.
+        for begin in range(0, len(inputs), batch_size):
+            total += self.sess.run(self.eval_op, feed_dict={
+                self.placeholder: inputs[begin:begin + batch_size],
+                self.answer: answers[begin:begin + batch_size],
+                self.is_training: False
+            })
+        return total / len(inputs)
+
     def evaluate(self, inputs, answers):
         """ Evaluate the performance of a model on the provided data
 
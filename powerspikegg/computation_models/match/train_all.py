@@ -0,0 +1,255 @@
+""" Train one model per statistic label in parallel
+
+The participants are fetched and sanitized once: either a feature store is
+given, or a dataset is fetched from the rawdata fetcher by a child process
+and written to a temporary .npy file. Every model is then trained by a
+worker of a process pool, which memory-maps the shared data, selects its
+rows and trains its own session. Each checkpoint is written to its own
+directory:
+
+    <models_directory>/<label>
+    <models_directory>/<label>/league_<LEAGUE>
+    <models_directory>/<label>/champion_<ID>
+
+Per-league and per-champion variants require a feature store, as the fetched
+dataset does not keep the participants metadata.
+
+Example:
+    bazel run //powerspikegg/computation_models/match:train_all -- \\
+        --feature_store /tmp/powerspikegg/features \\
+        --leagues GOLD,PLATINUM --epochs 10
+
+"""
+
+import collections
+import gflags
+import logging
+import multiprocessing
+import numpy
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import tensorflow as tf
+
+from powerspikegg.computation_models.fetcher import feature_store
+from powerspikegg.computation_models.fetcher import fetcher
+from powerspikegg.computation_models.match import flags
+from powerspikegg.computation_models.match.graph import GraphBuilder
+from powerspikegg.computation_models.match.train import GraphTrainer
+from powerspikegg.rawdata.public import constants_pb2
+
+gflags.DEFINE_string("models_directory", "/tmp/powerspikegg/models",
+                     "Directory in which every model directory is created")
+gflags.DEFINE_list("labels", fetcher.STATISTIC_LABELS,
+                   "Statistic labels for which a model is trained")
+gflags.DEFINE_list("leagues", [],
+                   "Leagues for which a variant of every model is trained")
+gflags.DEFINE_list("champions", [],
+                   "Champion ids for which a variant of every model is "
+                   "trained")
+gflags.DEFINE_integer("training_processes", multiprocessing.cpu_count(),
+                      "Number of models trained at the same time")
+gflags.DEFINE_integer("threads_per_model", 1,
+                      "Number of threads used by each Tensorflow session")
+FLAGS = gflags.FLAGS
+
+_STATISTICS_FILENAME = "statistics.npy"
+
+# A model to train. Either feature_store or statistics_path locates the
+# shared data. options are the keyword arguments of GraphTrainer.fit.
+TrainingTask = collections.namedtuple("TrainingTask", [
+    "label", "league", "champion", "model_directory", "feature_store",
+    "statistics_path", "learning_rate", "threads", "architecture",
+    "options"])
+
+# The outcome of a trained model.
+TrainingResult = collections.namedtuple("TrainingResult", [
+    "label", "league", "champion", "model_directory", "row_count", "error",
+    "duration"])
+
+
+def model_directory(root, label, league=None, champion=0):
+    """Get the directory of a model.
+
+    Parameters:
+        root: directory containing every model.
+        label: statistic label predicted by the model.
+        league: Optional league the model is restricted to.
+        champion: Optional champion id the model is restricted to.
+    Returns:
+        The directory in which the model checkpoint is written.
+    """
+    directory = os.path.join(root, label)
+    if league is not None:
+        directory = os.path.join(
+            directory, "league_%s" % constants_pb2.League.Name(league))
+    if champion:
+        directory = os.path.join(directory, "champion_%d" % champion)
+    return directory
+
+
+def _load_task_data(task):
+    """Load the inputs and answers of a task from the shared data.
+
+    Returns:
+        A tuple (input size, inputs, answers).
+    """
+    if task.feature_store is not None:
+        store = feature_store.FeatureStore(task.feature_store)
+        rows = store.rows(league=task.league, champion=task.champion,
+                          winner=True)
+        statistics = store.statistics[rows]
+        label_index = store.column(task.label)
+        input_size = len(store.labels) - 1
+    else:
+        statistics = numpy.load(task.statistics_path, mmap_mode="r")
+        label_index = fetcher.STATISTIC_LABELS.index(task.label)
+        input_size = len(fetcher.STATISTIC_LABELS) - 1
+
+    inputs, answers = fetcher.leave_one_out(statistics, label_index)
+    return input_size, inputs, answers
+
+
+def train_model(task):
+    """Train the model of a task, creating its graph if required.
+
+    Run in a worker of the process pool: the graph and the session are owned
+    by the call.
+
+    Parameters:
+        task: the TrainingTask to run.
+    Returns:
+        A TrainingResult. Its row count is 0 if the model has no row to be
+        trained on.
+    """
+    start = time.time()
+    input_size, inputs, answers = _load_task_data(task)
+    if not len(inputs):
+        return TrainingResult(task.label, task.league, task.champion,
+                              task.model_directory, 0, None, 0.)
+
+    model_path = os.path.join(task.model_directory, "model.ckpt")
+    if not os.path.exists(model_path + ".meta"):
+        GraphBuilder(input_size, task.architecture).generate_graph(
+            task.model_directory)
+
+    session_config = tf.ConfigProto(
+        intra_op_parallelism_threads=task.threads,
+        inter_op_parallelism_threads=task.threads)
+    with tf.Graph().as_default():
+        trainer = GraphTrainer(model_path, task.learning_rate,
+                               session_config=session_config)
+        try:
+            error = trainer.fit(inputs, answers, **task.options)
+            trainer.save()
+        finally:
+            trainer.close()
+
+    return TrainingResult(task.label, task.league, task.champion,
+                          task.model_directory, len(inputs), error,
+                          time.time() - start)
+
+
+def fetch_dataset(statistics_path, size):
+    """Fetch a dataset from the rawdata fetcher and save it as a .npy file.
+
+    Run in its own process: gRPC does not support forking a process which
+    used it, so the process forking the training pool never opens a channel.
+    """
+    numpy.save(statistics_path, fetcher.fetch_statistics_batch(size))
+
+
+def create_tasks(root, labels, leagues=(), champions=(), store=None,
+                 statistics_path=None, learning_rate=None, threads=1,
+                 architecture=None, options=None):
+    """Create the training task of every model.
+
+    Every label gets a model trained on all the participants, plus a variant
+    for each league and each champion.
+
+    Parameters:
+        root: directory containing every model.
+        labels: statistic labels to predict.
+        leagues: leagues for which variants are trained.
+        champions: champion ids for which variants are trained.
+        store: Optional feature store directory holding the shared data.
+        statistics_path: Optional .npy file holding the shared data, if no
+            feature store is given.
+        learning_rate: Optional learning rate of the optimizer.
+        threads: number of threads of each session.
+        architecture: Optional Architecture of the generated networks.
+        options: Optional keyword arguments of GraphTrainer.fit.
+    Returns:
+        A list of TrainingTask.
+    """
+    restrictions = [(None, 0)]
+    restrictions.extend((league, 0) for league in leagues)
+    restrictions.extend((None, champion) for champion in champions)
+
+    return [TrainingTask(label, league, champion,
+                         model_directory(root, label, league, champion),
+                         store, statistics_path, learning_rate, threads,
+                         architecture, options or {})
+            for label in labels
+            for league, champion in restrictions]
+
+
+def main():
+    leagues = [constants_pb2.League.Value(league) for league in FLAGS.leagues]
+    champions = [int(champion) for champion in FLAGS.champions]
+    if (leagues or champions) and FLAGS.feature_store is None:
+        raise ValueError("Per-league and per-champion models require a "
+                         "feature store.")
+
+    temporary_directory = None
+    statistics_path = None
+    if FLAGS.feature_store is None:
+        # Fetch the dataset once and share it with the workers.
+        temporary_directory = tempfile.mkdtemp()
+        statistics_path = os.path.join(temporary_directory,
+                                       _STATISTICS_FILENAME)
+        process = multiprocessing.Process(
+            target=fetch_dataset,
+            args=(statistics_path, FLAGS.dataset_size))
+        process.start()
+        process.join()
+        if process.exitcode:
+            raise RuntimeError("The dataset could not be fetched.")
+
+    tasks = create_tasks(
+        FLAGS.models_directory, FLAGS.labels, leagues, champions,
+        store=FLAGS.feature_store, statistics_path=statistics_path,
+        learning_rate=FLAGS.learning_rate, threads=FLAGS.threads_per_model,
+        architecture=flags.architecture_from_flags(),
+        options={
+            "epochs": max(FLAGS.epochs, 1),
+            "batch_size": FLAGS.batch_size,
+            "validation_split": FLAGS.validation_split,
+            "eval_every": FLAGS.eval_every,
+            "checkpoint_every": FLAGS.checkpoint_every,
+        })
+
+    pool = multiprocessing.Pool(min(FLAGS.training_processes, len(tasks)))
+    try:
+        for result in pool.imap_unordered(train_model, tasks):
+            if not result.row_count:
+                print("%s: no participant to train on." %
+                      result.model_directory)
+                continue
+            print("%s: %d participants in %.1fs, validation mean absolute "
+                  "error %s" % (result.model_directory, result.row_count,
+                                result.duration, result.error))
+    finally:
+        pool.close()
+        pool.join()
+        if temporary_directory is not None:
+            shutil.rmtree(temporary_directory)
+
+
+if __name__ == '__main__':
+    FLAGS(sys.argv)
+    logging.getLogger().setLevel(logging.INFO)
+    main()
@@ -0,0 +1,63 @@
+import gflags
+import mock
+import numpy
+import os
+import shutil
+import tempfile
+import unittest
+
+from powerspikegg.computation_models.fetcher import fetcher
+from powerspikegg.computation_models.match import train_all
+
+FLAGS = gflags.FLAGS
+
+
+class TrainAllTest(unittest.TestCase):
+    """Checks the orchestrator trains a model per label in a process pool."""
+
+    def setUp(self):
+        """Create the models directory."""
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """Remove the models directory."""
+        shutil.rmtree(self.directory)
+
+    def test_create_tasks(self):
+        """Tests a task is created per label and variant."""
+        tasks = train_all.create_tasks(self.directory, ["kills", "deaths"],
+                                       champions=[42])
+        self.assertEqual([task.model_directory for task in tasks], [
+            os.path.join(self.directory, "kills"),
+            os.path.join(self.directory, "kills/champion_42"),
+            os.path.join(self.directory, "deaths"),
+            os.path.join(self.directory, "deaths/champion_42"),
+        ])
+
+    def test_train_fetched_dataset(self):
+        """Tests a model is trained for every label on a fetched dataset."""
+        statistics = numpy.random.RandomState(0).uniform(
+            0, 10, size=(64, len(fetcher.STATISTIC_LABELS)))
+        FLAGS(["train_all",
+               "--models_directory", self.directory,
+               "--labels", "kills,deaths",
+               "--training_processes", "2",
+               "--architecture", "shallow",
+               "--dataset_size", "64",
+               "--batch_size", "16",
+               "--epochs", "1",
+               "--eval_every", "0",
+               "--checkpoint_every", "0"])
+
+        # The dataset is fetched by a forked process, which inherits the mock.
+        with mock.patch.object(fetcher, "fetch_statistics_batch",
+                               return_value=statistics):
+            train_all.main()
+
+        for label in ("kills", "deaths"):
+            self.assertTrue(os.path.exists(os.path.join(
+                self.directory, label, "model.ckpt.index")))
+
+
+if __name__ == "__main__":
+    unittest.main()
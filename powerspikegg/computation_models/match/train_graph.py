@@ -1,10 +1,14 @@
 """ Train an existing graph """
 
 import gflags
+import logging
 import sys
 
+from powerspikegg.computation_models.match import flags
 from powerspikegg.computation_models.match.train import GraphTrainer
+from powerspikegg.computation_models.fetcher import feature_store
 from powerspikegg.computation_models.fetcher import fetcher
+from powerspikegg.computation_models.fetcher import pipeline
 
 gflags.DEFINE_string("model_path", "/tmp/model/model.ckpt",
                      "Path to the model definition")
@@ -12,26 +16,45 @@ gflags.DEFINE_integer("iteration", 1,
                       "Number of training iterations")
 gflags.DEFINE_string("field_name", "kills",
                      "Name of the stats to use for training")
-gflags.DEFINE_float("learning_rate", 0.01,
-                    "Rate for the optimizer (Addagram)")
+gflags.DEFINE_integer("prefetch_depth", 4,
+                      "Number of batches fetched ahead of the training")
+gflags.DEFINE_integer("prefetch_workers", 2,
+                      "Number of threads fetching batches")
 FLAGS = gflags.FLAGS
 
 
-def main():
-    trainer = GraphTrainer(FLAGS.model_path, FLAGS.learning_rate)
+def train_from_feature_store(trainer):
+    """Train on batches sliced from the feature store."""
+    store = feature_store.FeatureStore(FLAGS.feature_store)
+    rows = feature_store.training_rows(store)
+    if not len(rows):
+        raise ValueError("No participant to train on.")
+
+    # Iterations loop over the selected rows as many times as required.
+    step = 0
+    while step < FLAGS.iteration:
+        for data, answer in store.batches(FLAGS.field_name, FLAGS.batch_size,
+                                          rows):
+            trainer.train(data=data, answer=answer, iteration=1)
+            step += 1
+            if step >= FLAGS.iteration:
+                break
+
+
+def train_from_fetcher(trainer, batches):
+    """Train on batches fetched from the rawdata fetcher."""
     for step in range(FLAGS.iteration):
-        stats = [(stat["data"], stat["expected"]) for stat in
-                 fetcher.fetch_and_sanitize(2)
-                 if stat["label"] == FLAGS.field_name]
-        data, expected = zip(*stats)
+        data, expected = batches.get()
+        if not len(data):
+            continue
         trainer.train(
                 data=data,
-                answer=[[exp] for exp in expected],
+                answer=expected,
                 iteration=1
         )
         res, score, placeholder, answer = trainer.evaluate(
                 inputs=data,
-                answers=[[exp] for exp in expected]
+                answers=expected
         )
         print("--------------")
         print("result")
@@ -39,9 +62,59 @@ def main():
         print(answer)
         print(score)
         print(" ")
+
+
+def train_for_epochs(trainer):
+    """Train over a materialized dataset for several epochs."""
+    if FLAGS.feature_store is not None:
+        store = feature_store.FeatureStore(FLAGS.feature_store)
+        statistics = store.statistics[feature_store.training_rows(store)]
+        label_index = store.column(FLAGS.field_name)
+    else:
+        statistics = fetcher.fetch_statistics_batch(FLAGS.dataset_size)
+        label_index = fetcher.STATISTIC_LABELS.index(FLAGS.field_name)
+    if not len(statistics):
+        raise ValueError("No participant to train on.")
+
+    data, expected = fetcher.leave_one_out(statistics, label_index)
+    error = trainer.fit(
+            data, expected,
+            epochs=FLAGS.epochs,
+            batch_size=FLAGS.batch_size,
+            validation_split=FLAGS.validation_split,
+            eval_every=FLAGS.eval_every,
+            checkpoint_every=FLAGS.checkpoint_every)
+    print("Validation mean absolute error: %s" % error)
+
+
+def main():
+    trainer = GraphTrainer(FLAGS.model_path, FLAGS.learning_rate)
+    if FLAGS.epochs:
+        train_for_epochs(trainer)
+        trainer.save()
+        return
+
+    if FLAGS.feature_store is not None:
+        train_from_feature_store(trainer)
+        trainer.save()
+        return
+
+    label_index = fetcher.STATISTIC_LABELS.index(FLAGS.field_name)
+
+    def fetch_batch():
+        """Fetch a batch of inputs and answers for the trained label."""
+        return fetcher.leave_one_out(
+                fetcher.fetch_statistics_batch(FLAGS.batch_size), label_index)
+
+    with pipeline.PrefetchPipeline(fetch_batch, FLAGS.prefetch_depth,
+                                   FLAGS.prefetch_workers) as batches:
+        train_from_fetcher(trainer, batches)
+    print("Input pipeline stalled %.2fs over %d batches." % (
+        batches.stall_time, batches.batch_count))
     trainer.save()
 
 
 if __name__ == '__main__':
     FLAGS(sys.argv)
+    logging.getLogger().setLevel(logging.INFO)
     main()
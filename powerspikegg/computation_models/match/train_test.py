@@ -0,0 +1,73 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy
+import tensorflow as tf
+
+from powerspikegg.computation_models.match import graph
+from powerspikegg.computation_models.match import train
+
+
+class GraphTrainerTest(unittest.TestCase):
+    """Checks the training steps train the model in training mode."""
+
+    def setUp(self):
+        """Generate a normalized model."""
+        self.model_directory = tempfile.mkdtemp()
+        builder = graph.GraphBuilder(
+            4, graph.ARCHITECTURES["normalized_shallow"])
+        builder.generate_graph(self.model_directory)
+
+    def tearDown(self):
+        """Remove the model."""
+        shutil.rmtree(self.model_directory)
+
+    def test_batch_normalization_updated(self):
+        """Tests a training step updates the moving statistics used for
+        inference."""
+        with tf.Graph().as_default():
+            trainer = train.GraphTrainer(
+                self.model_directory + "/model.ckpt")
+            moving_means = [variable for variable in tf.global_variables()
+                            if "moving_mean" in variable.name]
+            self.assertTrue(moving_means)
+            before = trainer.sess.run(moving_means)
+
+            data = numpy.random.RandomState(0).normal(
+                5, 1, size=(32, 4)).astype(numpy.float32)
+            trainer.train(data, numpy.ones((32, 1), dtype=numpy.float32))
+
+            after = trainer.sess.run(moving_means)
+            self.assertFalse(all(numpy.array_equal(b, a)
+                                 for b, a in zip(before, after)))
+
+    def test_fit(self):
+        """Tests fitting a toy dataset lowers the validation error and
+        checkpoints the model."""
+        random = numpy.random.RandomState(0)
+        inputs = random.uniform(0, 1, size=(512, 4)).astype(numpy.float32)
+        answers = inputs.sum(axis=1, keepdims=True)
+        checkpoint_index = self.model_directory + "/model.ckpt.index"
+
+        with tf.Graph().as_default():
+            trainer = train.GraphTrainer(
+                self.model_directory + "/model.ckpt")
+            # The checkpoint is removed once loaded, so fit writes it back.
+            os.remove(checkpoint_index)
+            error_before = trainer.mean_error(inputs, answers)
+
+            validation_error = trainer.fit(
+                inputs, answers, epochs=5, batch_size=32,
+                validation_split=.2, eval_every=10, checkpoint_every=10,
+                seed=0)
+
+            self.assertIsNotNone(validation_error)
+            self.assertLess(trainer.mean_error(inputs, answers),
+                            error_before)
+            self.assertTrue(os.path.exists(checkpoint_index))
+
+
+if __name__ == "__main__":
+    unittest.main()
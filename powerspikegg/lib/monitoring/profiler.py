@@ -0,0 +1,289 @@
+""" Statistical profiler of the servers
+
+A background thread periodically samples the stacks of every thread of the
+process (e.g. the gRPC workers). The samples are:
+
+    - aggregated on demand, for a requested duration, as collapsed stacks
+      ready to be rendered by flamegraph.pl:
+
+        curl 'http://localhost:8003/profile?seconds=30' > fetcher.folded
+        flamegraph.pl fetcher.folded > fetcher.svg
+
+    - aggregated over a rolling window by function, to export the ratio of the
+      samples spent in the hottest functions as Prometheus metrics.
+
+Threads waiting for work (on a condition, a selector, a socket, the queue of
+a pool of threads or the completion queue of a gRPC server) are not sampled,
+so the profiles only show where the CPU and the blocking calls of the
+requests go. Sleeping threads are sampled, as a sleep may be a blocking call
+of a request (e.g. waiting for the rate limiter of the Riot API).
+"""
+
+import collections
+import contextlib
+import gflags
+import logging
+import os
+import sys
+import threading
+import time
+
+if sys.version_info > (3, 0):
+    from http.server import BaseHTTPRequestHandler
+    from http.server import HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import parse_qs
+    from urllib.parse import urlparse
+else:
+    from BaseHTTPServer import BaseHTTPRequestHandler
+    from BaseHTTPServer import HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import parse_qs
+    from urlparse import urlparse
+
+from prometheus_client import core
+
+FLAGS = gflags.FLAGS
+
+gflags.DEFINE_boolean("enable_profiler", False,
+                      "sample the stacks of the threads and serve the "
+                      "profiles over HTTP")
+gflags.DEFINE_integer("profiler_port", 8003,
+                      "port on which the profiles are served")
+gflags.DEFINE_integer("profiler_sample_interval", 20,
+                      "interval, in milliseconds, between two samples of the "
+                      "stacks")
+gflags.DEFINE_integer("profiler_max_seconds", 300,
+                      "longest profile which can be requested, in seconds")
+gflags.DEFINE_integer("profiler_window", 60,
+                      "duration, in seconds, of the window over which the hot "
+                      "functions are computed")
+gflags.DEFINE_integer("profiler_top_functions", 20,
+                      "number of hot functions exported as metrics")
+
+samples_counter = core.Counter(
+    "profiler_samples_total",
+    "Stacks sampled by the profiler",
+)
+
+hot_functions = core.Gauge(
+    "profiler_hot_function_ratio",
+    "Ratio of the samples of the rolling window spent in a function",
+    ["function"],
+)
+
+# Functions in which a thread is considered waiting for work, by
+# (file name, function name) of the innermost frame. Some of them block in C
+# functions, which have no frame: an idle worker of a pool of threads waits
+# in concurrent.futures.thread._worker and a gRPC server polls its completion
+# queue in grpc._server._serve.
+_IDLE_FRAMES = frozenset([
+    ("threading.py", "wait"),
+    ("selectors.py", "select"),
+    ("socket.py", "accept"),
+    ("thread.py", "_worker"),
+    ("_server.py", "_serve"),
+])
+
+# Number of buckets the rolling window is split in.
+_WINDOW_BUCKETS = 6
+
+
+def _frame_name(code):
+    """Name of a frame in the collapsed stacks, e.g. fetcher/cache.py:find."""
+    directory, filename = os.path.split(code.co_filename)
+    return "%s/%s:%s" % (os.path.basename(directory), filename, code.co_name)
+
+
+def collapse_stack(frame):
+    """Collapse the stack of a frame, from the outermost to the innermost
+    function, separated by semicolons.
+
+    Returns:
+        The collapsed stack, or None if the frame waits for work.
+    """
+    code = frame.f_code
+    if (os.path.basename(code.co_filename), code.co_name) in _IDLE_FRAMES:
+        return None
+
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame.f_code))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class StackSampler:
+    """Periodically sample the stacks of the threads of the process."""
+
+    def __init__(self, interval, window, top_functions):
+        """Constructor.
+
+        Parameters:
+            interval: time between two samples, in seconds.
+            window: duration of the window of the hot functions, in seconds.
+            top_functions: number of hot functions exported.
+        """
+        self.interval = interval
+        self.top_functions = top_functions
+        self._bucket_duration = float(window) / _WINDOW_BUCKETS
+
+        self._lock = threading.Lock()
+        self._captures = []
+        self._buckets = collections.deque(maxlen=_WINDOW_BUCKETS)
+        self._bucket_end = None
+        self._exported_functions = set()
+
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start sampling in a background thread."""
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run,
+                                        name="StackSampler")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Stop sampling."""
+        self._stop_event.set()
+        self._thread.join()
+
+    def collect(self, duration):
+        """Aggregate the samples taken during a duration.
+
+        Returns:
+            A collections.Counter of the collapsed stacks.
+        """
+        capture = collections.Counter()
+        with self._lock:
+            self._captures.append(capture)
+        try:
+            self._stop_event.wait(duration)
+        finally:
+            with self._lock:
+                self._captures.remove(capture)
+        return capture
+
+    def _run(self):
+        """Sample the stacks until stopped."""
+        while not self._stop_event.wait(self.interval):
+            self.sample()
+
+    def sample(self):
+        """Sample the stacks of every thread but the sampler."""
+        now = time.time()
+        current_thread = threading.current_thread().ident
+        stacks = []
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == current_thread:
+                continue
+            stack = collapse_stack(frame)
+            if stack is not None:
+                stacks.append(stack)
+        frame = None  # Frames must not outlive the sample.
+
+        with self._lock:
+            if self._bucket_end is None or now >= self._bucket_end:
+                self._rotate(now)
+            bucket = self._buckets[-1]
+            for stack in stacks:
+                bucket[stack.rsplit(";", 1)[-1]] += 1
+                for capture in self._captures:
+                    capture[stack] += 1
+        samples_counter.inc(len(stacks))
+
+    def _rotate(self, now):
+        """Export the hot functions of the window and open a new bucket."""
+        if self._buckets:
+            self.export_hot_functions()
+        self._buckets.append(collections.Counter())
+        self._bucket_end = now + self._bucket_duration
+
+    def export_hot_functions(self):
+        """Set the gauges of the hottest functions of the window."""
+        window = collections.Counter()
+        for bucket in self._buckets:
+            window.update(bucket)
+        total = float(sum(window.values()))
+
+        exported = set()
+        for function, count in window.most_common(self.top_functions):
+            hot_functions.labels(function).set(count / total)
+            exported.add(function)
+        # The functions which are not hot anymore are reset.
+        for function in self._exported_functions - exported:
+            hot_functions.labels(function).set(0)
+        self._exported_functions = exported
+
+
+class _ProfileRequestHandler(BaseHTTPRequestHandler):
+    """Serve the collapsed stacks of a profile at /profile?seconds=N."""
+
+    sampler = None
+
+    def do_GET(self):
+        """Profile the process for the requested duration."""
+        url = urlparse(self.path)
+        if url.path != "/profile":
+            self.send_error(404)
+            return
+
+        try:
+            seconds = float(parse_qs(url.query).get("seconds", ["10"])[0])
+        except ValueError:
+            seconds = -1
+        if not 0 < seconds <= FLAGS.profiler_max_seconds:
+            self.send_error(400, "seconds must be in ]0, %d]." %
+                            FLAGS.profiler_max_seconds)
+            return
+
+        stacks = self.sampler.collect(seconds)
+        body = "".join("%s %d\n" % (stack, count)
+                       for stack, count in sorted(stacks.items()))
+        body = body.encode("utf-8")
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        """Log the requests in the debug logs."""
+        logging.debug("Profiler: " + format, *args)
+
+
+class _ProfileServer(ThreadingMixIn, HTTPServer):
+    """Serve the profiles, one thread per request."""
+
+    daemon_threads = True
+
+
+@contextlib.contextmanager
+def profiling():
+    """Create a context sampling the stacks and serving the profiles, if
+    enabled."""
+    if not FLAGS.enable_profiler:
+        yield
+        return
+
+    sampler = StackSampler(FLAGS.profiler_sample_interval / 1000.,
+                           FLAGS.profiler_window,
+                           FLAGS.profiler_top_functions)
+    handler = type("ProfileRequestHandler", (_ProfileRequestHandler,),
+                   {"sampler": sampler})
+    server = _ProfileServer(("", FLAGS.profiler_port), handler)
+    server_thread = threading.Thread(target=server.serve_forever)
+    server_thread.daemon = True
+
+    sampler.start()
+    server_thread.start()
+    logging.info("Profiler started up on :%d" % FLAGS.profiler_port)
+    try:
+        yield
+    finally:
+        server.shutdown()
+        server.server_close()
+        sampler.stop()
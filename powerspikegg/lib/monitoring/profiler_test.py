@@ -0,0 +1,95 @@
+import threading
+import time
+import unittest
+
+from concurrent import futures
+
+from prometheus_client import core
+
+from powerspikegg.lib.monitoring import profiler
+
+
+def busy_function(stop_event):
+    """Burn the CPU until stopped."""
+    while not stop_event.is_set():
+        sum(range(1000))
+
+
+def sleeping_function(duration):
+    """Sleep for a duration."""
+    time.sleep(duration)
+
+
+class TestStackSampler(unittest.TestCase):
+    """Tests the stacks of the threads are sampled."""
+
+    def setUp(self):
+        """Start a thread burning the CPU."""
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=busy_function,
+                                       args=(self.stop_event,))
+        self.thread.start()
+
+    def tearDown(self):
+        """Stop the busy thread."""
+        self.stop_event.set()
+        self.thread.join()
+
+    def test_collapsed_stacks(self):
+        """Tests a profile contains the stacks of the busy thread."""
+        sampler = profiler.StackSampler(0.001, 60, 10)
+        sampler.start()
+        try:
+            stacks = sampler.collect(0.05)
+        finally:
+            sampler.stop()
+
+        busy_stacks = [stack for stack in stacks
+                       if stack.endswith("profiler_test.py:busy_function")]
+        self.assertTrue(busy_stacks)
+        self.assertTrue(busy_stacks[0].split(";")[0].endswith(
+            "threading.py:_bootstrap"))
+        # The test thread waits in collect, it is not sampled.
+        self.assertFalse([stack for stack in stacks if "collect" in stack])
+
+    def test_idle_threads(self):
+        """Tests the idle workers of a pool are not sampled, unlike the
+        sleeping threads."""
+        pool = futures.ThreadPoolExecutor(2)
+        list(pool.map(abs, range(10)))
+        sleeping_thread = threading.Thread(target=sleeping_function,
+                                           args=(0.2,))
+        sleeping_thread.start()
+        try:
+            sampler = profiler.StackSampler(0.001, 60, 10)
+            sampler.start()
+            try:
+                stacks = sampler.collect(0.05)
+            finally:
+                sampler.stop()
+        finally:
+            pool.shutdown()
+            sleeping_thread.join()
+
+        self.assertTrue([stack for stack in stacks
+                         if stack.endswith("busy_function")])
+        self.assertTrue([stack for stack in stacks
+                         if stack.endswith("sleeping_function")])
+        self.assertFalse([stack for stack in stacks
+                          if stack.endswith("thread.py:_worker")])
+
+    def test_hot_functions(self):
+        """Tests the busy function is exported as a hot function."""
+        sampler = profiler.StackSampler(0.001, 60, 10)
+        for _ in range(10):
+            sampler.sample()
+        sampler.export_hot_functions()
+
+        ratio = core.REGISTRY.get_sample_value(
+            "profiler_hot_function_ratio",
+            {"function": "monitoring/profiler_test.py:busy_function"})
+        self.assertGreater(ratio, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
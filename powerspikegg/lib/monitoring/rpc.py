@@ -1,5 +1,8 @@
 import functools
 import gflags
+import inspect
+import threading
+import time
 
 from prometheus_client import core
 
@@ -8,14 +11,78 @@ import powerspikegg.lib.monitoring.server  # used for flag enable_prometheus
 FLAGS = gflags.FLAGS
 
 gflags.DEFINE_boolean("enable_rpc_monitoring", True, "enable rpc monitoring")
+gflags.DEFINE_list("rpc_latency_buckets",
+                   [".001", ".0025", ".005", ".01", ".025", ".05", ".1", ".25",
+                    ".5", "1", "2.5", "5", "10", "30", "60"],
+                   "Upper bounds, in seconds, of the buckets of the endpoints "
+                   "latency histograms.")
+gflags.DEFINE_list("rpc_stream_message_buckets",
+                   ["1", "2", "5", "10", "20", "50", "100", "200", "500",
+                    "1000", "5000"],
+                   "Upper bounds of the buckets of the histogram of the "
+                   "number of messages per stream.")
 
 counter = None  # Counter is only initialized if required
 
+# Histograms and gauges are created on the first monitored call, once the
+# flags defining their buckets are parsed.
+_metrics = None
+_metrics_lock = threading.Lock()
+
+
+def _get_metrics():
+    """Get the latency and stream metrics, creating them if required.
+
+    Returns:
+        A dictionary of the metrics, by name.
+    """
+    global _metrics
+    with _metrics_lock:
+        if _metrics is None:
+            latency_buckets = [float(b) for b in FLAGS.rpc_latency_buckets]
+            _metrics = {
+                "latency": core.Histogram(
+                    'rpc_endpoint_latency_seconds',
+                    'Processing time of the unary gRPC endpoints',
+                    ['rpc'], buckets=latency_buckets),
+                "in_flight": core.Gauge(
+                    'rpc_endpoint_in_flight',
+                    'Number of gRPC endpoint calls being processed',
+                    ['rpc']),
+                "first_message": core.Histogram(
+                    'rpc_stream_first_message_seconds',
+                    'Time before the first message of a gRPC stream',
+                    ['rpc'], buckets=latency_buckets),
+                "stream_duration": core.Histogram(
+                    'rpc_stream_duration_seconds',
+                    'Time between the call of a streaming gRPC endpoint and '
+                    'the end of its stream',
+                    ['rpc'], buckets=latency_buckets),
+                "stream_messages": core.Histogram(
+                    'rpc_stream_messages',
+                    'Number of messages sent by a gRPC stream', ['rpc'],
+                    buckets=[float(b)
+                             for b in FLAGS.rpc_stream_message_buckets]),
+            }
+        return _metrics
+
+
+def _is_enabled():
+    """Whether the endpoints are monitored."""
+    return FLAGS.enable_prometheus and FLAGS.enable_rpc_monitoring
+
 
 def endpoint_monitoring():
     """Decorator used to create automatically a monitoring entry in Prometheus.
 
-    TODO(funkysayu): Support monitoring of processing time of an endpoint.
+    The calls, successes and errors of the endpoint are counted, and the
+    endpoints being processed are tracked by an in-flight gauge.
+
+    For unary endpoints, the processing time is recorded by a latency
+    histogram. Streaming endpoints (generator functions) are measured while
+    their stream is consumed: the time to the first message, the duration of
+    the stream and its number of messages are recorded. A stream closed by the
+    client before its end is counted as cancelled.
     """
     global counter
     if counter is None:
@@ -29,15 +96,20 @@ def endpoint_monitoring():
         call_counter = counter.labels(endpoint_name, 'calls')
         success_counter = counter.labels(endpoint_name, 'success')
         error_counter = counter.labels(endpoint_name, 'errors')
+        cancel_counter = counter.labels(endpoint_name, 'cancelled')
 
         @functools.wraps(func)
         def wrapper(*args, **kwargs):
             """Wraps the endpoint function calls to increment counters."""
             # Act as if we didn't wrap this function if the feature is disabled
-            if not FLAGS.enable_prometheus or not FLAGS.enable_rpc_monitoring:
+            if not _is_enabled():
                 return func(*args, **kwargs)
 
+            metrics = _get_metrics()
+            in_flight = metrics["in_flight"].labels(endpoint_name)
             call_counter.inc()
+            in_flight.inc()
+            start = time.time()
 
             try:
                 result = func(*args, **kwargs)
@@ -46,6 +118,48 @@ def endpoint_monitoring():
             except:
                 error_counter.inc()
                 raise
+            finally:
+                metrics["latency"].labels(endpoint_name).observe(
+                    time.time() - start)
+                in_flight.dec()
+
+        @functools.wraps(func)
+        def stream_wrapper(*args, **kwargs):
+            """Wraps the endpoint streams to measure them while consumed."""
+            if not _is_enabled():
+                for message in func(*args, **kwargs):
+                    yield message
+                return
+
+            metrics = _get_metrics()
+            in_flight = metrics["in_flight"].labels(endpoint_name)
+            call_counter.inc()
+            in_flight.inc()
+            start = time.time()
+            message_count = 0
+
+            try:
+                for message in func(*args, **kwargs):
+                    if message_count == 0:
+                        metrics["first_message"].labels(
+                            endpoint_name).observe(time.time() - start)
+                    message_count += 1
+                    yield message
+                success_counter.inc()
+            except GeneratorExit:
+                cancel_counter.inc()
+                raise
+            except:
+                error_counter.inc()
+                raise
+            finally:
+                metrics["stream_duration"].labels(endpoint_name).observe(
+                    time.time() - start)
+                metrics["stream_messages"].labels(endpoint_name).observe(
+                    message_count)
+                in_flight.dec()
 
+        if inspect.isgeneratorfunction(func):
+            return stream_wrapper
         return wrapper
     return decorator
@@ -55,5 +55,72 @@ class TestRPCCounter(unittest.TestCase):
         self.assertEqual(1, error - start_error)
 
 
+class TestRPCLatency(unittest.TestCase):
+    """Tests the processing time of the endpoints and their streams are
+    measured."""
+
+    @classmethod
+    def setUpClass(self):
+        """Forces flags to enable prometheus."""
+        FLAGS(['program', '--enable_prometheus'])
+
+    def get_sample(self, name, endpoint):
+        """Gets the value of a sample of an endpoint, 0 if it is missing."""
+        return core.REGISTRY.get_sample_value(name, {'rpc': endpoint}) or 0
+
+    def test_unary_latency(self):
+        """Checks the latency of a unary endpoint is observed."""
+        @rpc.endpoint_monitoring()
+        def MyUnaryEndpoint():
+            self.assertEqual(1, self.get_sample(
+                'rpc_endpoint_in_flight', 'MyUnaryEndpoint'))
+            return None
+
+        MyUnaryEndpoint()
+        self.assertEqual(1, self.get_sample(
+            'rpc_endpoint_latency_seconds_count', 'MyUnaryEndpoint'))
+        self.assertEqual(0, self.get_sample(
+            'rpc_endpoint_in_flight', 'MyUnaryEndpoint'))
+
+    def test_stream_measured_while_consumed(self):
+        """Checks a stream is measured until its last message."""
+        @rpc.endpoint_monitoring()
+        def MyStreamEndpoint(count):
+            for index in range(count):
+                yield index
+
+        stream = MyStreamEndpoint(3)
+        self.assertEqual(0, self.get_sample(
+            'rpc_stream_duration_seconds_count', 'MyStreamEndpoint'))
+
+        self.assertEqual([0, 1, 2], list(stream))
+        self.assertEqual(1, self.get_sample(
+            'rpc_stream_first_message_seconds_count', 'MyStreamEndpoint'))
+        self.assertEqual(1, self.get_sample(
+            'rpc_stream_duration_seconds_count', 'MyStreamEndpoint'))
+        self.assertEqual(3, self.get_sample(
+            'rpc_stream_messages_sum', 'MyStreamEndpoint'))
+        self.assertEqual(0, self.get_sample(
+            'rpc_endpoint_in_flight', 'MyStreamEndpoint'))
+
+    def test_cancelled_stream(self):
+        """Checks a stream closed by the client is measured."""
+        @rpc.endpoint_monitoring()
+        def MyCancelledEndpoint():
+            for index in range(10):
+                yield index
+
+        stream = MyCancelledEndpoint()
+        next(stream)
+        self.assertEqual(1, self.get_sample(
+            'rpc_endpoint_in_flight', 'MyCancelledEndpoint'))
+        stream.close()
+
+        self.assertEqual(1, self.get_sample(
+            'rpc_stream_messages_sum', 'MyCancelledEndpoint'))
+        self.assertEqual(0, self.get_sample(
+            'rpc_endpoint_in_flight', 'MyCancelledEndpoint'))
+
+
 if __name__ == "__main__":
     unittest.main()
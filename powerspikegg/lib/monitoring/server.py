@@ -4,6 +4,7 @@ import logging
 
 from prometheus_client import start_http_server
 
+from powerspikegg.lib.monitoring import profiler
 from powerspikegg.lib.monitoring import watcher
 from powerspikegg.lib.monitoring import flags  # pylint: disable=unused-import
 
@@ -14,16 +15,21 @@ FLAGS = gflags.FLAGS
 gflags.DEFINE_integer("prometheus_server_port", 8002,
                       "port on which the prometheus server will listen")
 gflags.DEFINE_integer("prometheus_watcher_update_rate", 500,
-                      "update rate of the watchers")
+                      "interval, in milliseconds, between two updates of "
+                      "the watchers not defining their own interval")
 
 
 @contextlib.contextmanager
 def prometheus_monitoring():
-    """Starts the server in foreground."""
+    """Starts the server in foreground.
+
+    The profiler is started as well if enabled (see profiler.py).
+    """
     # TODO(funkysayu): refactor this so we have a clean server shutdown.
     if FLAGS.enable_prometheus:
         start_http_server(FLAGS.prometheus_server_port)
         logging.info("Prometheus server started up on :%d" %
                      FLAGS.prometheus_server_port)
     with watcher.create_context(FLAGS.prometheus_watcher_update_rate):
-        yield None
+        with profiler.profiling():
+            yield None
@@ -1,12 +1,92 @@
 import contextlib
 import gflags
+import heapq
+import logging
 import threading
 import time
 
+from concurrent import futures
+from prometheus_client import core
+
 from powerspikegg.lib.monitoring import flags  # pylint: disable=unused-import
 
 FLAGS = gflags.FLAGS
 
+gflags.DEFINE_integer("watcher_threads", 4,
+                      "number of threads running the watchers updates")
+gflags.DEFINE_integer("watcher_timeout", 5000,
+                      "default time, in milliseconds, after which a watcher "
+                      "update is reported as timed out")
+
+update_duration = core.Histogram(
+    "watcher_update_seconds",
+    "Duration of the updates of the watchers",
+    ["watcher"],
+    buckets=(.001, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10),
+)
+
+last_success = core.Gauge(
+    "watcher_last_success_timestamp_seconds",
+    "Time of the last successful update of the watchers",
+    ["watcher"],
+)
+
+update_errors = core.Counter(
+    "watcher_errors_total",
+    "Updates of the watchers which raised an exception or timed out",
+    ["watcher", "type"],
+)
+
+
+class _ScheduledWatcher:
+    """State of a watcher in the scheduler."""
+
+    def __init__(self, watcher, default_interval):
+        """Constructor.
+
+        Parameters:
+            watcher: the watcher instance.
+            default_interval: interval, in milliseconds, used if the watcher
+                does not define one.
+        """
+        self.watcher = watcher
+        self.name = type(watcher).__name__
+
+        interval = getattr(watcher, "interval", None)
+        self.interval = (interval or default_interval) / 1000.
+        timeout = getattr(watcher, "timeout", None)
+        self.timeout = (timeout or FLAGS.watcher_timeout) / 1000.
+
+        self.future = None
+        self.started_at = None
+        self.timed_out = False
+
+    def run(self):
+        """Update the watcher, recording the metrics of the update."""
+        start = time.time()
+        try:
+            self.watcher.update()
+        except Exception:
+            update_errors.labels(self.name, "exception").inc()
+            logging.exception("Update of the watcher %s failed.", self.name)
+            return
+        finally:
+            update_duration.labels(self.name).observe(time.time() - start)
+        last_success.labels(self.name).set(time.time())
+
+    def is_running(self, now):
+        """Checks if the previous update is still running, and report it once
+        if it exceeds the timeout."""
+        if self.future is None or self.future.done():
+            return False
+
+        if not self.timed_out and now - self.started_at > self.timeout:
+            self.timed_out = True
+            update_errors.labels(self.name, "timeout").inc()
+            logging.warning("Update of the watcher %s runs for more than "
+                            "%.3fs.", self.name, self.timeout)
+        return True
+
 
 class _Registry:
     """Manage the list of watchers registered from diverse libraries."""
@@ -14,6 +94,7 @@ class _Registry:
     def __init__(self):
         self.registered_watchers = []
         self._keep_alive = False
+        self._stop_event = threading.Event()
 
     def register_watcher(self, watcher_class):
         """Add a watcher class into the registry and initialize it."""
@@ -21,7 +102,13 @@ class _Registry:
         return watcher_class
 
     def start_watchers(self, update_rate):
-        """Starts a thread periodically updating registered watchers."""
+        """Starts a thread scheduling the updates of the registered watchers.
+
+        Parameters:
+            update_rate: interval, in milliseconds, between two updates of the
+                watchers not defining their own interval.
+        """
+        self._stop_event.clear()
         self._thread = threading.Thread(target=self._update_loop,
                                         args=(update_rate,))
         self._keep_alive = True
@@ -34,6 +121,7 @@ class _Registry:
     def stop_watchers(self):
         """Ensures the thread updating the watchers is stopped correctly."""
         self._keep_alive = False
+        self._stop_event.set()
         self._thread.join()
 
     @contextlib.contextmanager
@@ -50,20 +138,43 @@ class _Registry:
             self.stop_watchers()
 
     def _update_loop(self, update_rate):
-        """Periodically update the watchers so the metrics are up to date."""
-        while self._keep_alive:
-            # Checks every 50ms if the thread should be kept alive.
-            for waited_time in range(0, update_rate, 50):
-                if not self._keep_alive:
+        """Periodically update the watchers so the metrics are up to date.
+
+        Every watcher is updated on a pool of threads at its own interval. A
+        watcher whose previous update is still running is skipped, so a slow
+        watcher does not delay the others.
+        """
+        scheduled = [_ScheduledWatcher(watcher, update_rate)
+                     for watcher in self.registered_watchers]
+        start = time.time()
+        queue = [(start + watcher.interval, index)
+                 for index, watcher in enumerate(scheduled)]
+        heapq.heapify(queue)
+
+        pool = futures.ThreadPoolExecutor(max(FLAGS.watcher_threads, 1))
+        try:
+            while queue:
+                next_update, index = queue[0]
+                if self._stop_event.wait(max(next_update - time.time(), 0)):
                     return
-                time.sleep(0.05)
-            time.sleep(max(update_rate * 1. / 100 - waited_time, 0))
-
-            for watchers in self.registered_watchers:
-                try:
-                    watchers.update()
-                except:
-                    pass  # TODO(funkysayu): Might need some logging here.
+
+                now = time.time()
+                watcher = scheduled[index]
+                if not watcher.is_running(now):
+                    watcher.started_at = now
+                    watcher.timed_out = False
+                    watcher.future = pool.submit(watcher.run)
+
+                # Keep the cadence of the watcher, without catching up the
+                # updates missed while it was running.
+                next_update += watcher.interval
+                if next_update < now:
+                    next_update = now + watcher.interval
+                heapq.heapreplace(queue, (next_update, index))
+
+            self._stop_event.wait()
+        finally:
+            pool.shutdown(wait=False)
 
 
 # Defines the watcher module API.
@@ -1,8 +1,11 @@
 import gflags
 import mock
+import threading
 import time
 import unittest
 
+from prometheus_client import core
+
 from powerspikegg.lib.monitoring import watcher
 
 
@@ -29,7 +32,7 @@ class MonitoringWatcherTest(unittest.TestCase):
     @classmethod
     def setUpClass(cls):
         """Enable prometheus monitoring."""
-        FLAGS(["--enable_prometheus"])
+        FLAGS(["program", "--enable_prometheus"])
 
     def test_watcher_registration(self):
         """Tests watcher registration works as exepcted."""
@@ -62,5 +65,99 @@ class MonitoringWatcherTest(unittest.TestCase):
         self.assertFalse(watcher.REGISTRY.is_running())
 
 
+class IntervalWatcher:
+    """Watcher updated at its own interval."""
+
+    interval = 20
+
+    def __init__(self):
+        self.update = mock.Mock()
+
+
+class FailingWatcher:
+    """Watcher whose updates always fail."""
+
+    def update(self):
+        raise SomeException("Whoops! Broken watcher!")
+
+
+class SlowWatcher:
+    """Watcher whose updates exceed their timeout."""
+
+    timeout = 10
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.update = mock.Mock(side_effect=self.release.wait)
+
+
+class WatcherSchedulerTest(unittest.TestCase):
+    """Tests the watchers are updated independently at their interval."""
+
+    @classmethod
+    def setUpClass(cls):
+        """Enable prometheus monitoring."""
+        FLAGS(["program", "--enable_prometheus"])
+
+    def setUp(self):
+        """Use a registry containing only the tested watchers."""
+        self.registry = watcher._Registry()
+
+    def get_sample(self, name, **labels):
+        """Gets the value of a sample, 0 if it is missing."""
+        return core.REGISTRY.get_sample_value(name, labels) or 0
+
+    def test_watcher_interval(self):
+        """Tests a watcher defining an interval is updated at its rate."""
+        self.registry.register_watcher(IntervalWatcher)
+        self.registry.register_watcher(MockWatcher)
+        interval_watcher, mock_watcher = self.registry.registered_watchers
+
+        with self.registry.context_manager(1000):
+            time.sleep(0.11)
+        self.assertGreaterEqual(interval_watcher.update.call_count, 4)
+        mock_watcher.update.assert_not_called()
+
+    def test_failing_watcher(self):
+        """Tests an exception is counted and the updates go on."""
+        start_errors = self.get_sample("watcher_errors_total",
+                                       watcher="FailingWatcher",
+                                       type="exception")
+        self.registry.register_watcher(FailingWatcher)
+        self.registry.register_watcher(MockWatcher)
+        mock_watcher = self.registry.registered_watchers[1]
+
+        with self.registry.context_manager(20):
+            time.sleep(0.05)
+        self.assertGreaterEqual(self.get_sample(
+            "watcher_errors_total", watcher="FailingWatcher",
+            type="exception") - start_errors, 1)
+        self.assertGreaterEqual(mock_watcher.update.call_count, 1)
+        self.assertGreater(self.get_sample(
+            "watcher_last_success_timestamp_seconds",
+            watcher="MockWatcher"), 0)
+
+    def test_slow_watcher(self):
+        """Tests a slow watcher times out without delaying the others."""
+        start_timeouts = self.get_sample("watcher_errors_total",
+                                         watcher="SlowWatcher",
+                                         type="timeout")
+        self.registry.register_watcher(SlowWatcher)
+        self.registry.register_watcher(MockWatcher)
+        slow_watcher, mock_watcher = self.registry.registered_watchers
+
+        try:
+            with self.registry.context_manager(10):
+                time.sleep(0.1)
+        finally:
+            slow_watcher.release.set()
+
+        slow_watcher.update.assert_called_once()
+        self.assertGreaterEqual(mock_watcher.update.call_count, 5)
+        self.assertEqual(1, self.get_sample(
+            "watcher_errors_total", watcher="SlowWatcher",
+            type="timeout") - start_timeouts)
+
+
 if __name__ == "__main__":
     unittest.main()
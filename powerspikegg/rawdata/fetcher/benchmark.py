@@ -0,0 +1,303 @@
+""" Benchmark of the hot paths of the rawdata fetcher
+
+Start a local Mongo DB server (see lib/mongodb/wrapper.py), fill it with
+synthetic matches (see corpus.py), and measure:
+
+    - the throughput of JSONConverter.json_match_to_match_pb,
+    - the latency of CacheManager.find_match and CacheManager.save_match,
+    - the latency of aggregator.SearchMatchesMatchingQuery and
+      aggregator.AverageStatisticsOnQuery,
+    - the throughput of the Match and CacheQuery endpoints of a local gRPC
+      server, backed by the cache and a mock of the Riot API,
+
+for every cache size of --benchmark_sizes. The results are written as JSON
+and compared to a baseline, the benchmark failing if a result regressed by
+more than --benchmark_tolerance:
+
+    bazel run //powerspikegg/rawdata/fetcher:benchmark -- \\
+        --benchmark_sizes 10000,100000 --benchmark_output /tmp/results.json
+    bazel run //powerspikegg/rawdata/fetcher:benchmark -- \\
+        --benchmark_sizes 10000,100000 --benchmark_baseline /tmp/results.json
+
+"""
+
+import gflags
+import grpc
+import json
+import mock
+import random
+import sys
+import time
+
+from concurrent import futures
+
+from powerspikegg.lib.mongodb import wrapper
+from powerspikegg.rawdata.fetcher import aggregator
+from powerspikegg.rawdata.fetcher import cache
+from powerspikegg.rawdata.fetcher import converter
+from powerspikegg.rawdata.fetcher import corpus
+from powerspikegg.rawdata.fetcher import server
+from powerspikegg.rawdata.fetcher import service_pb2
+from powerspikegg.rawdata.public import constants_pb2
+from third_party.python.riotwatcher.rwmock import RiotWatcherMock
+
+
+FLAGS = gflags.FLAGS
+
+gflags.DEFINE_list("benchmark_sizes", ["10000", "100000", "1000000"],
+                   "Numbers of matches of the cache the benchmarks run on.")
+gflags.DEFINE_integer("benchmark_requests", 1000,
+                      "Number of measured calls per benchmark.")
+gflags.DEFINE_integer("benchmark_queries", 20,
+                      "Number of measured aggregations per benchmark.")
+gflags.DEFINE_integer("benchmark_concurrency", 8,
+                      "Number of concurrent clients of the gRPC server.")
+gflags.DEFINE_integer("benchmark_port", 50091,
+                      "Port of the benchmarked gRPC server.")
+gflags.DEFINE_integer("benchmark_insert_batch", 1000,
+                      "Number of matches inserted at once in the cache.")
+gflags.DEFINE_string("benchmark_output", "",
+                     "File the JSON results are written to. Empty to only "
+                     "print them.")
+gflags.DEFINE_string("benchmark_baseline", "",
+                     "JSON results of a previous run to compare against.")
+gflags.DEFINE_float("benchmark_tolerance", 0.2,
+                    "Relative degradation from the baseline reported as a "
+                    "regression.")
+
+_DATABASE_NAME = "benchmark"
+
+
+def _latencies(function, arguments):
+    """Measure the latency of a function called on every argument.
+
+    Returns:
+        A dictionary of the mean, p50 and p99 latencies, in seconds.
+    """
+    latencies = []
+    for argument in arguments:
+        start = time.time()
+        function(argument)
+        latencies.append(time.time() - start)
+    latencies.sort()
+    return {
+        "mean": sum(latencies) / len(latencies),
+        "p50": latencies[len(latencies) // 2],
+        "p99": latencies[min(int(len(latencies) * .99), len(latencies) - 1)],
+    }
+
+
+def _throughput(function, arguments, concurrency=1):
+    """Measure the number of calls per second of a function.
+
+    Parameters:
+        function: function called on every argument.
+        arguments: list of arguments.
+        concurrency: number of threads calling the function.
+    """
+    start = time.time()
+    if concurrency == 1:
+        for argument in arguments:
+            function(argument)
+    else:
+        pool = futures.ThreadPoolExecutor(concurrency)
+        try:
+            list(pool.map(function, arguments))
+        finally:
+            pool.shutdown()
+    return len(arguments) / (time.time() - start)
+
+
+def _add_latencies(results, name, latencies):
+    """Add latencies to the results, lower is better."""
+    for statistic, value in latencies.items():
+        results["%s_%s" % (name, statistic)] = {
+            "value": value, "unit": "s", "higher_is_better": False}
+
+
+def _add_throughput(results, name, value):
+    """Add a throughput to the results, higher is better."""
+    results[name] = {"value": value, "unit": "ops/s",
+                     "higher_is_better": True}
+
+
+def benchmark_converter(results):
+    """Measure the conversion of matches to protocol buffers."""
+    json_converter = converter.JSONConverter(None)
+    matches = list(corpus.generate_matches(0, FLAGS.benchmark_requests))
+    _add_throughput(results, "json_match_to_match_pb", _throughput(
+        json_converter.json_match_to_match_pb, matches))
+
+
+def fill_cache(collection, current_size, size):
+    """Insert synthetic matches until the collection contains size matches."""
+    batch = []
+    for match in corpus.generate_matches(current_size,
+                                           size - current_size):
+        batch.append(match)
+        if len(batch) >= FLAGS.benchmark_insert_batch:
+            collection.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        collection.insert_many(batch, ordered=False)
+
+
+def _match_requests(generator, size, count):
+    """Create requests of random matches of the cache, skipping the matches
+    rejected by the MatchFetcher service (see corpus.is_requestable)."""
+    requests = []
+    while len(requests) < count:
+        match_id = generator.randrange(size)
+        if not corpus.is_requestable(match_id):
+            continue
+        requests.append(service_pb2.MatchRequest(
+            id=match_id,
+            region=constants_pb2.Region.Value(corpus.match_region(match_id))))
+    return requests
+
+
+def benchmark_cache(results, cache_manager, size):
+    """Measure the cache accesses and the aggregations on a cache size."""
+    generator = random.Random(size)
+    requests = _match_requests(generator, size,
+                               FLAGS.benchmark_requests)
+    _add_latencies(results, "find_match[%d]" % size, _latencies(
+        cache_manager.find_match, requests))
+
+    # The saved matches are removed so every size is benchmarked on the same
+    # cache content.
+    saved_matches = list(corpus.generate_matches(
+        size, FLAGS.benchmark_requests, seed=1))
+    _add_latencies(results, "save_match[%d]" % size, _latencies(
+        cache_manager.save_match, saved_matches))
+    cache_manager.client[_DATABASE_NAME].matches.delete_many(
+        {"matchId": {"$gte": size}})
+
+    queries = [service_pb2.Query(
+        league=constants_pb2.League.Value(generator.choice(corpus.LEAGUES)[0]),
+        champion=constants_pb2.Champion(id=corpus.champion_id(
+            generator.randrange(corpus.CHAMPION_COUNT))))
+        for _ in range(FLAGS.benchmark_queries)]
+    collection = cache_manager.client[_DATABASE_NAME].matches
+    _add_latencies(results, "SearchMatchesMatchingQuery[%d]" % size,
+                   _latencies(lambda query: list(
+                       aggregator.SearchMatchesMatchingQuery(
+                           collection, query)), queries))
+    _add_latencies(results, "AverageStatisticsOnQuery[%d]" % size,
+                   _latencies(lambda query: (
+                       aggregator.AverageStatisticsOnQuery(collection, query)),
+                       queries))
+
+
+def benchmark_server(results, stub, size):
+    """Measure the throughput of the gRPC endpoints on a cache size."""
+    generator = random.Random(size)
+    requests = _match_requests(generator, size,
+                               FLAGS.benchmark_requests)
+    _add_throughput(results, "Match[%d]" % size, _throughput(
+        stub.Match, requests, FLAGS.benchmark_concurrency))
+
+    queries = [service_pb2.Query(
+        champion=constants_pb2.Champion(id=corpus.champion_id(
+            generator.randrange(corpus.CHAMPION_COUNT))),
+        sample_size=100) for _ in range(FLAGS.benchmark_queries)]
+    _add_throughput(results, "CacheQuery[%d]" % size, _throughput(
+        lambda query: list(stub.CacheQuery(query)), queries,
+        FLAGS.benchmark_concurrency))
+
+
+def compare_results(results, baseline, tolerance):
+    """Compare results to a baseline.
+
+    Returns:
+        A list of (name, baseline value, value, relative change) of the
+        results which regressed by more than the tolerance.
+    """
+    regressions = []
+    for name, result in sorted(results.items()):
+        if name not in baseline:
+            continue
+        reference = baseline[name]["value"]
+        if not reference:
+            continue
+        change = (result["value"] - reference) / reference
+        if result["higher_is_better"]:
+            change = -change
+        if change > tolerance:
+            regressions.append((name, reference, result["value"], change))
+    return regressions
+
+
+def run_benchmarks():
+    """Run the benchmarks on a local Mongo DB server.
+
+    Returns:
+        A dictionary mapping the benchmark names to their results.
+    """
+    # The game constants are not benchmarked, and must not reach the Riot API.
+    game_constant = converter.JSONConverter.game_constant = mock.Mock()
+    game_constant.get_summoner_spell_by_id.return_value = (
+        constants_pb2.SummonerSpell(id=1))
+    game_constant.get_champion_by_id.return_value = constants_pb2.Champion(
+        id=1)
+
+    results = {}
+    benchmark_converter(results)
+
+    mongo_server = wrapper.create_mongo_server()
+    grpc_server = None
+    try:
+        cache.CacheManager.address = "mongodb://%s/" % mongo_server.address
+        cache.CacheManager.database_name = _DATABASE_NAME
+        cache_manager = cache.CacheManager()
+        collection = cache_manager.client[_DATABASE_NAME].matches
+
+        server.MatchFetcher.riot_api_handler = RiotWatcherMock()
+        server.MatchFetcher.cache_manager = cache_manager
+        grpc_server, _ = server.start_server(
+            "benchmark", FLAGS.benchmark_port, FLAGS.benchmark_concurrency)
+        channel = grpc.insecure_channel("localhost:%d" % FLAGS.benchmark_port)
+        stub = service_pb2.MatchFetcherStub(channel)
+
+        current_size = 0
+        for size in sorted(int(size) for size in FLAGS.benchmark_sizes):
+            start = time.time()
+            fill_cache(collection, current_size, size)
+            current_size = size
+            print("Cache filled with %d matches in %.1fs." % (
+                size, time.time() - start))
+
+            benchmark_cache(results, cache_manager, size)
+            benchmark_server(results, stub, size)
+    finally:
+        if grpc_server is not None:
+            grpc_server.stop(0)
+        mongo_server.shutdown()
+
+    return results
+
+
+def main():
+    results = run_benchmarks()
+    for name, result in sorted(results.items()):
+        print("%-45s %14.6f %s" % (name, result["value"], result["unit"]))
+
+    if FLAGS.benchmark_output:
+        with open(FLAGS.benchmark_output, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if not FLAGS.benchmark_baseline:
+        return 0
+
+    with open(FLAGS.benchmark_baseline) as f:
+        baseline = json.load(f)
+    regressions = compare_results(results, baseline, FLAGS.benchmark_tolerance)
+    for name, reference, value, change in regressions:
+        print("REGRESSION %-34s %14.6f -> %14.6f (%+.1f%%)" % (
+            name, reference, value, change * 100))
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    FLAGS(sys.argv)
+    sys.exit(main())
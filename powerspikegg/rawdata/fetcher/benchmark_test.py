@@ -0,0 +1,37 @@
+import mock
+import random
+import unittest
+
+from powerspikegg.rawdata.fetcher import benchmark
+from powerspikegg.rawdata.fetcher import converter
+from powerspikegg.rawdata.fetcher import corpus
+from powerspikegg.rawdata.fetcher.server import MatchFetcher
+from powerspikegg.rawdata.public import constants_pb2
+
+
+class BenchmarkTest(unittest.TestCase):
+    """Checks the benchmarked requests are valid."""
+
+    def test_match_requests(self):
+        """Tests every generated request is answered by the servicer."""
+        m = converter.JSONConverter.game_constant = mock.Mock()
+        m.get_summoner_spell_by_id.return_value = constants_pb2.SummonerSpell(
+            id=1)
+        m.get_champion_by_id.return_value = constants_pb2.Champion(id=4242)
+
+        MatchFetcher.riot_api_handler = mock.Mock()
+        MatchFetcher.cache_manager = mock.Mock()
+        MatchFetcher.cache_manager.find_match.side_effect = (
+            lambda request: corpus.generate_match(request.id))
+        servicer = MatchFetcher("some random token")
+
+        requests = benchmark._match_requests(random.Random(0), 100, 200)
+        self.assertEqual(len(requests), 200)
+        for request in requests:
+            response = servicer.Match(request, mock.Mock())
+            self.assertEqual(response.id, request.id)
+            self.assertEqual(response.region, request.region)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,7 +1,11 @@
+import datetime
 import gflags
 import logging
 import pymongo
+import threading
+import time
 
+from collections import OrderedDict
 from functools import wraps
 from bson.objectid import ObjectId
 
@@ -33,6 +37,33 @@ gflags.DEFINE_integer(
     "mongodb_connection_retry",
     10,
     "maximum connection attempts to the mongo database.")
+gflags.DEFINE_integer(
+    "negative_cache_ttl",
+    3600,
+    "seconds during which an entity missing from the Riot API is not "
+    "requested again.")
+gflags.DEFINE_integer(
+    "negative_cache_max_size",
+    100000,
+    "maximum number of missing entities remembered in memory.")
+gflags.DEFINE_boolean(
+    "negative_cache_in_mongodb",
+    False,
+    "also store missing entities in the Mongo database, so they are shared "
+    "between servers and survive restarts.")
+
+
+def normalize_summoner_name(name):
+    """Normalize a summoner name the way the Riot API matches them.
+
+    Summoner names are matched case and space insensitively.
+
+    Parameters:
+        name: Summoner name to normalize.
+    Returns:
+        The summoner name in lower case, stripped of its whitespaces.
+    """
+    return "".join(name.split()).lower()
 
 
 def _silent_connection_failure(func):
@@ -58,6 +89,62 @@ def _silent_connection_failure(func):
     return wrapper
 
 
+def deduplicate_summoners(summoners):
+    """Keep a single entry per summoner in a summoners collection.
+
+    Summoners used to be inserted each time they were fetched, so databases
+    created before the summoners were indexed may contain several entries per
+    (region, id). The most recently inserted entry is kept, with the most
+    recent refresh high-water mark of the removed entries.
+
+    Parameters:
+        summoners: the summoners collection.
+    Returns:
+        The number of removed entries.
+    """
+    duplicates = summoners.aggregate([
+        {"$sort": {"_id": pymongo.DESCENDING}},
+        {"$group": {
+            "_id": {"region": "$region", "id": "$id"},
+            "entries": {"$push": "$_id"},
+            "lastMatchCreation": {"$max": "$lastMatchCreation"},
+        }},
+        {"$match": {"entries.1": {"$exists": True}}},
+    ], allowDiskUse=True)
+
+    removed = 0
+    for duplicate in duplicates:
+        kept, others = duplicate["entries"][0], duplicate["entries"][1:]
+        if duplicate["lastMatchCreation"] is not None:
+            summoners.update_one(
+                {"_id": kept},
+                {"$max": {"lastMatchCreation":
+                          duplicate["lastMatchCreation"]}})
+        result = summoners.delete_many({"_id": {"$in": others}})
+        removed += result.deleted_count
+    return removed
+
+
+def _create_summoner_id_index(summoners):
+    """Create the unique (region, id) index of a summoners collection,
+    removing the duplicated summoners first if the index cannot be built.
+
+    Parameters:
+        summoners: the summoners collection.
+    """
+    keys = [("region", pymongo.ASCENDING), ("id", pymongo.ASCENDING)]
+    try:
+        summoners.create_index(keys, background=True, unique=True)
+        return
+    except pymongo.errors.OperationFailure as e:
+        logging.warning("Unable to index the summoners (%s), removing the "
+                        "duplicated summoners.", e)
+
+    removed = deduplicate_summoners(summoners)
+    logging.warning("%d duplicated summoners removed.", removed)
+    summoners.create_index(keys, background=True, unique=True)
+
+
 class CacheManager:
     """Cache system abstraction for the server.
 
@@ -81,6 +168,13 @@ class CacheManager:
         monitoring.MongoDBWatcher.register_monitorable_collection(
             self.database_name, "summoners")
 
+        # Entities the Riot API reported as missing, mapped to the time their
+        # entry expires. The entries are pruned in insertion order, which is
+        # the expiration order except for the entries loaded from the
+        # database: their expiration is checked on lookup.
+        self._missing = OrderedDict()
+        self._missing_lock = threading.Lock()
+
         for _ in range(FLAGS.mongodb_connection_retry):
             self.client = self._connect(self.address)
             if self.client is not None:
@@ -103,6 +197,32 @@ class CacheManager:
             unique=True
         )
 
+        _create_summoner_id_index(client[self.database_name].summoners)
+        # Summoners only known by their ID (e.g. tracked for refreshes) have
+        # no name, so they are kept out of the name index.
+        client[self.database_name].summoners.create_index(
+            [("region", pymongo.ASCENDING),
+             ("normalizedName", pymongo.ASCENDING)],
+            background=True,
+            unique=True,
+            partialFilterExpression={"normalizedName": {"$exists": True}}
+        )
+
+        if FLAGS.negative_cache_in_mongodb:
+            client[self.database_name].missing.create_index(
+                [("entity", pymongo.ASCENDING),
+                 ("region", pymongo.ASCENDING),
+                 ("key", pymongo.ASCENDING)],
+                background=True,
+                unique=True
+            )
+            # Let the server remove expired entries by itself.
+            client[self.database_name].missing.create_index(
+                [("expireAt", pymongo.ASCENDING)],
+                background=True,
+                expireAfterSeconds=0
+            )
+
         # Send a query to the server to see if the connection is working.
         try:
             client.server_info()
@@ -112,6 +232,7 @@ class CacheManager:
 
         return client
 
+    @monitoring.timed_stage("find_match")
     @_silent_connection_failure
     def find_match(self, match_request):
         """Find a match in the cache.
@@ -128,6 +249,7 @@ class CacheManager:
         }
         return matches.find_one(selector)
 
+    @monitoring.timed_stage("save_match")
     @_silent_connection_failure
     def save_match(self, match_data):
         """Save a match in the cache database.
@@ -161,7 +283,7 @@ class CacheManager:
 
         selector = {"region": constants_pb2.Region.Name(summoner.region)}
         if summoner.name:
-            selector["name"] = summoner.name
+            selector["normalizedName"] = normalize_summoner_name(summoner.name)
         if summoner.id:
             selector["id"] = summoner.id
 
@@ -178,12 +300,172 @@ class CacheManager:
             region: Region in which the summoner leaves. Not contained in the
                 DTO, so must be specified.
         """
-        # Ensures key _id is dynamically managed
-        summoner_data["_id"] = ObjectId()
-        summoner_data["region"] = constants_pb2.Region.Name(region)
+        region_name = constants_pb2.Region.Name(region)
+        normalized_name = normalize_summoner_name(summoner_data["name"])
+
+        summoner_data["region"] = region_name
+        summoner_data["normalizedName"] = normalized_name
+
+        # Key _id is managed by the database on insertion.
+        fields = dict(summoner_data)
+        fields.pop("_id", None)
+
+        summoners = self.client[self.database_name].summoners
+
+        # A renamed summoner may have released its name to another one.
+        summoners.update_many(
+            {
+                "region": region_name,
+                "normalizedName": normalized_name,
+                "id": {"$ne": summoner_data["id"]},
+            },
+            {"$unset": {"normalizedName": ""}})
+        summoners.update_one(
+            {"region": region_name, "id": summoner_data["id"]},
+            {"$set": fields},
+            upsert=True)
+
+    @_silent_connection_failure
+    def find_summoner_last_match_time(self, summoner):
+        """Find the creation time of the last match seen for a summoner.
+
+        This is the high-water mark of the summoner refreshes: every match
+        played before this timestamp has already been requested.
+
+        Parameters:
+            summoner: A constants_pb2.Summoner message containing the summoner
+                id and region.
+        Returns:
+            The last seen match creation timestamp (in milliseconds) or None if
+            the summoner was never refreshed.
+        """
+        selector = {
+            "region": constants_pb2.Region.Name(summoner.region),
+            "id": summoner.id,
+        }
+
+        summoners = self.client[self.database_name].summoners
+        summoner_data = summoners.find_one(
+            selector, projection={"lastMatchCreation": True})
+        if summoner_data is None:
+            return None
+        return summoner_data.get("lastMatchCreation")
+
+    @_silent_connection_failure
+    def save_summoner_last_match_time(self, summoner, last_match_creation):
+        """Save the creation time of the last match seen for a summoner.
+
+        The summoner entry is created if it does not exist yet, so summoners
+        refreshed from their ID only are tracked too.
+
+        Parameters:
+            summoner: A constants_pb2.Summoner message containing the summoner
+                id and region.
+            last_match_creation: Creation timestamp (in milliseconds) of the
+                most recent match seen for this summoner.
+        """
+        selector = {
+            "region": constants_pb2.Region.Name(summoner.region),
+            "id": summoner.id,
+        }
 
         summoners = self.client[self.database_name].summoners
-        summoners.insert_one(summoner_data)
+        summoners.update_one(
+            selector,
+            {"$max": {"lastMatchCreation": last_match_creation}},
+            upsert=True)
+
+    def _prune_missing(self, now):
+        """Drop the expired and exceeding in memory missing entities.
+
+        Must be called with the missing entities lock held.
+
+        Parameters:
+            now: Current timestamp, in seconds.
+        """
+        while self._missing:
+            _, expiration = next(iter(self._missing.items()))
+            if (expiration > now and
+                    len(self._missing) <= FLAGS.negative_cache_max_size):
+                break
+            self._missing.popitem(last=False)
+
+    @_silent_connection_failure
+    def is_known_missing(self, entity, region, key):
+        """Check if an entity was recently reported missing by the Riot API.
+
+        Parameters:
+            entity: Kind of the entity (e.g. "match" or "summoner").
+            region: Region of the entity, as a constants_pb2.Region value.
+            key: Identifier used to request the entity (ID or name).
+        Returns:
+            True if the entity is known to be missing, False else.
+        """
+        cache_key = (entity, constants_pb2.Region.Name(region), key)
+        now = time.time()
+
+        with self._missing_lock:
+            self._prune_missing(now)
+            expiration = self._missing.get(cache_key)
+            if expiration is not None and expiration > now:
+                monitoring.negative_cache_counter.labels(
+                    entity=entity, result="hit").inc()
+                return True
+
+        if FLAGS.negative_cache_in_mongodb:
+            utc_now = datetime.datetime.utcnow()
+            missing = self.client[self.database_name].missing
+            entry = missing.find_one({
+                "entity": cache_key[0],
+                "region": cache_key[1],
+                "key": cache_key[2],
+                "expireAt": {"$gt": utc_now},
+            })
+            if entry is not None:
+                # The entry is kept in memory until it expires in the
+                # database, so the processes do not extend each other entries.
+                remaining = (entry["expireAt"] - utc_now).total_seconds()
+                with self._missing_lock:
+                    self._missing[cache_key] = now + remaining
+                monitoring.negative_cache_counter.labels(
+                    entity=entity, result="hit").inc()
+                return True
+
+        monitoring.negative_cache_counter.labels(
+            entity=entity, result="miss").inc()
+        return False
+
+    @_silent_connection_failure
+    def save_missing(self, entity, region, key):
+        """Remember an entity reported missing by the Riot API.
+
+        Parameters:
+            entity: Kind of the entity (e.g. "match" or "summoner").
+            region: Region of the entity, as a constants_pb2.Region value.
+            key: Identifier used to request the entity (ID or name).
+        """
+        cache_key = (entity, constants_pb2.Region.Name(region), key)
+        now = time.time()
+
+        with self._missing_lock:
+            self._missing.pop(cache_key, None)
+            self._missing[cache_key] = now + FLAGS.negative_cache_ttl
+            self._prune_missing(now)
+        monitoring.negative_cache_counter.labels(
+            entity=entity, result="insertion").inc()
+
+        if FLAGS.negative_cache_in_mongodb:
+            expire_at = (datetime.datetime.utcnow() +
+                         datetime.timedelta(seconds=FLAGS.negative_cache_ttl))
+            missing = self.client[self.database_name].missing
+            missing.update_one(
+                {
+                    "entity": cache_key[0],
+                    "region": cache_key[1],
+                    "key": cache_key[2],
+                },
+                {"$set": {"expireAt": expire_at}},
+                upsert=True)
 
     def query_matches_cache(self, query_pb):
         """Query the cache based on a query message.
@@ -1,3 +1,4 @@
+import datetime
 import gflags
 import json
 import mock
@@ -110,7 +111,9 @@ class CacheManagerTest(unittest.TestCase):
         collection = self.setup_test_collection().summoners
         region = constants_pb2.EUW
         sample_with_region = dict(
-            SAMPLES["summoner"], region=constants_pb2.Region.Name(region))
+            SAMPLES["summoner"], region=constants_pb2.Region.Name(region),
+            normalizedName=cache.normalize_summoner_name(
+                SAMPLES["summoner"]["name"]))
         collection.insert_one(sample_with_region)
 
         manager = cache.CacheManager()
@@ -134,6 +137,126 @@ class CacheManagerTest(unittest.TestCase):
         ))
         self.assertEquals(summoner, sample_with_region)
 
+    def test_find_summoner_normalized_name(self):
+        """Tests summoner names are matched case and space insensitively."""
+        self.setup_test_collection()
+        manager = cache.CacheManager()
+        manager.save_summoner(dict(SAMPLES["summoner"]), constants_pb2.EUW)
+
+        summoner = manager.find_summoner(constants_pb2.Summoner(
+            name="  fOObar ", region=constants_pb2.EUW))
+        self.assertIsNotNone(summoner)
+        self.assertEqual(summoner["id"], SAMPLES["summoner"]["id"])
+
+        summoner = manager.find_summoner(constants_pb2.Summoner(
+            name="foobar", region=constants_pb2.NA))
+        self.assertIsNone(summoner)
+
+    def test_summoner_saved_once(self):
+        """Tests saving a summoner twice updates the existing entry."""
+        collection = self.setup_test_collection().summoners
+        manager = cache.CacheManager()
+
+        manager.save_summoner_last_match_time(constants_pb2.Summoner(
+            id=SAMPLES["summoner"]["id"], region=constants_pb2.EUW), 1000)
+        manager.save_summoner(dict(SAMPLES["summoner"]), constants_pb2.EUW)
+        manager.save_summoner(dict(SAMPLES["summoner"]), constants_pb2.EUW)
+
+        self.assertEqual(collection.count(), 1)
+        summoner = collection.find_one()
+        self.assertEqual(summoner["name"], SAMPLES["summoner"]["name"])
+        self.assertEqual(summoner["lastMatchCreation"], 1000)
+
+    def test_duplicated_summoners(self):
+        """Tests the summoners inserted on every fetch before the summoners
+        were indexed are deduplicated."""
+        collection = self.setup_test_collection().summoners
+        for revision, last_match_creation in ((1, 2000), (2, None), (3, 1000)):
+            summoner = dict(SAMPLES["summoner"], region="EUW",
+                            revisionDate=revision)
+            if last_match_creation is not None:
+                summoner["lastMatchCreation"] = last_match_creation
+            collection.insert_one(summoner)
+        collection.insert_one(dict(SAMPLES["summoner"], region="NA"))
+
+        manager = cache.CacheManager()
+
+        self.assertEqual(collection.count(), 2)
+        summoner = collection.find_one({"region": "EUW"})
+        self.assertEqual(summoner["revisionDate"], 3)
+        self.assertEqual(summoner["lastMatchCreation"], 2000)
+
+        # The unique index now prevents new duplicates.
+        manager.save_summoner(dict(SAMPLES["summoner"]), constants_pb2.EUW)
+        self.assertEqual(collection.count(), 2)
+
+    def test_summoner_last_match_time(self):
+        """Tests the summoner refresh high-water mark is stored and kept."""
+        collection = self.setup_test_collection().summoners
+        summoner = constants_pb2.Summoner(
+            id=SAMPLES["summoner"]["id"], region=constants_pb2.EUW)
+
+        manager = cache.CacheManager()
+        self.assertIsNone(manager.find_summoner_last_match_time(summoner))
+
+        manager.save_summoner_last_match_time(summoner, 1000)
+        self.assertEqual(manager.find_summoner_last_match_time(summoner), 1000)
+
+        # An older timestamp must never move the mark backward.
+        manager.save_summoner_last_match_time(summoner, 500)
+        self.assertEqual(manager.find_summoner_last_match_time(summoner), 1000)
+
+        manager.save_summoner_last_match_time(summoner, 2000)
+        self.assertEqual(manager.find_summoner_last_match_time(summoner), 2000)
+        self.assertEqual(collection.count(), 1)
+
+    def test_negative_cache(self):
+        """Tests missing entities are remembered until they expire."""
+        self.setup_test_collection()
+        manager = cache.CacheManager()
+
+        self.assertFalse(manager.is_known_missing(
+            "match", constants_pb2.EUW, 4242))
+        manager.save_missing("match", constants_pb2.EUW, 4242)
+        self.assertTrue(manager.is_known_missing(
+            "match", constants_pb2.EUW, 4242))
+
+        # Other regions and entities are not affected.
+        self.assertFalse(manager.is_known_missing(
+            "match", constants_pb2.NA, 4242))
+        self.assertFalse(manager.is_known_missing(
+            "summoner", constants_pb2.EUW, 4242))
+
+        expired = time.time() + FLAGS.negative_cache_ttl + 1
+        with mock.patch.object(cache.time, "time", return_value=expired):
+            self.assertFalse(manager.is_known_missing(
+                "match", constants_pb2.EUW, 4242))
+
+    def test_negative_cache_in_mongodb(self):
+        """Tests missing entities are shared through the database."""
+        collection = self.setup_test_collection().missing
+        FLAGS.negative_cache_in_mongodb = True
+        try:
+            cache.CacheManager().save_missing(
+                "summoner", constants_pb2.EUW, "Foo Bar")
+            self.assertEqual(collection.count(), 1)
+
+            # The entry expires in memory when it expires in the database.
+            collection.update_one({}, {"$set": {
+                "expireAt": (datetime.datetime.utcnow() +
+                             datetime.timedelta(seconds=10))}})
+            manager = cache.CacheManager()
+            self.assertTrue(manager.is_known_missing(
+                "summoner", constants_pb2.EUW, "Foo Bar"))
+
+            collection.delete_many({})
+            expired = time.time() + 11
+            with mock.patch.object(cache.time, "time", return_value=expired):
+                self.assertFalse(manager.is_known_missing(
+                    "summoner", constants_pb2.EUW, "Foo Bar"))
+        finally:
+            FLAGS.negative_cache_in_mongodb = False
+
     def test_cache_query_forwarded_to_aggregator(self):
         """Tests the cache query are forwarded to the aggregator."""
         manager = cache.CacheManager()
@@ -1,3 +1,4 @@
+from powerspikegg.rawdata.fetcher import monitoring
 from powerspikegg.rawdata.fetcher import service_pb2
 from powerspikegg.rawdata.public import match_pb2
 from powerspikegg.rawdata.public import constants_pb2
@@ -8,6 +9,27 @@ Convert a match in JSON to the protocol buffer message associated.
 """
 
 
+def get_role(json_timeline):
+    """Solve the role of a participant from its timeline.
+
+    Parameters:
+        json_timeline: a JSON formated as the Riot API's ParticipantTimeline
+            DTO [1].
+    Returns:
+        A constants_pb2.Role value.
+    Raises:
+        KeyError: If the JSON is not formated as expected.
+        ValueError: If the lane is not supported.
+
+      [1] https://developer.riotgames.com/api/methods#!/1224/4756
+    """
+    if json_timeline["lane"] == "BOTTOM":
+        if json_timeline["role"] == "DUO_CARRY":
+            return constants_pb2.ADCARRY
+        return constants_pb2.SUPPORT
+    return constants_pb2.Role.Value(json_timeline["lane"])
+
+
 class ConstantSolver():
     """Helper class solving game constants and caching them.
 
@@ -183,14 +205,7 @@ class JSONConverter():
             summoner.league = constants_pb2.League.Value(
                 participant_json["highestAchievedSeasonTier"])
 
-            if participant_json["timeline"]["lane"] == "BOTTOM":
-                if participant_json["timeline"]["role"] == "DUO_CARRY":
-                    role = constants_pb2.ADCARRY
-                else:
-                    role = constants_pb2.SUPPORT
-            else:
-                role = constants_pb2.Role.Value(
-                    participant_json["timeline"]["lane"])
+            role = get_role(participant_json["timeline"])
 
             participant = match_pb2.Participant(
                 id=participant_json["participantId"],
@@ -267,6 +282,7 @@ class JSONConverter():
 
         return detail
 
+    @monitoring.timed_stage("json_match_to_match_pb")
     def json_match_to_match_pb(self, json_entry):
         """Build a MatchReference protobuf from a JSON entry representing a match.
 
@@ -0,0 +1,396 @@
+""" Synthetic corpus of matches
+
+Generate matches in the Riot API MatchDetail format, with the structure of
+the rwmock sample and realistic distributions of:
+
+    - regions and their platform,
+    - patches (matchVersion) and creation dates,
+    - leagues, players of a match being close to each other,
+    - champions, following a skewed popularity,
+    - roles, durations, winners and player statistics.
+
+A match only depends on its identifier and on the seed of the corpus, so the
+corpus can be generated in parallel or regenerated on demand (e.g. by a fake
+Riot API) without being stored.
+
+The generated matches are inserted in the cache database by a pool of
+processes:
+
+    bazel run //powerspikegg/rawdata/fetcher:corpus -- \\
+        --corpus_size 1000000 \\
+        --rawdata_cache_server_address localhost:27017
+
+"""
+
+import bisect
+import gflags
+import json
+import logging
+import math
+import multiprocessing
+import pymongo
+import random
+import sys
+import time
+
+from powerspikegg.rawdata.fetcher import cache  # pylint: disable=unused-import
+from powerspikegg.rawdata.public import constants_pb2
+from third_party.python.riotwatcher.rwmock import SAMPLES
+
+
+FLAGS = gflags.FLAGS
+
+gflags.DEFINE_integer("corpus_size", 1000000,
+                      "Number of generated matches.")
+gflags.DEFINE_integer("corpus_first_match_id", 1,
+                      "Identifier of the first generated match.")
+gflags.DEFINE_integer("corpus_seed", 0,
+                      "Seed of the corpus. The same seed generates the same "
+                      "matches.")
+gflags.DEFINE_integer("corpus_summoners", 200000,
+                      "Number of distinct summoners playing the matches.")
+gflags.DEFINE_integer("corpus_workers", multiprocessing.cpu_count(),
+                      "Number of processes generating the matches.")
+gflags.DEFINE_integer("corpus_shard_size", 50000,
+                      "Number of matches generated by a process at once.")
+gflags.DEFINE_integer("corpus_batch_size", 1000,
+                      "Number of matches inserted at once.")
+
+# Regions, their platform and their share of the matches.
+REGIONS = [
+    ("EUW", "EUW1", .28),
+    ("NA", "NA1", .22),
+    ("KR", "KR", .18),
+    ("EUNE", "EUN1", .1),
+    ("BR", "BR1", .07),
+    ("TR", "TR1", .04),
+    ("LAN", "LA1", .03),
+    ("LAS", "LA2", .03),
+    ("RU", "RU", .03),
+    ("OCE", "OC1", .02),
+]
+
+# Patches, their release time (ms since epoch) and their share of the
+# matches. The last patches have more matches, as the fetcher only keeps
+# recent matches up to date.
+PATCHES = [
+    ("6.18.161.355", 1473249600000, .04),
+    ("6.19.164.4331", 1474459200000, .05),
+    ("6.20.166.3339", 1475668800000, .07),
+    ("6.21.170.3484", 1476878400000, .09),
+    ("6.22.167.6212", 1478088000000, .12),
+    ("6.23.166.2676", 1479297600000, .18),
+    ("6.24.170.2158", 1480507200000, .2),
+    ("7.1.172.3473", 1481716800000, .25),
+]
+_PATCH_DURATION = 14 * 24 * 3600 * 1000
+
+# Leagues and their share of the players.
+LEAGUES = [
+    ("BRONZE", .28),
+    ("SILVER", .36),
+    ("GOLD", .23),
+    ("PLATINUM", .09),
+    ("DIAMOND", .035),
+    ("MASTER", .004),
+    ("CHALLENGER", .001),
+]
+
+# Number of champions, their popularity follows a Zipf law.
+CHAMPION_COUNT = 134
+_CHAMPION_POPULARITY_EXPONENT = .8
+
+# Lane and role of the participants of a team, by position.
+POSITIONS = [
+    ("TOP", "SOLO"),
+    ("JUNGLE", "NONE"),
+    ("MIDDLE", "SOLO"),
+    ("BOTTOM", "DUO_CARRY"),
+    ("BOTTOM", "DUO_SUPPORT"),
+]
+
+# Mean kills, deaths and assists by position, in a match as long as the
+# sample.
+_KDA_MEANS = [
+    (4.5, 5., 6.),
+    (4., 5., 9.),
+    (6., 5., 7.),
+    (7., 5., 7.),
+    (1.5, 5.5, 12.),
+]
+
+# Statistics which are not scaled with the duration of the match.
+_UNSCALED_STATISTICS = frozenset([
+    "champLevel", "largestMultiKill", "totalScoreRank", "totalPlayerScore",
+    "objectivePlayerScore", "combatPlayerScore", "kills", "deaths",
+    "assists", "winner",
+])
+
+_TEMPLATE = json.dumps(SAMPLES["match"])
+_TEMPLATE_DURATION = float(SAMPLES["match"]["matchDuration"])
+
+
+def _cumulative(weights):
+    """Cumulative distribution of a list of weights."""
+    total = float(sum(weights))
+    distribution = []
+    cumulated = 0.
+    for weight in weights:
+        cumulated += weight / total
+        distribution.append(cumulated)
+    distribution[-1] = 1.
+    return distribution
+
+
+_REGION_DISTRIBUTION = _cumulative([r[2] for r in REGIONS])
+_PATCH_DISTRIBUTION = _cumulative([p[2] for p in PATCHES])
+_LEAGUE_DISTRIBUTION = _cumulative([l[1] for l in LEAGUES])
+_CHAMPION_DISTRIBUTION = _cumulative([
+    1. / (rank ** _CHAMPION_POPULARITY_EXPONENT)
+    for rank in range(1, CHAMPION_COUNT + 1)])
+
+
+def _choose(generator, values, distribution):
+    """Choose a value following a cumulative distribution."""
+    return values[bisect.bisect_left(distribution, generator.random())]
+
+
+def _poisson(generator, mean):
+    """Draw an integer following a Poisson distribution (Knuth)."""
+    limit = math.exp(-mean)
+    count = -1
+    product = 1.
+    while product > limit:
+        count += 1
+        product *= generator.random()
+    return count
+
+
+# Champion identifiers by popularity rank, by seed.
+_champion_identifiers = {}
+
+
+def champion_id(rank, seed=0):
+    """Identifier of the champion of a popularity rank.
+
+    The identifiers are shuffled, so the most popular champions are not the
+    first ones.
+    """
+    if seed not in _champion_identifiers:
+        identifiers = list(range(1, CHAMPION_COUNT + 1))
+        random.Random(seed).shuffle(identifiers)
+        _champion_identifiers[seed] = identifiers
+    return _champion_identifiers[seed][rank]
+
+
+def summoner_name(summoner_id):
+    """Name of a generated summoner."""
+    return "Summoner%d" % summoner_id
+
+
+def _generate_participant(generator, participant, position, duration_ratio,
+                          league, champion, winner):
+    """Fill a participant of the template."""
+    lane, role = POSITIONS[position]
+    participant["championId"] = champion
+    participant["highestAchievedSeasonTier"] = league
+    participant["timeline"]["lane"] = lane
+    participant["timeline"]["role"] = role
+
+    stats = participant["stats"]
+    skill = generator.lognormvariate(0, .35)
+    for name, value in stats.items():
+        if (name in _UNSCALED_STATISTICS or name.startswith("item") or
+                isinstance(value, bool) or
+                not isinstance(value, (int, float))):
+            continue
+        stats[name] = int(round(value * duration_ratio * skill *
+                                generator.lognormvariate(0, .2)))
+
+    kills, deaths, assists = _KDA_MEANS[position]
+    performance = 1.3 if winner else .75
+    stats["kills"] = _poisson(generator, kills * duration_ratio * performance)
+    stats["deaths"] = _poisson(generator,
+                               deaths * duration_ratio / performance)
+    stats["assists"] = _poisson(generator,
+                                assists * duration_ratio * performance)
+    stats["largestMultiKill"] = min(stats["kills"], 1 + _poisson(generator,
+                                                                  .4))
+    stats["champLevel"] = max(1, min(18, int(round(
+        13 * duration_ratio ** .5 + generator.gauss(0, 1)))))
+    stats["winner"] = winner
+
+
+def match_region(match_id, seed=0):
+    """Region of a generated match, without generating the whole match."""
+    generator = random.Random(seed * 1000000007 + match_id)
+    return _choose(generator, REGIONS, _REGION_DISTRIBUTION)[0]
+
+
+def is_requestable(match_id, seed=0):
+    """Whether a generated match can be requested from the MatchFetcher.
+
+    The service rejects the requests having a field left to its default
+    value, i.e. the match 0 and the matches of the first region of the Region
+    enumeration (BR).
+    """
+    return match_id > 0 and constants_pb2.Region.Value(
+        match_region(match_id, seed)) != 0
+
+
+def generate_match(match_id, seed=0, summoner_count=200000):
+    """Generate a match.
+
+    Parameters:
+        match_id: identifier of the match.
+        seed: seed of the corpus.
+        summoner_count: number of distinct summoners of the corpus.
+    Returns:
+        A match in the Riot API MatchDetail format.
+    """
+    generator = random.Random(seed * 1000000007 + match_id)
+    match = json.loads(_TEMPLATE)
+
+    region, platform = _choose(generator, REGIONS, _REGION_DISTRIBUTION)[:2]
+    version, release, _ = _choose(generator, PATCHES, _PATCH_DISTRIBUTION)
+    duration = int(min(max(generator.gauss(1800, 420), 900), 3600))
+    duration_ratio = duration / _TEMPLATE_DURATION
+
+    match["matchId"] = match_id
+    match["region"] = region
+    match["platformId"] = platform
+    match["matchVersion"] = version
+    match["matchCreation"] = release + generator.randrange(_PATCH_DURATION)
+    match["matchDuration"] = duration
+
+    # The players of a match are in the same league, or a neighbour one.
+    league_index = LEAGUES.index(_choose(generator, LEAGUES,
+                                         _LEAGUE_DISTRIBUTION))
+    champion_ranks = set()
+    while len(champion_ranks) < 10:
+        champion_ranks.add(_choose(generator, range(CHAMPION_COUNT),
+                                   _CHAMPION_DISTRIBUTION))
+    champion_ranks = list(champion_ranks)
+    generator.shuffle(champion_ranks)
+
+    blue_wins = generator.random() < .5
+    for team in match["teams"]:
+        team["winner"] = (team["teamId"] == 100) == blue_wins
+
+    for index, (participant, identity) in enumerate(zip(
+            match["participants"], match["participantIdentities"])):
+        team_id = 100 if index < 5 else 200
+        participant["teamId"] = team_id
+        neighbour = max(0, min(len(LEAGUES) - 1, league_index +
+                               generator.choice((-1, 0, 0, 0, 1))))
+        _generate_participant(
+            generator, participant, index % 5, duration_ratio,
+            LEAGUES[neighbour][0],
+            champion_id(champion_ranks[index], seed),
+            (team_id == 100) == blue_wins)
+
+        summoner_id = generator.randrange(summoner_count) + 1
+        identity["player"]["summonerId"] = summoner_id
+        identity["player"]["summonerName"] = summoner_name(summoner_id)
+        identity["player"]["matchHistoryUri"] = (
+            "/v1/stats/player_history/%s/%d" % (platform, summoner_id))
+
+    return match
+
+
+def generate_matches(first_match_id, count, seed=0, summoner_count=200000):
+    """Generate consecutive matches.
+
+    Returns:
+        A generator of matches, see generate_match.
+    """
+    for match_id in range(first_match_id, first_match_id + count):
+        yield generate_match(match_id, seed, summoner_count)
+
+
+def insert_shard(arguments):
+    """Generate and insert a shard of matches. Run in a pool of processes.
+
+    Parameters:
+        arguments: tuple (server address, database name, first match id,
+            number of matches, seed, number of summoners, batch size).
+    Returns:
+        The number of inserted matches.
+    """
+    (address, database_name, first_match_id, count, seed, summoner_count,
+     batch_size) = arguments
+
+    # Clients must not be shared between processes.
+    client = pymongo.MongoClient("mongodb://%s/" % address)
+    try:
+        matches = client[database_name].matches
+        batch = []
+        for match in generate_matches(first_match_id, count, seed,
+                                      summoner_count):
+            batch.append(match)
+            if len(batch) >= batch_size:
+                matches.insert_many(batch, ordered=False)
+                batch = []
+        if batch:
+            matches.insert_many(batch, ordered=False)
+    finally:
+        client.close()
+    return count
+
+
+def populate(address, database_name, first_match_id, size, seed=0,
+             summoner_count=200000, workers=1, shard_size=50000,
+             batch_size=1000):
+    """Insert a corpus of matches in a cache database.
+
+    Parameters:
+        address: address of the Mongo DB server.
+        database_name: name of the cache database.
+        first_match_id: identifier of the first match.
+        size: number of matches.
+        seed: seed of the corpus.
+        summoner_count: number of distinct summoners.
+        workers: number of processes generating the matches.
+        shard_size: number of matches generated by a process at once.
+        batch_size: number of matches inserted at once.
+    """
+    shards = [(address, database_name, start,
+               min(shard_size, first_match_id + size - start), seed,
+               summoner_count, batch_size)
+              for start in range(first_match_id, first_match_id + size,
+                                 shard_size)]
+
+    if workers <= 1:
+        for shard in shards:
+            insert_shard(shard)
+        return
+
+    pool = multiprocessing.Pool(workers)
+    try:
+        inserted = 0
+        start = time.time()
+        for count in pool.imap_unordered(insert_shard, shards):
+            inserted += count
+            logging.info("%d/%d matches inserted (%.0f matches/s).",
+                         inserted, size, inserted / (time.time() - start))
+    finally:
+        pool.close()
+        pool.join()
+
+
+def main():
+    start = time.time()
+    populate(FLAGS.rawdata_cache_server_address,
+             FLAGS.rawdata_cache_database_name, FLAGS.corpus_first_match_id,
+             FLAGS.corpus_size, FLAGS.corpus_seed, FLAGS.corpus_summoners,
+             FLAGS.corpus_workers, FLAGS.corpus_shard_size,
+             FLAGS.corpus_batch_size)
+    print("%d matches inserted into %s in %.1fs." % (
+        FLAGS.corpus_size, FLAGS.rawdata_cache_database_name,
+        time.time() - start))
+
+
+if __name__ == '__main__':
+    FLAGS(sys.argv)
+    logging.getLogger().setLevel(logging.INFO)
+    main()
@@ -0,0 +1,77 @@
+import collections
+import mock
+import unittest
+
+from powerspikegg.rawdata.fetcher import converter
+from powerspikegg.rawdata.fetcher import corpus
+from powerspikegg.rawdata.public import constants_pb2
+
+
+class CorpusTest(unittest.TestCase):
+    """Checks the generated matches are valid and reproducible."""
+
+    def test_reproducible(self):
+        """Tests a match only depends on its identifier and the seed."""
+        self.assertEqual(corpus.generate_match(42), corpus.generate_match(42))
+        self.assertNotEqual(corpus.generate_match(42),
+                            corpus.generate_match(42, seed=1))
+
+    def test_match_region(self):
+        """Tests the region of a match is known without generating it."""
+        for match_id in range(20):
+            self.assertEqual(corpus.match_region(match_id, seed=3),
+                             corpus.generate_match(match_id, seed=3)["region"])
+
+    def test_is_requestable(self):
+        """Tests the match 0 and the matches of BR cannot be requested."""
+        self.assertFalse(corpus.is_requestable(0))
+        for match_id in range(1, 100):
+            self.assertEqual(corpus.is_requestable(match_id),
+                             corpus.match_region(match_id) != "BR")
+
+    def test_match_structure(self):
+        """Tests the participants of a match are consistent."""
+        match = corpus.generate_match(4242)
+
+        self.assertEqual(match["matchId"], 4242)
+        self.assertIn(match["region"],
+                      [region for region, _, _ in corpus.REGIONS])
+        champions = [p["championId"] for p in match["participants"]]
+        self.assertEqual(len(set(champions)), 10)
+
+        winners = [team["winner"] for team in match["teams"]]
+        self.assertEqual(sorted(winners), [False, True])
+        for participant in match["participants"]:
+            team_winner = winners[0 if participant["teamId"] == 100 else 1]
+            self.assertEqual(participant["stats"]["winner"], team_winner)
+
+    def test_distributions(self):
+        """Tests the popular champions and leagues are the most frequent."""
+        champions = collections.Counter()
+        leagues = collections.Counter()
+        for match in corpus.generate_matches(0, 500):
+            for participant in match["participants"]:
+                champions[participant["championId"]] += 1
+                leagues[participant["highestAchievedSeasonTier"]] += 1
+
+        self.assertGreater(champions[corpus.champion_id(0)],
+                           champions[corpus.champion_id(100)])
+        self.assertGreater(leagues["SILVER"], leagues["DIAMOND"])
+
+    def test_conversion(self):
+        """Tests the generated matches are supported by the converter."""
+        m = converter.JSONConverter.game_constant = mock.Mock()
+        m.get_summoner_spell_by_id.return_value = constants_pb2.SummonerSpell(
+            id=1)
+        m.get_champion_by_id.return_value = constants_pb2.Champion(id=4242)
+
+        match_pb = converter.JSONConverter(None).json_match_to_match_pb(
+            corpus.generate_match(1))
+        self.assertEqual(match_pb.id, 1)
+        participants = [participant for team in match_pb.detail.teams
+                        for participant in team.participants]
+        self.assertEqual(len(participants), 10)
+
+
+if __name__ == "__main__":
+    unittest.main()
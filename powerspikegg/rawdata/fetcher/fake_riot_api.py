@@ -0,0 +1,550 @@
+""" Fake Riot API server
+
+Serve the match, match list, summoner and static data routes of the Riot API
+from the synthetic corpus (see corpus.py), so the fetcher can be tested under
+load without a Riot API key:
+
+    - the matches of the corpus are generated on demand,
+    - the match list of a summoner is a deterministic sample of the matches of
+      its region,
+    - the summoners are the ones of the corpus, named "SummonerN",
+    - the static data routes serve the champions of the corpus and the
+      summoner spells.
+
+The server mimics the behavior of the real API:
+
+    - responses are delayed following a latency distribution, e.g.
+      "lognormal:40:0.5" for a median of 40ms,
+    - the rate limits of every API key are enforced on sliding windows,
+      answering 429 with a Retry-After header once a window is full,
+    - a ratio of the requests fails with a 429 of the service (e.g. the
+      underlying service is overloaded) or a 5xx error.
+
+The fetcher targets it with the --riot_api_base_url flag:
+
+    bazel run //powerspikegg/rawdata/fetcher:fake_riot_api -- \\
+        --fake_riot_api_rate_limits 10:10,500:600 \\
+        --fake_riot_api_error_rate 0.01
+    bazel run //powerspikegg/rawdata/fetcher:server -- \\
+        --riot_api_token fake --riot_api_base_url http://localhost:8004
+
+"""
+
+import collections
+import gflags
+import json
+import logging
+import math
+import random
+import re
+import sys
+import threading
+import time
+
+if sys.version_info > (3, 0):
+    from http.server import BaseHTTPRequestHandler
+    from http.server import HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import parse_qs
+    from urllib.parse import unquote
+    from urllib.parse import urlparse
+else:
+    from BaseHTTPServer import BaseHTTPRequestHandler
+    from BaseHTTPServer import HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urllib import unquote
+    from urlparse import parse_qs
+    from urlparse import urlparse
+
+from powerspikegg.rawdata.fetcher import corpus
+
+
+FLAGS = gflags.FLAGS
+
+gflags.DEFINE_integer("fake_riot_api_port", 8004,
+                      "Port of the fake Riot API.")
+gflags.DEFINE_string("fake_riot_api_latency", "lognormal:40:0.5",
+                     "Distribution of the latency of the responses: "
+                     "constant:<ms>, uniform:<min ms>:<max ms>, "
+                     "exponential:<mean ms> or lognormal:<median ms>:<sigma>.")
+gflags.DEFINE_list("fake_riot_api_rate_limits", ["3000:10", "180000:600"],
+                   "Rate limits of every API key, as <requests>:<seconds>.")
+gflags.DEFINE_float("fake_riot_api_error_rate", 0.,
+                    "Ratio of the requests failing with a 5xx error.")
+gflags.DEFINE_float("fake_riot_api_throttle_rate", 0.,
+                    "Ratio of the requests throttled by the service with a "
+                    "429 error.")
+gflags.DEFINE_integer("fake_riot_api_retry_after", 1,
+                      "Retry-After of the 429 errors of the service, in "
+                      "seconds.")
+gflags.DEFINE_integer("fake_riot_api_match_list_size", 20,
+                      "Number of matches in the match list of a summoner.")
+
+# Summoner spells of the static data, by identifier.
+SUMMONER_SPELLS = {
+    1: ("SummonerBoost", "Cleanse"),
+    3: ("SummonerExhaust", "Exhaust"),
+    4: ("SummonerFlash", "Flash"),
+    6: ("SummonerHaste", "Ghost"),
+    7: ("SummonerHeal", "Heal"),
+    11: ("SummonerSmite", "Smite"),
+    12: ("SummonerTeleport", "Teleport"),
+    14: ("SummonerDot", "Ignite"),
+    21: ("SummonerBarrier", "Barrier"),
+}
+
+_SERVER_ERRORS = (500, 503, 504)
+
+
+def parse_latency(specification):
+    """Parse a latency distribution.
+
+    Parameters:
+        specification: "<distribution>:<parameters>", the durations being in
+            milliseconds. See the --fake_riot_api_latency flag.
+    Returns:
+        A function drawing a latency, in seconds, from a random.Random.
+    Raises:
+        ValueError: If the distribution is unknown or its parameters are
+            invalid.
+    """
+    name, _, parameters = specification.partition(":")
+    parameters = [float(p) for p in parameters.split(":") if p]
+
+    if name == "constant" and len(parameters) == 1:
+        latency, = parameters
+        return lambda generator: latency / 1000.
+    if name == "uniform" and len(parameters) == 2:
+        minimum, maximum = parameters
+        return lambda generator: generator.uniform(minimum, maximum) / 1000.
+    if name == "exponential" and len(parameters) == 1:
+        mean, = parameters
+        return lambda generator: generator.expovariate(1. / mean) / 1000.
+    if name == "lognormal" and len(parameters) == 2:
+        median, sigma = parameters
+        mu = math.log(median)
+        return lambda generator: generator.lognormvariate(mu, sigma) / 1000.
+    raise ValueError("Invalid latency distribution %r." % specification)
+
+
+def parse_rate_limits(rate_limits):
+    """Parse rate limits.
+
+    Parameters:
+        rate_limits: list of "<requests>:<seconds>" strings.
+    Returns:
+        A list of (requests, seconds).
+    """
+    result = []
+    for rate_limit in rate_limits:
+        requests, _, seconds = rate_limit.partition(":")
+        result.append((int(requests), float(seconds)))
+    return result
+
+
+class Response:
+    """Response of the fake Riot API."""
+
+    def __init__(self, status, body=None, headers=None):
+        """Constructor.
+
+        Parameters:
+            status: HTTP status of the response.
+            body: JSON serializable body of the response.
+            headers: dictionary of the additional headers.
+        """
+        self.status = status
+        self.body = body
+        self.headers = headers or {}
+
+
+class FakeRiotAPI:
+    """Answer the requests of the Riot API from the synthetic corpus."""
+
+    def __init__(self, first_match_id=0, corpus_size=100000, seed=0,
+                 summoner_count=200000, rate_limits=(), latency=None,
+                 error_rate=0., throttle_rate=0., retry_after=1,
+                 match_list_size=20):
+        """Constructor.
+
+        Parameters:
+            first_match_id: identifier of the first match of the corpus.
+            corpus_size: number of matches of the corpus. The match lists
+                only reference matches of the corpus.
+            seed: seed of the corpus.
+            summoner_count: number of distinct summoners of the corpus.
+            rate_limits: list of (requests, seconds) allowed per API key.
+            latency: function drawing a latency from a random.Random, see
+                parse_latency. None to answer immediately.
+            error_rate: ratio of the requests failing with a 5xx error.
+            throttle_rate: ratio of the requests throttled by the service.
+            retry_after: Retry-After of the service throttling, in seconds.
+            match_list_size: number of matches in a match list.
+        """
+        self.first_match_id = first_match_id
+        self.corpus_size = corpus_size
+        self.seed = seed
+        self.summoner_count = summoner_count
+        self.rate_limits = list(rate_limits)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.match_list_size = match_list_size
+
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._windows = collections.defaultdict(
+            lambda: [collections.deque() for _ in self.rate_limits])
+        self._match_lists = {}
+        self.responses = collections.Counter()
+
+        self._routes = [
+            (re.compile(pattern), getattr(self, method))
+            for pattern, method in (
+                (r"^/api/lol/static-data/(?P<region>\w+)/v[\d.]+/"
+                 r"champion(?:/(?P<id>\d+))?$", "_champions"),
+                (r"^/api/lol/static-data/(?P<region>\w+)/v[\d.]+/"
+                 r"summoner-spell(?:/(?P<id>\d+))?$", "_summoner_spells"),
+                (r"^/api/lol/static-data/(?P<region>\w+)/v[\d.]+/versions$",
+                 "_versions"),
+                (r"^/api/lol/static-data/(?P<region>\w+)/v[\d.]+/realm$",
+                 "_realm"),
+                (r"^/api/lol/(?P<region>\w+)/v[\d.]+/match/(?P<id>\d+)$",
+                 "_match"),
+                (r"^/api/lol/(?P<region>\w+)/v[\d.]+/matchlist/by-summoner/"
+                 r"(?P<id>\d+)$", "_match_list"),
+                (r"^/api/lol/(?P<region>\w+)/v[\d.]+/summoner/by-name/"
+                 r"(?P<names>[^/]+)$", "_summoners_by_name"),
+                (r"^/api/lol/(?P<region>\w+)/v[\d.]+/summoner/"
+                 r"(?P<ids>\d+(?:,\d+)*)$", "_summoners_by_id"),
+            )
+        ]
+
+    @classmethod
+    def from_flags(cls):
+        """Create a fake Riot API serving the corpus of the corpus flags."""
+        return cls(
+            first_match_id=FLAGS.corpus_first_match_id,
+            corpus_size=FLAGS.corpus_size,
+            seed=FLAGS.corpus_seed,
+            summoner_count=FLAGS.corpus_summoners,
+            rate_limits=parse_rate_limits(FLAGS.fake_riot_api_rate_limits),
+            latency=parse_latency(FLAGS.fake_riot_api_latency),
+            error_rate=FLAGS.fake_riot_api_error_rate,
+            throttle_rate=FLAGS.fake_riot_api_throttle_rate,
+            retry_after=FLAGS.fake_riot_api_retry_after,
+            match_list_size=FLAGS.fake_riot_api_match_list_size)
+
+    def draw_latency(self):
+        """Draw the latency of a response, in seconds."""
+        if self.latency is None:
+            return 0.
+        with self._lock:
+            return self.latency(self._random)
+
+    def handle(self, path, parameters):
+        """Answer a request.
+
+        Parameters:
+            path: path of the requested URL.
+            parameters: dictionary of the query parameters.
+        Returns:
+            A Response.
+        """
+        response = self._handle(path, parameters)
+        with self._lock:
+            self.responses[response.status] += 1
+        return response
+
+    def _handle(self, path, parameters):
+        """Answer a request, see handle."""
+        for pattern, method in self._routes:
+            match = pattern.match(path)
+            if match is not None:
+                break
+        else:
+            return Response(404, {"status": {"message": "Not found",
+                                             "status_code": 404}})
+
+        api_key = parameters.get("api_key")
+        if not api_key:
+            return Response(401, {"status": {"message": "Unauthorized",
+                                             "status_code": 401}})
+
+        arguments = match.groupdict()
+        region = arguments.pop("region").upper()
+        if region not in (r for r, _, _ in corpus.REGIONS):
+            return Response(404, {"status": {"message": "Unknown region",
+                                             "status_code": 404}})
+
+        # As on the real API, the static data do not count in the limits.
+        if not path.startswith("/api/lol/static-data/"):
+            response = self._check_rate_limits(api_key)
+            if response is not None:
+                return response
+
+        with self._lock:
+            fault = self._random.random()
+            error = self._random.choice(_SERVER_ERRORS)
+        if fault < self.throttle_rate:
+            return Response(429, headers={
+                "Retry-After": str(self.retry_after),
+                "X-Rate-Limit-Type": "service",
+            })
+        if fault < self.throttle_rate + self.error_rate:
+            return Response(error)
+
+        return method(region, parameters, **arguments)
+
+    def _check_rate_limits(self, api_key):
+        """Count a request of an API key in its windows.
+
+        Returns:
+            A 429 Response if a window is full, None otherwise.
+        """
+        now = time.time()
+        with self._lock:
+            windows = self._windows[api_key]
+            retry_after = None
+            for (requests, seconds), window in zip(self.rate_limits,
+                                                   windows):
+                while window and window[0] <= now:
+                    window.popleft()
+                if len(window) >= requests:
+                    retry_after = max(retry_after or 0, window[0] - now)
+            counts = ",".join(
+                "%d:%d" % (len(window), seconds)
+                for (_, seconds), window in zip(self.rate_limits, windows))
+
+            if retry_after is not None:
+                return Response(429, headers={
+                    "Retry-After": str(max(int(math.ceil(retry_after)), 1)),
+                    "X-Rate-Limit-Type": "user",
+                    "X-Rate-Limit-Count": counts,
+                })
+            for (_, seconds), window in zip(self.rate_limits, windows):
+                window.append(now + seconds)
+        return None
+
+    def _match(self, region, parameters, id):
+        """Serve a match of the corpus."""
+        match_id = int(id)
+        if corpus.match_region(match_id, self.seed) != region:
+            return Response(404)
+        return Response(200, corpus.generate_match(match_id, self.seed,
+                                                   self.summoner_count))
+
+    def _match_references(self, region, summoner_id):
+        """Match references of a summoner, most recent first."""
+        key = (region, summoner_id)
+        with self._lock:
+            references = self._match_lists.get(key)
+        if references is not None:
+            return references
+
+        generator = random.Random(
+            self.seed * 1000000007 + summoner_id * 31 +
+            [r for r, _, _ in corpus.REGIONS].index(region))
+        references = []
+        # The regions have at least a few percents of the corpus, the loop
+        # is bounded in case the corpus is too small.
+        for _ in range(self.match_list_size * 1000):
+            if len(references) >= self.match_list_size:
+                break
+            match_id = self.first_match_id + generator.randrange(
+                self.corpus_size)
+            if corpus.match_region(match_id, self.seed) != region:
+                continue
+            match = corpus.generate_match(match_id, self.seed,
+                                          self.summoner_count)
+            participant = generator.choice(match["participants"])
+            references.append({
+                "matchId": match_id,
+                "region": region,
+                "platformId": match["platformId"],
+                "timestamp": match["matchCreation"],
+                "champion": participant["championId"],
+                "lane": participant["timeline"]["lane"],
+                "role": participant["timeline"]["role"],
+                "queue": match["queueType"],
+                "season": match["season"],
+            })
+        references.sort(key=lambda reference: -reference["timestamp"])
+
+        with self._lock:
+            self._match_lists[key] = references
+        return references
+
+    def _match_list(self, region, parameters, id):
+        """Serve the match list of a summoner."""
+        summoner_id = int(id)
+        if not 0 < summoner_id <= self.summoner_count:
+            return Response(404)
+
+        references = self._match_references(region, summoner_id)
+        begin_time = int(parameters.get("beginTime", 0))
+        end_time = int(parameters.get("endTime", 0)) or float("inf")
+        references = [reference for reference in references
+                      if begin_time <= reference["timestamp"] < end_time]
+
+        begin_index = int(parameters.get("beginIndex", 0))
+        end_index = int(parameters.get("endIndex", len(references)))
+        references = references[begin_index:end_index]
+        return Response(200, {
+            "matches": references,
+            "totalGames": len(references),
+            "startIndex": begin_index,
+            "endIndex": begin_index + len(references),
+        })
+
+    def _summoner(self, summoner_id):
+        """Summoner of the corpus."""
+        return {
+            "id": summoner_id,
+            "name": corpus.summoner_name(summoner_id),
+            "profileIconId": summoner_id % 1000,
+            "revisionDate": corpus.PATCHES[-1][1],
+            "summonerLevel": 30,
+        }
+
+    def _summoners_by_id(self, region, parameters, ids):
+        """Serve summoners from their identifiers."""
+        summoners = {}
+        for summoner_id in ids.split(","):
+            if 0 < int(summoner_id) <= self.summoner_count:
+                summoners[summoner_id] = self._summoner(int(summoner_id))
+        if not summoners:
+            return Response(404)
+        return Response(200, summoners)
+
+    def _summoners_by_name(self, region, parameters, names):
+        """Serve summoners from their sanitized names."""
+        prefix = corpus.summoner_name(0)[:-1].lower()
+        summoners = {}
+        for name in unquote(names).split(","):
+            name = name.replace(" ", "").lower()
+            if not name.startswith(prefix) or not name[len(prefix):].isdigit():
+                continue
+            summoner_id = int(name[len(prefix):])
+            if 0 < summoner_id <= self.summoner_count:
+                summoners[name] = self._summoner(summoner_id)
+        if not summoners:
+            return Response(404)
+        return Response(200, summoners)
+
+    def _champions(self, region, parameters, id=None):
+        """Serve the champions of the corpus."""
+        champions = dict(
+            (str(champion_id), {
+                "id": champion_id,
+                "key": "Champion%d" % champion_id,
+                "name": "Champion %d" % champion_id,
+                "title": "the Synthetic",
+            }) for champion_id in range(1, corpus.CHAMPION_COUNT + 1))
+        return self._static_data("champion", champions, id, parameters)
+
+    def _summoner_spells(self, region, parameters, id=None):
+        """Serve the summoner spells."""
+        spells = dict(
+            (str(spell_id), {"id": spell_id, "key": key, "name": name})
+            for spell_id, (key, name) in SUMMONER_SPELLS.items())
+        return self._static_data("summoner", spells, id, parameters)
+
+    def _static_data(self, data_type, entities, id, parameters):
+        """Serve a list of static entities, or one of them."""
+        if id is not None:
+            if id not in entities:
+                return Response(404)
+            return Response(200, entities[id])
+
+        if parameters.get("dataById", "").lower() != "true":
+            entities = dict((entity["key"], entity)
+                            for entity in entities.values())
+        return Response(200, {"type": data_type,
+                              "version": corpus.PATCHES[-1][0],
+                              "data": entities})
+
+    def _versions(self, region, parameters):
+        """Serve the versions of the game."""
+        return Response(200, [version for version, _, _ in
+                              reversed(corpus.PATCHES)])
+
+    def _realm(self, region, parameters):
+        """Serve the realm of a region."""
+        return Response(200, {"v": corpus.PATCHES[-1][0],
+                              "l": "en_US",
+                              "cdn": "http://ddragon.leagueoflegends.com/cdn"})
+
+
+class _FakeRiotAPIRequestHandler(BaseHTTPRequestHandler):
+    """Serve the requests with the fake Riot API."""
+
+    api = None
+
+    def do_GET(self):
+        """Answer the request once its latency elapsed."""
+        url = urlparse(self.path)
+        parameters = dict((name, values[-1]) for name, values in
+                          parse_qs(url.query).items())
+        response = self.api.handle(url.path, parameters)
+        time.sleep(self.api.draw_latency())
+
+        body = b""
+        if response.body is not None:
+            body = json.dumps(response.body).encode("utf-8")
+        self.send_response(response.status)
+        for name, value in response.headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json;charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        """Log the requests in the debug logs."""
+        logging.debug("Fake Riot API: " + format, *args)
+
+
+class _FakeRiotAPIServer(ThreadingMixIn, HTTPServer):
+    """Serve the fake Riot API, one thread per request."""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def start_server(api, port):
+    """Serve a fake Riot API in a background thread.
+
+    Parameters:
+        api: the FakeRiotAPI answering the requests.
+        port: port of the server.
+    Returns:
+        The HTTP server, stopped by calling shutdown then server_close. Its
+        api attribute is the served FakeRiotAPI.
+    """
+    request_handler = type("FakeRiotAPIRequestHandler",
+                           (_FakeRiotAPIRequestHandler,), {"api": api})
+    server = _FakeRiotAPIServer(("", port), request_handler)
+    server.api = api
+    server_thread = threading.Thread(target=server.serve_forever)
+    server_thread.daemon = True
+    server_thread.start()
+    return server
+
+
+def main():
+    server = start_server(FakeRiotAPI.from_flags(), FLAGS.fake_riot_api_port)
+    logging.info("Fake Riot API started up on :%d", FLAGS.fake_riot_api_port)
+    try:
+        while True:
+            time.sleep(60 * 60 * 24)
+    except KeyboardInterrupt:
+        server.shutdown()
+        server.server_close()
+
+
+if __name__ == '__main__':
+    FLAGS(sys.argv)
+    logging.getLogger().setLevel(logging.INFO)
+    main()
@@ -0,0 +1,134 @@
+import random
+import unittest
+
+from powerspikegg.rawdata.fetcher import corpus
+from powerspikegg.rawdata.fetcher import fake_riot_api
+from powerspikegg.rawdata.fetcher.handler import RiotAPIHandler
+from third_party.python.riotwatcher import riotwatcher
+
+
+class FakeRiotAPITest(unittest.TestCase):
+    """Checks the fake Riot API enforces the limits and injects the faults."""
+
+    def test_rate_limits(self):
+        """Tests the windows of every key are enforced, except for the static
+        data."""
+        api = fake_riot_api.FakeRiotAPI(corpus_size=100,
+                                        rate_limits=[(2, 10), (100, 600)])
+        path = "/api/lol/euw/v2.2/match/1"
+        static_path = "/api/lol/static-data/euw/v1.2/versions"
+
+        self.assertNotEqual(api.handle(path, {"api_key": "a"}).status, 429)
+        self.assertNotEqual(api.handle(path, {"api_key": "a"}).status, 429)
+        self.assertEqual(api.handle(static_path, {"api_key": "a"}).status,
+                         200)
+        response = api.handle(path, {"api_key": "a"})
+        self.assertEqual(response.status, 429)
+        self.assertEqual(response.headers["X-Rate-Limit-Type"], "user")
+        self.assertEqual(response.headers["X-Rate-Limit-Count"],
+                         "2:10,2:600")
+        self.assertLessEqual(int(response.headers["Retry-After"]), 10)
+        self.assertGreaterEqual(int(response.headers["Retry-After"]), 9)
+
+        self.assertNotEqual(api.handle(path, {"api_key": "b"}).status, 429)
+        self.assertEqual(api.handle(path, {}).status, 401)
+
+    def test_faults(self):
+        """Tests the service throttling and the server errors."""
+        path = "/api/lol/static-data/euw/v1.2/versions"
+        api = fake_riot_api.FakeRiotAPI(throttle_rate=1., retry_after=3)
+        response = api.handle(path, {"api_key": "a"})
+        self.assertEqual(response.status, 429)
+        self.assertEqual(response.headers["Retry-After"], "3")
+        self.assertEqual(response.headers["X-Rate-Limit-Type"], "service")
+
+        api = fake_riot_api.FakeRiotAPI(error_rate=1.)
+        for _ in range(10):
+            self.assertIn(api.handle(path, {"api_key": "a"}).status,
+                          (500, 503, 504))
+        self.assertEqual(sum(api.responses.values()), 10)
+
+    def test_parse_latency(self):
+        """Tests the latency distributions are parsed, in milliseconds."""
+        generator = random.Random(0)
+        self.assertEqual(
+            fake_riot_api.parse_latency("constant:20")(generator), .02)
+        latency = fake_riot_api.parse_latency("uniform:10:30")(generator)
+        self.assertTrue(.01 <= latency <= .03)
+        self.assertGreater(
+            fake_riot_api.parse_latency("lognormal:40:.5")(generator), 0)
+        with self.assertRaises(ValueError):
+            fake_riot_api.parse_latency("lognormal:40")
+
+
+class FakeRiotAPIServerTest(unittest.TestCase):
+    """Checks the Riot API handler reaches the corpus through the fake Riot
+    API."""
+
+    port = 50924
+
+    @classmethod
+    def setUpClass(cls):
+        """Serve a fake Riot API."""
+        cls.api = fake_riot_api.FakeRiotAPI(corpus_size=1000,
+                                            summoner_count=1000,
+                                            match_list_size=5)
+        cls.server = fake_riot_api.start_server(cls.api, cls.port)
+        cls.client = RiotAPIHandler(
+            "some random token",
+            base_url="http://localhost:%d" % cls.port)
+
+    @classmethod
+    def tearDownClass(cls):
+        """Stop the fake Riot API."""
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def test_match(self):
+        """Tests the matches of the corpus are served in their region only."""
+        region = corpus.match_region(42)
+        self.assertEqual(self.client.get_match(42, region=region),
+                         corpus.generate_match(42, summoner_count=1000))
+
+        other_region = "KR" if region != "KR" else "EUW"
+        with self.assertRaises(riotwatcher.LoLException) as context:
+            self.client.get_match(42, region=other_region)
+        self.assertEqual(context.exception, riotwatcher.error_404)
+
+    def test_match_list(self):
+        """Tests the match list of a summoner is filtered on its time."""
+        matches = self.client.get_match_list(42, region="EUW")["matches"]
+        self.assertEqual(len(matches), 5)
+        for reference in matches:
+            self.assertEqual(corpus.match_region(reference["matchId"]),
+                             "EUW")
+        timestamps = [reference["timestamp"] for reference in matches]
+        self.assertEqual(timestamps, sorted(timestamps, reverse=True))
+
+        recent = self.client.get_match_list(
+            42, region="EUW", begin_time=timestamps[2])["matches"]
+        self.assertEqual(recent, matches[:3])
+
+    def test_summoners(self):
+        """Tests the summoners are found from their name or identifier."""
+        summoner = self.client.get_summoner(name="Summoner 42", region="NA")
+        self.assertEqual(summoner["id"], 42)
+        self.assertEqual(self.client.get_summoner(_id=42, region="NA"),
+                         summoner)
+
+        with self.assertRaises(riotwatcher.LoLException):
+            self.client.get_summoner(name="Somebody", region="NA")
+
+    def test_static_data(self):
+        """Tests the static data contain the champions of the corpus."""
+        champions = self.client.static_get_champion_list(
+            data_by_id=True)["data"]
+        self.assertEqual(len(champions), corpus.CHAMPION_COUNT)
+        self.assertEqual(champions["42"]["id"], 42)
+
+        spells = self.client.static_get_summoner_spell_list()["data"]
+        self.assertEqual(spells["SummonerFlash"]["id"], 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -19,6 +19,10 @@ class RateLimiter(riotwatcher.RateLimit):
         super(RateLimiter, self).__init__(*args, **kwargs)
         self._request_lock = threading.Lock()
 
+        self.name = monitoring.rate_limiter_name(self)
+        self._wait_time = monitoring.rate_limit_wait_time.labels(self.name)
+        self._waiting = monitoring.rate_limit_waiting.labels(self.name)
+
     def __enter__(self):
         """Context management support. Forward to acquire.
         """
@@ -31,10 +35,21 @@ class RateLimiter(riotwatcher.RateLimit):
 
     def acquire(self):
         """Acquire the lock and wait until a request is available.
+
+        The time spent waiting for the lock and for the rate limit is
+        observed, as the number of requests waiting.
         """
-        self._request_lock.acquire()
-        while not self.request_available():
-            time.sleep(0.1)
+        start = time.time()
+        self._waiting.inc()
+        try:
+            self._request_lock.acquire()
+            while not self.request_available():
+                time.sleep(0.1)
+        finally:
+            self._waiting.dec()
+
+        self._wait_time.observe(time.time() - start)
+        monitoring.observe_rate_limiter(self)
 
     def release(self):
         """Release the previously acquired lock.
@@ -46,21 +61,58 @@ class RiotAPIHandler(riotwatcher.RiotWatcher):
     """Adds support of request locking when the rate limit is reached.
     """
 
-    def __init__(self, key, default_region="na", limits=None):
-        """Constructor. Register the key and the rate limiters."""
+    def __init__(self, key, default_region="na", limits=None, base_url=None):
+        """Constructor. Register the key and the rate limiters.
+
+        Parameters:
+            key: the Riot API key.
+            default_region: region of the requests not specifying one.
+            limits: list of RateLimiter. Default to the limits of a
+                development key.
+            base_url: URL of the targeted API, e.g. http://localhost:8004 for
+                the fake Riot API. None to target the Riot API.
+        Raises:
+            ValueError: If the base URL does not specify its protocol.
+        """
         self.key = key
         self.default_region = default_region
 
+        self.base_url = None
+        if base_url:
+            protocol, separator, address = base_url.partition("://")
+            if not separator:
+                raise ValueError("Missing protocol in %r." % base_url)
+            self.enable_https = protocol == "https"
+            self.base_url = address.rstrip("/")
+
         self.limits = limits
         if self.limits is None:
             self.limits = [RateLimiter(10, 10), RateLimiter(500, 600)]
         for limiter in self.limits:
             monitoring.FetcherWatcher.register_rate_limiter(limiter)
 
+        self._wait_time = monitoring.rate_limit_wait_time.labels(
+            monitoring.ALL_RATE_LIMITS)
+        self._waiting = monitoring.rate_limit_waiting.labels(
+            monitoring.ALL_RATE_LIMITS)
+
+    def format_base_url(self, region, static):
+        """Target the base URL if one was given."""
+        if self.base_url is None:
+            return super(RiotAPIHandler, self).format_base_url(region, static)
+        return "%s/api/lol" % self.base_url
+
     def acquire(self):
         """Acquire the locks, and wait until a request is available"""
-        for rate_limiter in self.limits:
-            rate_limiter.acquire()
+        start = time.time()
+        self._waiting.inc()
+        try:
+            with monitoring.stage("rate_limiter_wait"):
+                for rate_limiter in self.limits:
+                    rate_limiter.acquire()
+        finally:
+            self._waiting.dec()
+        self._wait_time.observe(time.time() - start)
 
     def release(self):
         """Release the locks."""
@@ -76,7 +128,9 @@ class RiotAPIHandler(riotwatcher.RiotWatcher):
         self.acquire()
 
         try:
-            result = super(RiotAPIHandler, self).base_request(*args, **kwargs)
+            with monitoring.stage("riot_api_request"):
+                result = super(RiotAPIHandler, self).base_request(
+                    *args, **kwargs)
         finally:
             self.release()
 
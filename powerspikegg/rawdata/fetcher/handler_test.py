@@ -5,6 +5,8 @@ import threading
 import time
 import unittest
 
+from prometheus_client import core
+
 if sys.version_info > (3, 0):
     from http.server import HTTPServer
     from http.server import SimpleHTTPRequestHandler
@@ -126,6 +128,34 @@ class RateLimiterTest(unittest.TestCase):
 
         self.assertLess(stop_time - start_time, 1)
 
+    def test_monitoring(self):
+        """Checks the waits and the remaining requests are monitored."""
+        limiter = RateLimiter(2, 0.2)
+        labels = {"limit": limiter.name}
+
+        def get_sample(name):
+            return core.REGISTRY.get_sample_value(name, labels) or 0
+
+        start_count = get_sample("riotapi_rate_limit_wait_seconds_count")
+        start_wait = get_sample("riotapi_rate_limit_wait_seconds_sum")
+        with limiter:
+            self.assertEqual(2, get_sample("riotapi_rate_limit_tokens"))
+            self.assertEqual(0, get_sample("riotapi_rate_limit_utilization"))
+            limiter.add_request()
+        with limiter:
+            self.assertEqual(1, get_sample("riotapi_rate_limit_tokens"))
+            self.assertEqual(0.5,
+                             get_sample("riotapi_rate_limit_utilization"))
+            limiter.add_request()
+        with limiter:  # Waits for the window to end.
+            self.assertEqual(0, get_sample("riotapi_rate_limit_waiting"))
+            limiter.add_request()
+
+        self.assertEqual(3, get_sample(
+            "riotapi_rate_limit_wait_seconds_count") - start_count)
+        self.assertGreaterEqual(get_sample(
+            "riotapi_rate_limit_wait_seconds_sum") - start_wait, 0.1)
+
 
 class RiotAPIHandlerTest(unittest.TestCase):
     """Test the auto-rate limiting is fully supported."""
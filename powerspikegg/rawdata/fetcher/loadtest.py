@@ -0,0 +1,480 @@
+""" Load generator of the MatchFetcher service
+
+Send a mix of Match, CacheQuery, UpdateSummoner and AverageStatistics
+requests to a fetcher server, and report every --loadtest_report_interval
+seconds the throughput, the error rate and the latency percentiles of every
+endpoint.
+
+The requests are either sent:
+
+    - in open loop, arriving at --loadtest_rate requests per second
+      (Poisson arrivals) whatever the latency of the server. The latencies
+      include the time a request waits for a free client, so a saturated
+      server shows as an exploding latency.
+    - in closed loop if --loadtest_rate is 0, by --loadtest_concurrency
+      clients sending a new request as soon as they get a response.
+
+By default, a server is started locally with --max_workers threads, backed
+by a local Mongo DB server filled with a synthetic corpus (see corpus.py) and
+by a fake Riot API serving the same corpus (see fake_riot_api.py, and its
+flags for the latencies, rate limits and faults of the Riot API). The
+requests of the matches missing from the cache, and of the match lists, go
+through the rate limiters of the fetcher to the fake Riot API.
+--loadtest_target sends the requests to a running server instead, which must
+serve the same corpus.
+
+Example:
+    bazel run //powerspikegg/rawdata/fetcher:loadtest -- \\
+        --loadtest_mix Match:80,CacheQuery:10,AverageStatistics:10 \\
+        --loadtest_rate 200 --loadtest_duration 120 --max_workers 10
+
+"""
+
+import collections
+import gflags
+import grpc
+import json
+import logging
+import random
+import sys
+import threading
+import time
+
+from concurrent import futures
+
+from powerspikegg.lib.mongodb import wrapper
+from powerspikegg.rawdata.fetcher import cache
+from powerspikegg.rawdata.fetcher import corpus
+from powerspikegg.rawdata.fetcher import fake_riot_api
+from powerspikegg.rawdata.fetcher import handler
+from powerspikegg.rawdata.fetcher import server
+from powerspikegg.rawdata.fetcher import service_pb2
+from powerspikegg.rawdata.public import constants_pb2
+
+
+FLAGS = gflags.FLAGS
+
+gflags.DEFINE_string("loadtest_target", "",
+                     "Address of the tested server. Empty to start a local "
+                     "server.")
+gflags.DEFINE_list("loadtest_mix",
+                   ["Match:70", "CacheQuery:10", "UpdateSummoner:10",
+                    "AverageStatistics:10"],
+                   "Endpoints called and their weight in the requests.")
+gflags.DEFINE_float("loadtest_rate", 100.,
+                    "Requests per second sent in open loop. 0 to send them "
+                    "in closed loop.")
+gflags.DEFINE_integer("loadtest_concurrency", 32,
+                      "Maximum number of requests in flight.")
+gflags.DEFINE_integer("loadtest_duration", 60,
+                      "Duration of the test, in seconds.")
+gflags.DEFINE_integer("loadtest_report_interval", 5,
+                      "Interval between two reports, in seconds.")
+gflags.DEFINE_string("loadtest_output", "",
+                     "File the reports are appended to as JSON lines.")
+gflags.DEFINE_float("loadtest_timeout", 30.,
+                    "Deadline of the requests, in seconds.")
+gflags.DEFINE_float("loadtest_miss_ratio", .1,
+                    "Ratio of the Match requests for matches missing from "
+                    "the cache.")
+gflags.DEFINE_integer("loadtest_query_sample_size", 100,
+                      "Maximum number of matches of the CacheQuery "
+                      "requests.")
+gflags.DEFINE_integer("loadtest_corpus_size", 100000,
+                      "Number of matches of the corpus served by the server.")
+gflags.DEFINE_integer("loadtest_match_pool", 2000,
+                      "Number of distinct matches and summoners requested.")
+gflags.DEFINE_integer("loadtest_port", 50092,
+                      "Port of the local server.")
+
+ENDPOINTS = ("Match", "CacheQuery", "UpdateSummoner", "AverageStatistics")
+
+_DATABASE_NAME = "loadtest"
+
+
+def parse_mix(mix):
+    """Parse a mix of endpoints.
+
+    Parameters:
+        mix: list of "<endpoint>:<weight>" strings.
+    Returns:
+        A list of (endpoint, weight).
+    Raises:
+        ValueError: If an endpoint is unknown or a weight is not positive.
+    """
+    result = []
+    for entry in mix:
+        endpoint, _, weight = entry.partition(":")
+        if endpoint not in ENDPOINTS:
+            raise ValueError("Unknown endpoint %r." % endpoint)
+        weight = float(weight or 1)
+        if weight <= 0:
+            raise ValueError("The weight of %s must be positive." % endpoint)
+        result.append((endpoint, weight))
+    return result
+
+
+def percentile(sorted_values, ratio):
+    """Percentile of sorted values, 0 if there is none."""
+    if not sorted_values:
+        return 0.
+    return sorted_values[min(int(len(sorted_values) * ratio),
+                             len(sorted_values) - 1)]
+
+
+class Statistics:
+    """Latencies and errors of the requests, by endpoint, over a window."""
+
+    def __init__(self):
+        """Constructor. Start the first window."""
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        """Start a new window."""
+        self._window_start = time.time()
+        self._latencies = collections.defaultdict(list)
+        self._errors = collections.defaultdict(collections.Counter)
+
+    def record(self, endpoint, latency, error=None):
+        """Record the result of a request.
+
+        Parameters:
+            endpoint: name of the endpoint.
+            latency: latency of the request, in seconds.
+            error: name of the error of the request, None if it succeeded.
+        """
+        with self._lock:
+            self._latencies[endpoint].append(latency)
+            if error is not None:
+                self._errors[endpoint][error] += 1
+
+    def report(self):
+        """Summarize the window and start a new one.
+
+        Returns:
+            A dictionary mapping the endpoints to their throughput, error
+            rate, errors and latency percentiles.
+        """
+        with self._lock:
+            duration = time.time() - self._window_start
+            latencies, errors = self._latencies, self._errors
+            self._reset()
+
+        report = {}
+        for endpoint, values in sorted(latencies.items()):
+            values.sort()
+            error_count = sum(errors[endpoint].values())
+            report[endpoint] = {
+                "requests": len(values),
+                "throughput": len(values) / duration,
+                "error_rate": error_count / float(len(values)),
+                "errors": dict(errors[endpoint]),
+                "p50": percentile(values, .5),
+                "p90": percentile(values, .9),
+                "p99": percentile(values, .99),
+                "max": values[-1],
+            }
+        return report
+
+
+class RequestFactory:
+    """Create the requests of the endpoints, on the matches of a corpus."""
+
+    def __init__(self, stub, corpus_size, pool_size, miss_ratio,
+                 query_sample_size, timeout, seed=0):
+        """Constructor. Generate the matches and summoners requested.
+
+        Parameters:
+            stub: MatchFetcherStub of the tested server.
+            corpus_size: number of matches of the corpus in the cache.
+            pool_size: number of distinct matches requested.
+            miss_ratio: ratio of the matches requested which are not cached.
+            query_sample_size: maximum number of matches of a CacheQuery.
+            timeout: deadline of the requests, in seconds.
+            seed: seed of the random requests.
+        """
+        self.stub = stub
+        self.miss_ratio = miss_ratio
+        self.query_sample_size = query_sample_size
+        self.timeout = timeout
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+        # The matches the server rejects (see corpus.is_requestable) are not
+        # requested, as they would be counted as errors of the server.
+        self.matches = []
+        self.summoners = []
+        while len(self.matches) < pool_size:
+            match_id = self._random.randrange(corpus_size)
+            if not corpus.is_requestable(match_id):
+                continue
+            match = corpus.generate_match(match_id)
+            region = constants_pb2.Region.Value(match["region"])
+            self.matches.append((match["matchId"], region))
+            player = self._random.choice(
+                match["participantIdentities"])["player"]
+            self.summoners.append(constants_pb2.Summoner(
+                id=player["summonerId"], region=region))
+        self._missing_match_id = corpus_size
+
+    def _next_missing_match_id(self, region):
+        """Identifier of a match of a region which is not in the cache."""
+        with self._lock:
+            self._missing_match_id += 1
+            while corpus.match_region(self._missing_match_id) != region:
+                self._missing_match_id += 1
+            return self._missing_match_id
+
+    def _random_query(self):
+        """Create a Query on a random league and champion."""
+        with self._lock:
+            league = self._random.choice(corpus.LEAGUES)[0]
+            rank = self._random.randrange(corpus.CHAMPION_COUNT)
+        return service_pb2.Query(
+            league=constants_pb2.League.Value(league),
+            champion=constants_pb2.Champion(id=corpus.champion_id(rank)),
+            sample_size=self.query_sample_size)
+
+    def create(self, endpoint):
+        """Create a request of an endpoint.
+
+        Returns:
+            A function sending the request and waiting for its response.
+        """
+        if endpoint == "Match":
+            with self._lock:
+                match_id, region = self._random.choice(self.matches)
+                missing = self._random.random() < self.miss_ratio
+            if missing:
+                match_id = self._next_missing_match_id(
+                    constants_pb2.Region.Name(region))
+            request = service_pb2.MatchRequest(id=match_id, region=region)
+            return lambda: self.stub.Match(request, timeout=self.timeout)
+
+        if endpoint == "CacheQuery":
+            query = self._random_query()
+            return lambda: list(self.stub.CacheQuery(query,
+                                                     timeout=self.timeout))
+
+        if endpoint == "UpdateSummoner":
+            with self._lock:
+                summoner = self._random.choice(self.summoners)
+            return lambda: list(self.stub.UpdateSummoner(
+                summoner, timeout=self.timeout))
+
+        if endpoint == "AverageStatistics":
+            query = self._random_query()
+            return lambda: self.stub.AverageStatistics(query,
+                                                       timeout=self.timeout)
+
+        raise ValueError("Unknown endpoint %r." % endpoint)
+
+
+def _execute(statistics, endpoint, request, scheduled_time):
+    """Send a request and record its latency from its scheduled time."""
+    error = None
+    try:
+        request()
+    except grpc.RpcError as e:
+        error = e.code().name
+    except Exception as e:
+        error = type(e).__name__
+    statistics.record(endpoint, time.time() - scheduled_time, error)
+
+
+class LoadGenerator:
+    """Send a mix of requests to a server."""
+
+    def __init__(self, factory, mix, statistics, seed=0):
+        """Constructor.
+
+        Parameters:
+            factory: RequestFactory creating the requests.
+            mix: list of (endpoint, weight), see parse_mix.
+            statistics: Statistics recording the results.
+            seed: seed of the choice of the endpoints.
+        """
+        self.factory = factory
+        self.statistics = statistics
+        self._endpoints = [endpoint for endpoint, _ in mix]
+        total = float(sum(weight for _, weight in mix))
+        self._distribution = []
+        cumulated = 0.
+        for _, weight in mix:
+            cumulated += weight / total
+            self._distribution.append(cumulated)
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _choose_endpoint(self):
+        """Choose the endpoint of a request following the mix."""
+        with self._lock:
+            value = self._random.random()
+        for endpoint, cumulated in zip(self._endpoints, self._distribution):
+            if value <= cumulated:
+                return endpoint
+        return self._endpoints[-1]
+
+    def _send(self, scheduled_time):
+        """Send a request of a random endpoint."""
+        endpoint = self._choose_endpoint()
+        _execute(self.statistics, endpoint, self.factory.create(endpoint),
+                 scheduled_time)
+
+    def run_open_loop(self, rate, duration, concurrency):
+        """Send requests arriving at a rate, whatever the latencies."""
+        pool = futures.ThreadPoolExecutor(concurrency)
+        try:
+            scheduled_time = time.time()
+            end = scheduled_time + duration
+            while scheduled_time < end:
+                delay = scheduled_time - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+                pool.submit(self._send, scheduled_time)
+                with self._lock:
+                    scheduled_time += self._random.expovariate(rate)
+        finally:
+            pool.shutdown()
+
+    def run_closed_loop(self, duration, concurrency):
+        """Send requests from clients waiting for their responses."""
+        end = time.time() + duration
+
+        def client():
+            while time.time() < end:
+                self._send(time.time())
+
+        threads = [threading.Thread(target=client)
+                   for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+
+def print_report(elapsed, report):
+    """Print a report of the statistics of a window."""
+    for endpoint, result in sorted(report.items()):
+        print("%6.0fs %-18s %8.1f req/s %6.2f%% errors   p50 %8.2fms   "
+              "p90 %8.2fms   p99 %8.2fms   max %8.2fms" % (
+                  elapsed, endpoint, result["throughput"],
+                  result["error_rate"] * 100, result["p50"] * 1000,
+                  result["p90"] * 1000, result["p99"] * 1000,
+                  result["max"] * 1000))
+        if result["errors"]:
+            print("%26s errors: %s" % ("", ", ".join(
+                "%s=%d" % error for error in sorted(
+                    result["errors"].items()))))
+
+
+def _report_loop(statistics, stop_event, output):
+    """Print and save the statistics periodically until stopped."""
+    start = time.time()
+    while True:
+        stopped = stop_event.wait(FLAGS.loadtest_report_interval)
+        elapsed = time.time() - start
+        report = statistics.report()
+        print_report(elapsed, report)
+        if output is not None:
+            output.write(json.dumps({"elapsed": elapsed,
+                                     "endpoints": report}) + "\n")
+            output.flush()
+        if stopped:
+            return
+
+
+def start_local_server():
+    """Start a server backed by a local Mongo DB server filled with a corpus
+    and by a fake Riot API serving the same corpus.
+
+    Returns:
+        A tuple (Mongo DB server, fake Riot API server, gRPC server, address
+        of the gRPC server).
+    """
+    api = fake_riot_api.FakeRiotAPI.from_flags()
+    api.first_match_id = 0
+    api.corpus_size = FLAGS.loadtest_corpus_size
+    api.seed = 0
+    riot_api_server = fake_riot_api.start_server(api,
+                                                 FLAGS.fake_riot_api_port)
+
+    mongo_server = wrapper.create_mongo_server()
+    start = time.time()
+    corpus.populate(mongo_server.address, _DATABASE_NAME, 0,
+                    FLAGS.loadtest_corpus_size,
+                    workers=FLAGS.corpus_workers)
+    logging.info("%d matches inserted in %.1fs.", FLAGS.loadtest_corpus_size,
+                 time.time() - start)
+
+    cache.CacheManager.address = "mongodb://%s/" % mongo_server.address
+    cache.CacheManager.database_name = _DATABASE_NAME
+    server.MatchFetcher.cache_manager = cache.CacheManager()
+    # The fetcher is limited as the fake Riot API limits it.
+    server.MatchFetcher.riot_api_handler = handler.RiotAPIHandler(
+        "loadtest", limits=[
+            handler.RateLimiter(requests, seconds)
+            for requests, seconds in api.rate_limits],
+        base_url="http://localhost:%d" % FLAGS.fake_riot_api_port)
+    grpc_server, _ = server.start_server("loadtest", FLAGS.loadtest_port,
+                                         FLAGS.max_workers)
+    return (mongo_server, riot_api_server, grpc_server,
+            "localhost:%d" % FLAGS.loadtest_port)
+
+
+def main():
+    mix = parse_mix(FLAGS.loadtest_mix)
+
+    mongo_server = riot_api_server = grpc_server = None
+    target = FLAGS.loadtest_target
+    if not target:
+        (mongo_server, riot_api_server, grpc_server,
+         target) = start_local_server()
+
+    output = None
+    if FLAGS.loadtest_output:
+        output = open(FLAGS.loadtest_output, "a")
+    try:
+        stub = service_pb2.MatchFetcherStub(grpc.insecure_channel(target))
+        factory = RequestFactory(
+            stub, FLAGS.loadtest_corpus_size, FLAGS.loadtest_match_pool,
+            FLAGS.loadtest_miss_ratio, FLAGS.loadtest_query_sample_size,
+            FLAGS.loadtest_timeout)
+        statistics = Statistics()
+        generator = LoadGenerator(factory, mix, statistics)
+
+        stop_event = threading.Event()
+        reporter = threading.Thread(target=_report_loop,
+                                    args=(statistics, stop_event, output))
+        reporter.start()
+        try:
+            if FLAGS.loadtest_rate > 0:
+                generator.run_open_loop(FLAGS.loadtest_rate,
+                                        FLAGS.loadtest_duration,
+                                        FLAGS.loadtest_concurrency)
+            else:
+                generator.run_closed_loop(FLAGS.loadtest_duration,
+                                          FLAGS.loadtest_concurrency)
+        finally:
+            stop_event.set()
+            reporter.join()
+    finally:
+        if output is not None:
+            output.close()
+        if grpc_server is not None:
+            grpc_server.stop(0)
+        if riot_api_server is not None:
+            print("Fake Riot API responses: %s" % ", ".join(
+                "%d=%d" % response for response in sorted(
+                    riot_api_server.api.responses.items())))
+            riot_api_server.shutdown()
+            riot_api_server.server_close()
+        if mongo_server is not None:
+            mongo_server.shutdown()
+
+
+if __name__ == '__main__':
+    FLAGS(sys.argv)
+    logging.getLogger().setLevel(logging.INFO)
+    main()
@@ -0,0 +1,105 @@
+import mock
+import unittest
+
+from powerspikegg.rawdata.fetcher import converter
+from powerspikegg.rawdata.fetcher import corpus
+from powerspikegg.rawdata.fetcher import loadtest
+from powerspikegg.rawdata.fetcher.server import MatchFetcher
+from powerspikegg.rawdata.public import constants_pb2
+
+
+class FakeRequestFactory:
+    """Create requests failing on the CacheQuery endpoint only."""
+
+    def create(self, endpoint):
+        def request():
+            if endpoint == "CacheQuery":
+                raise RuntimeError()
+        return request
+
+
+class ServicerStub:
+    """Call a MatchFetcher servicer in process, in place of a gRPC stub."""
+
+    def __init__(self, servicer):
+        self.servicer = servicer
+
+    def Match(self, request, timeout):
+        return self.servicer.Match(request, mock.Mock())
+
+    def UpdateSummoner(self, request, timeout):
+        return self.servicer.UpdateSummoner(request, mock.Mock())
+
+
+class LoadTestTest(unittest.TestCase):
+    """Checks the load generator follows the mix and reports the errors."""
+
+    def test_parse_mix(self):
+        """Tests the mix is parsed and validated."""
+        self.assertEqual(loadtest.parse_mix(["Match:3", "CacheQuery"]),
+                         [("Match", 3.), ("CacheQuery", 1.)])
+        with self.assertRaises(ValueError):
+            loadtest.parse_mix(["Unknown:1"])
+        with self.assertRaises(ValueError):
+            loadtest.parse_mix(["Match:0"])
+
+    def test_statistics(self):
+        """Tests the report summarizes the window and starts a new one."""
+        statistics = loadtest.Statistics()
+        for latency in range(1, 101):
+            statistics.record("Match", latency / 1000.)
+        statistics.record("Match", .2, "UNAVAILABLE")
+
+        report = statistics.report()["Match"]
+        self.assertEqual(report["requests"], 101)
+        self.assertEqual(report["errors"], {"UNAVAILABLE": 1})
+        self.assertAlmostEqual(report["p50"], .051)
+        self.assertAlmostEqual(report["p99"], .1)
+        self.assertAlmostEqual(report["max"], .2)
+        self.assertEqual(statistics.report(), {})
+
+    def test_requests_validation(self):
+        """Tests the generated requests pass the validation of the server."""
+        m = converter.JSONConverter.game_constant = mock.Mock()
+        m.get_summoner_spell_by_id.return_value = constants_pb2.SummonerSpell(
+            id=1)
+        m.get_champion_by_id.return_value = constants_pb2.Champion(id=4242)
+
+        MatchFetcher.riot_api_handler = mock.Mock()
+        MatchFetcher.riot_api_handler.get_match_list.return_value = {
+            "matches": []}
+        MatchFetcher.cache_manager = mock.Mock()
+        cache_manager = MatchFetcher.cache_manager
+        cache_manager.find_match.side_effect = (
+            lambda request: corpus.generate_match(request.id))
+        cache_manager.find_summoner_last_match_time.return_value = None
+        servicer = MatchFetcher("some random token")
+
+        factory = loadtest.RequestFactory(
+            ServicerStub(servicer), corpus_size=100, pool_size=200,
+            miss_ratio=0., query_sample_size=10, timeout=1.)
+        for _ in range(200):
+            for endpoint in ("Match", "UpdateSummoner"):
+                factory.create(endpoint)()
+
+    def test_open_loop(self):
+        """Tests the requests arrive at the rate, following the mix."""
+        statistics = loadtest.Statistics()
+        generator = loadtest.LoadGenerator(
+            FakeRequestFactory(), [("Match", 3), ("CacheQuery", 1)],
+            statistics)
+        generator.run_open_loop(rate=400, duration=.5, concurrency=4)
+
+        report = statistics.report()
+        match, cache_query = report["Match"], report["CacheQuery"]
+        self.assertGreater(match["requests"] + cache_query["requests"], 100)
+        self.assertLess(match["requests"] + cache_query["requests"], 400)
+        self.assertGreater(match["requests"], cache_query["requests"])
+        self.assertEqual(match["error_rate"], 0)
+        self.assertEqual(cache_query["error_rate"], 1)
+        self.assertEqual(cache_query["errors"],
+                         {"RuntimeError": cache_query["requests"]})
+
+
+if __name__ == '__main__':
+    unittest.main()
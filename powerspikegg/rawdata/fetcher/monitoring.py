@@ -1,4 +1,11 @@
+import contextlib
+import functools
+import gflags
+import logging
 import pymongo
+import random
+import threading
+import time
 
 from collections import OrderedDict
 
@@ -8,15 +15,55 @@ from powerspikegg.lib.monitoring import watcher
 
 """Monitoring logic of the rawdata fetcher server.
 
-Implements a watcher periodically checking status of the endpoint.
+Implements a watcher periodically checking status of the endpoint, and the
+measure of the stages of the requests (see stage and trace).
 """
 
+FLAGS = gflags.FLAGS
+
+gflags.DEFINE_integer("mongodb_watcher_interval", 5000,
+                      "Interval, in milliseconds, between two updates of the "
+                      "Mongo DB metrics.")
+gflags.DEFINE_float("trace_sample_rate", 0.,
+                    "Ratio of the requests whose stages are logged. 0 "
+                    "disables the trace log.")
+
 rate_limit_counter = core.Gauge(
     "riotapi_rate_limit",
     "Riot API rate limiters",
     ["id", "queue_capacity", "max_per_seconds"],
 )
 
+rate_limit_wait_time = core.Histogram(
+    "riotapi_rate_limit_wait_seconds",
+    "Time spent waiting for a rate limiter to allow a request",
+    ["limit"],
+    buckets=(.001, .01, .05, .1, .25, .5, 1, 2.5, 5, 10, 30, 60, 120, 300,
+             600),
+)
+
+rate_limit_waiting = core.Gauge(
+    "riotapi_rate_limit_waiting",
+    "Number of requests waiting for a rate limiter",
+    ["limit"],
+)
+
+rate_limit_tokens = core.Gauge(
+    "riotapi_rate_limit_tokens",
+    "Number of requests a rate limiter allows in its current window",
+    ["limit"],
+)
+
+rate_limit_utilization = core.Gauge(
+    "riotapi_rate_limit_utilization",
+    "Ratio of the requests allowed by a rate limiter made in its current "
+    "window",
+    ["limit"],
+)
+
+# Label of the metrics aggregating every rate limiter of a handler.
+ALL_RATE_LIMITS = "all"
+
 mongodb_counters = core.Gauge(
     "mongodb_elements_count",
     "Mongo DB collection count watcher",
@@ -28,6 +75,152 @@ mongodb_state = core.Gauge(
     "Mongo DB state",
 )
 
+mongodb_opcounters = core.Gauge(
+    "mongodb_opcounters",
+    "Operations run by the Mongo DB server since its start up",
+    ["type"],
+)
+
+mongodb_connections = core.Gauge(
+    "mongodb_connections",
+    "Connections of the Mongo DB server",
+    ["state"],
+)
+
+mongodb_cache_bytes = core.Gauge(
+    "mongodb_wiredtiger_cache_bytes",
+    "WiredTiger cache of the Mongo DB server",
+    ["type"],
+)
+
+mongodb_index_size = core.Gauge(
+    "mongodb_index_size_bytes",
+    "Size of the indexes of the watched collections",
+    ["database", "collection", "index"],
+)
+
+negative_cache_counter = core.Counter(
+    "rawdata_negative_cache",
+    "Lookups of entities reported missing by the Riot API",
+    ["entity", "result"],
+)
+
+stage_histogram = core.Histogram(
+    "rawdata_fetcher_stage_seconds",
+    "Time spent in the stages of the fetcher requests",
+    ["stage"],
+    buckets=(.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5,
+             10, 30),
+)
+
+trace_logger = logging.getLogger("powerspikegg.rawdata.fetcher.trace")
+_trace_logger_lock = threading.Lock()
+
+# Stages of the request being traced by the current thread, if it is sampled.
+_trace_context = threading.local()
+
+
+@contextlib.contextmanager
+def stage(name):
+    """Context manager measuring a stage of a request.
+
+    The duration of the stage is observed by the stage histogram, and added to
+    the trace of the current request if it is sampled.
+
+    Parameters:
+        name: name of the stage, used as label of the histogram.
+    """
+    start = time.time()
+    try:
+        yield
+    finally:
+        duration = time.time() - start
+        stage_histogram.labels(name).observe(duration)
+        spans = getattr(_trace_context, "spans", None)
+        if spans is not None:
+            spans.append((name, duration))
+
+
+def _configure_trace_logger():
+    """Make sure the traces are output, the servers not configuring the
+    logging (the root logger only outputs the warnings)."""
+    with _trace_logger_lock:
+        if trace_logger.handlers:
+            return
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+        trace_logger.addHandler(handler)
+        trace_logger.setLevel(logging.INFO)
+        trace_logger.propagate = False
+
+
+def timed_stage(name):
+    """Decorator measuring the calls of a function as a stage of a request.
+
+    Parameters:
+        name: name of the stage.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            """Wraps the function calls in a stage."""
+            with stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@contextlib.contextmanager
+def trace(request_name):
+    """Context manager tracing a request, if it is sampled.
+
+    The stages of a sampled request are logged on a single line once the
+    request ends. Requests made while handling a traced request (e.g. the
+    matches of an UpdateSummoner) are part of its trace.
+
+    Parameters:
+        request_name: name of the request, prefixing the log line.
+    """
+    if (getattr(_trace_context, "spans", None) is not None or
+            FLAGS.trace_sample_rate <= 0 or
+            random.random() >= FLAGS.trace_sample_rate):
+        yield
+        return
+
+    if not trace_logger.handlers:
+        _configure_trace_logger()
+
+    _trace_context.spans = []
+    start = time.time()
+    try:
+        yield
+    finally:
+        duration = time.time() - start
+        spans = _trace_context.spans
+        _trace_context.spans = None
+        trace_logger.info("%s %.3fms: %s", request_name, duration * 1000,
+                          " ".join("%s=%.3fms" % (name, span * 1000)
+                                   for name, span in spans))
+
+
+def rate_limiter_name(limiter):
+    """Name of a rate limiter in the metrics, e.g. 10_per_10s."""
+    return "%d_per_%gs" % (limiter.allowed_requests, limiter.seconds)
+
+
+def observe_rate_limiter(limiter):
+    """Update the tokens and utilization gauges of a rate limiter.
+
+    The requests of the limiter must have been reloaded (see
+    RateLimit.request_available).
+    """
+    name = rate_limiter_name(limiter)
+    used = len(limiter.made_requests)
+    rate_limit_tokens.labels(name).set(
+        max(limiter.allowed_requests - used, 0))
+    rate_limit_utilization.labels(name).set(
+        used / float(limiter.allowed_requests))
+
 
 @watcher.register_watcher
 class MongoDBWatcher():
@@ -48,6 +241,16 @@ class MongoDBWatcher():
             database=database, collection=collection)
         cls.watched_collections[(database, collection)] = counter
 
+    def __init__(self):
+        """Constructor. The client is created on the first update."""
+        self._client = None
+        self._client_address = None
+
+    @property
+    def interval(self):
+        """Interval between two updates, in milliseconds."""
+        return FLAGS.mongodb_watcher_interval
+
     def update(self):
         """Update the metrics on mongo DB status."""
         if self.server_address is None:
@@ -55,22 +258,57 @@ class MongoDBWatcher():
 
         try:
             client = self.get_client()
-        except Exception as e:  # TODO(funkysayu) too broad exception
+            server_status = client.admin.command("serverStatus")
+        except pymongo.errors.PyMongoError:
             mongodb_state.set(0)
             return
         mongodb_state.set(1)
 
+        self.update_server_metrics(server_status)
         for (db, collection), counter in self.watched_collections.items():
-            counter.set(client[db][collection].count())
+            # The collection statistics are read from the collection metadata
+            # rather than by scanning the documents.
+            try:
+                stats = client[db].command("collStats", collection)
+            except pymongo.errors.OperationFailure:
+                counter.set(0)  # The collection does not exist yet.
+                continue
+            counter.set(stats["count"])
+            for index, size in stats.get("indexSizes", {}).items():
+                mongodb_index_size.labels(
+                    database=db, collection=collection, index=index).set(size)
+
+    @staticmethod
+    def update_server_metrics(server_status):
+        """Update the metrics of the server from its serverStatus."""
+        for operation, count in server_status.get("opcounters", {}).items():
+            mongodb_opcounters.labels(operation).set(count)
+        for state in ("current", "available"):
+            if state in server_status.get("connections", {}):
+                mongodb_connections.labels(state).set(
+                    server_status["connections"][state])
+
+        cache_status = server_status.get("wiredTiger", {}).get("cache", {})
+        for label, key in (("used", "bytes currently in the cache"),
+                           ("dirty", "tracked dirty bytes in the cache"),
+                           ("max", "maximum bytes configured")):
+            if key in cache_status:
+                mongodb_cache_bytes.labels(label).set(cache_status[key])
 
     def get_client(self):
-        """Get a client to the server."""
-        client = pymongo.MongoClient(
-            self.server_address, serverSelectionTimeoutMS=100)
+        """Get a client to the server.
 
-        # Send a query to the server to ensure the connection is working.
-        client.server_info()
-        return client
+        The client is reused between updates, its pool of connections handles
+        the reconnection to the server.
+        """
+        if self._client is None or self._client_address != self.server_address:
+            if self._client is not None:
+                self._client.close()
+            self._client = pymongo.MongoClient(
+                self.server_address, serverSelectionTimeoutMS=100,
+                maxPoolSize=1)
+            self._client_address = self.server_address
+        return self._client
 
 
 @watcher.register_watcher
@@ -97,3 +335,4 @@ class FetcherWatcher():
         for limiter, gauge in self.limiters_gauges.items():
             limiter.request_available()  # Force the limiter to reload
             gauge.set(len(limiter.made_requests))
+            observe_rate_limiter(limiter)
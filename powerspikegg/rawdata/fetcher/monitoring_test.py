@@ -1,3 +1,5 @@
+import gflags
+import logging
 import unittest
 
 from prometheus_client import core
@@ -7,6 +9,9 @@ from powerspikegg.rawdata.fetcher import handler
 from powerspikegg.rawdata.fetcher import monitoring
 
 
+FLAGS = gflags.FLAGS
+
+
 class MongoDBMonitoringTests(unittest.TestCase):
     """Ensures mongodb is correctly monitored."""
 
@@ -59,6 +64,46 @@ class MongoDBMonitoringTests(unittest.TestCase):
         self.assertEqual(count, collection.count())
 
 
+class MongoDBServerMetricsTests(unittest.TestCase):
+    """Ensures the server status of mongodb is exported."""
+
+    def test_server_metrics(self):
+        """Tests the metrics are read from a serverStatus."""
+        monitoring.MongoDBWatcher.update_server_metrics({
+            "opcounters": {"insert": 12, "query": 42},
+            "connections": {"current": 3, "available": 97},
+            "wiredTiger": {"cache": {"bytes currently in the cache": 1024,
+                                     "maximum bytes configured": 4096}},
+        })
+
+        def get_sample(name, **labels):
+            return core.REGISTRY.get_sample_value(name, labels)
+
+        self.assertEqual(42, get_sample("mongodb_opcounters", type="query"))
+        self.assertEqual(3, get_sample("mongodb_connections",
+                                       state="current"))
+        self.assertEqual(1024, get_sample("mongodb_wiredtiger_cache_bytes",
+                                          type="used"))
+        self.assertEqual(4096, get_sample("mongodb_wiredtiger_cache_bytes",
+                                          type="max"))
+
+    def test_no_storage_engine_metrics(self):
+        """Tests a server without WiredTiger is supported."""
+        def get_cache_sample(label):
+            return core.REGISTRY.get_sample_value(
+                "mongodb_wiredtiger_cache_bytes", {"type": label})
+
+        cache_samples = [get_cache_sample(label) for label in ("used", "max")]
+        monitoring.MongoDBWatcher.update_server_metrics({
+            "opcounters": {"command": 7}})
+
+        self.assertEqual(7, core.REGISTRY.get_sample_value(
+            "mongodb_opcounters", {"type": "command"}))
+        self.assertEqual(cache_samples, [get_cache_sample(label)
+                                         for label in ("used", "max")])
+        self.assertIsNone(get_cache_sample("dirty"))
+
+
 class RawDataMonitoringTests(unittest.TestCase):
     """Ensure monitoring metrics are correctly handled in the fetcher."""
 
@@ -116,5 +161,69 @@ class RawDataMonitoringTests(unittest.TestCase):
         self.assertEqual(2, self._get_gauge_count(limiter))
 
 
+class StageMonitoringTests(unittest.TestCase):
+    """Ensure the stages of the requests are measured and traced."""
+
+    @staticmethod
+    def _get_stage_count(name):
+        """Retrieves the number of measures of a stage."""
+        return core.REGISTRY.get_sample_value(
+            "rawdata_fetcher_stage_seconds_count", {"stage": name}) or 0
+
+    def test_stage_observed(self):
+        """Tests a stage is observed even if it raises an exception."""
+        @monitoring.timed_stage("test_stage_observed")
+        def failing_stage():
+            raise ValueError()
+
+        with self.assertRaises(ValueError):
+            failing_stage()
+        with monitoring.stage("test_stage_observed"):
+            pass
+
+        self.assertEqual(2, self._get_stage_count("test_stage_observed"))
+
+    def test_sampled_trace(self):
+        """Tests the stages of a sampled request are logged on a line."""
+        FLAGS.trace_sample_rate = 1.
+        try:
+            with self.assertLogs(monitoring.trace_logger,
+                                 logging.INFO) as logs:
+                with monitoring.trace("MyRequest"):
+                    with monitoring.stage("first"):
+                        pass
+                    with monitoring.trace("NestedRequest"):
+                        with monitoring.stage("second"):
+                            pass
+        finally:
+            FLAGS.trace_sample_rate = 0.
+
+        self.assertEqual(1, len(logs.output))
+        self.assertRegex(logs.output[0],
+                         r"MyRequest .*ms: first=.*ms second=.*ms$")
+
+    def test_trace_logger_configured(self):
+        """Tests the traces are output even if the logging is not
+        configured."""
+        handlers = monitoring.trace_logger.handlers[:]
+        monitoring.trace_logger.handlers = []
+        FLAGS.trace_sample_rate = 1.
+        try:
+            with monitoring.trace("MyRequest"):
+                pass
+            self.assertTrue(monitoring.trace_logger.handlers)
+            self.assertTrue(monitoring.trace_logger.isEnabledFor(logging.INFO))
+        finally:
+            FLAGS.trace_sample_rate = 0.
+            monitoring.trace_logger.handlers = handlers
+
+    def test_trace_disabled(self):
+        """Tests the stages are not recorded if the request is not sampled."""
+        with monitoring.trace("MyRequest"):
+            with monitoring.stage("first"):
+                self.assertIsNone(
+                    getattr(monitoring._trace_context, "spans", None))
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -15,6 +15,7 @@ from powerspikegg.rawdata.public import constants_pb2
 from powerspikegg.rawdata.fetcher import cache
 from powerspikegg.rawdata.fetcher import converter
 from powerspikegg.rawdata.fetcher import handler
+from powerspikegg.rawdata.fetcher import monitoring
 from powerspikegg.rawdata.fetcher import service_pb2
 from third_party.python.riotwatcher import riotwatcher
 
@@ -28,6 +29,9 @@ FLAGS = gflags.FLAGS
 
 gflags.DEFINE_string("riot_api_token", None,
                      "token used to reach the Riot API")
+gflags.DEFINE_string("riot_api_base_url", "",
+                     "URL of the Riot API, e.g. http://localhost:8004 to "
+                     "target a fake Riot API. Empty for the real one.")
 gflags.DEFINE_integer("port", 50001, "port on which the server will listen")
 gflags.DEFINE_integer("max_workers", 10,
                       "number of threads handling the requests")
@@ -42,6 +46,12 @@ class ServerError(Exception):
     """
 
 
+class NotFoundError(Exception):
+    """Exception raised when an entity is known to be missing from the Riot
+    API.
+    """
+
+
 class MatchFetcher(service_pb2.MatchFetcherServicer):
     """Implementation of the MatchFetcher service.
 
@@ -61,7 +71,8 @@ class MatchFetcher(service_pb2.MatchFetcherServicer):
             riot_api_token: Argparser arguments.
         """
         if self.riot_api_handler is None:
-            self.riot_api_handler = handler.RiotAPIHandler(riot_api_token)
+            self.riot_api_handler = handler.RiotAPIHandler(
+                riot_api_token, base_url=FLAGS.riot_api_base_url or None)
         if self.cache_manager is None:
             self.cache_manager = cache.CacheManager()
         self.converter = converter.JSONConverter(self.riot_api_handler)
@@ -82,28 +93,60 @@ class MatchFetcher(service_pb2.MatchFetcherServicer):
         if not request.id and not request.name:
             raise ValueError("Summoner's ID or name must be specified.")
 
-        if not request.id:
-            request = self._GetSummonerFromName(request)
-
-        # Fetch match references from the summoner ID
-        if not FLAGS.riot_api_down:
-            raw_match_references = self.riot_api_handler.get_match_list(
-                request.id, constants_pb2.Region.Name(request.region),
-                ranked_queues=constants_pb2.QueueType.keys(),
-                season=constants_pb2.Season.keys())
-        else:  # TODO(funkysayu): handle this properly
-            query = service_pb2.Query(summoner=request)
-            raw_match_references = {"matches": [
-                {"matchId": int(m.id)}
-                for m in self.CacheQuery(query, context)]}
-
-        # Fetch match details from the summoner ID
-        for raw_match_reference in raw_match_references.get("matches", []):
-            match_id = raw_match_reference["matchId"]
-            yield self.Match(service_pb2.MatchRequest(
-                id=match_id,
-                region=request.region
-            ), context)
+        with monitoring.trace("UpdateSummoner"):
+            if not request.id:
+                request = self._GetSummonerFromName(request)
+
+            # Fetch match references from the summoner ID. Only matches created
+            # after the last refresh of the summoner are requested.
+            last_match_creation = None
+            if not FLAGS.riot_api_down:
+                last_match_creation = (
+                    self.cache_manager.find_summoner_last_match_time(request))
+                begin_time = None
+                if last_match_creation is not None:
+                    begin_time = last_match_creation + 1
+
+                raw_match_references = self.riot_api_handler.get_match_list(
+                    request.id, constants_pb2.Region.Name(request.region),
+                    ranked_queues=constants_pb2.QueueType.keys(),
+                    season=constants_pb2.Season.keys(),
+                    begin_time=begin_time)
+            else:  # TODO(funkysayu): handle this properly
+                query = service_pb2.Query(summoner=request)
+                raw_match_references = {"matches": [
+                    {"matchId": int(m.id)}
+                    for m in self.CacheQuery(query, context)]}
+
+            # Fetch match details from the summoner ID. The matches which could
+            # not be fetched (e.g. rate limited) are returned empty.
+            failed_references = []
+            match_references = raw_match_references.get("matches", [])
+            for raw_match_reference in match_references:
+                match_id = raw_match_reference["matchId"]
+                match = self.Match(service_pb2.MatchRequest(
+                    id=match_id,
+                    region=request.region
+                ), context)
+                if not match.id:
+                    failed_references.append(raw_match_reference)
+                yield match
+
+            # Move the high-water mark once every match has been streamed, so
+            # an interrupted refresh is fully replayed on the next call. It
+            # stays below the matches which could not be fetched, so they are
+            # requested again on the next refresh.
+            timestamps = [r["timestamp"] for r in match_references
+                          if "timestamp" in r]
+            if failed_references:
+                if any("timestamp" not in r for r in failed_references):
+                    return
+                first_failure = min(r["timestamp"] for r in failed_references)
+                timestamps = [t for t in timestamps if t < first_failure]
+            if timestamps and (last_match_creation is None or
+                               max(timestamps) > last_match_creation):
+                self.cache_manager.save_summoner_last_match_time(
+                    request, max(timestamps))
 
     @rpc.endpoint_monitoring()
     def Match(self, request, context):
@@ -121,21 +164,31 @@ class MatchFetcher(service_pb2.MatchFetcherServicer):
         if not request.region:
             raise ValueError("Missing required field Region in the request.")
 
-        match_data = self.cache_manager.find_match(request)
+        with monitoring.trace("Match"):
+            match_data = self.cache_manager.find_match(request)
 
-        if match_data is None:
-            try:
-                match_data = self.riot_api_handler.get_match(
-                    request.id, constants_pb2.Region.Name(request.region))
-            except riotwatcher.LoLException as e:
-                logging.debug(traceback.format_exc())
-                logging.error("Riot API handler raised an exception: %s", e)
-                return match_pb2.MatchReference()
+            if match_data is None:
+                if self.cache_manager.is_known_missing(
+                        "match", request.region, request.id):
+                    return match_pb2.MatchReference()
 
-            self.cache_manager.save_match(match_data)
+                try:
+                    match_data = self.riot_api_handler.get_match(
+                        request.id, constants_pb2.Region.Name(request.region))
+                except riotwatcher.LoLException as e:
+                    logging.debug(traceback.format_exc())
+                    logging.error("Riot API handler raised an exception: %s",
+                                  e)
+                    if e == riotwatcher.error_404:
+                        self.cache_manager.save_missing(
+                            "match", request.region, request.id)
+                    return match_pb2.MatchReference()
 
-        return self.converter.json_match_to_match_pb(match_data)
+                self.cache_manager.save_match(match_data)
 
+            return self.converter.json_match_to_match_pb(match_data)
+
+    @rpc.endpoint_monitoring()
     def CacheQuery(self, query_pb, context):
         """Query the Mongo DB cache based on a query message.
 
@@ -147,6 +200,7 @@ class MatchFetcher(service_pb2.MatchFetcherServicer):
         for match in self.cache_manager.query_matches_cache(query_pb):
             yield self.converter.json_match_to_match_pb(match)
 
+    @rpc.endpoint_monitoring()
     def AverageStatistics(self, query_pb, context):
         """Get the average statistics based on a query message.
 
@@ -166,14 +220,29 @@ class MatchFetcher(service_pb2.MatchFetcherServicer):
             partial_summoner: constants_pb2.Summoner message with missing id
         Returns:
             A summoner entity containing all informations about the summoner.
+        Raises:
+            NotFoundError: If the summoner is known to be missing from the Riot
+                API.
         """
         summoner_data = self.cache_manager.find_summoner(partial_summoner)
         if summoner_data is not None:
             return self.converter.json_summoner_to_summoner_pb(summoner_data)
 
-        summoner_data = self.riot_api_handler.get_summoner(
-            name=partial_summoner.name,
-            region=constants_pb2.Region.Name(partial_summoner.region))
+        normalized_name = cache.normalize_summoner_name(partial_summoner.name)
+        if self.cache_manager.is_known_missing(
+                "summoner", partial_summoner.region, normalized_name):
+            raise NotFoundError("Summoner %s not found." %
+                                partial_summoner.name)
+
+        try:
+            summoner_data = self.riot_api_handler.get_summoner(
+                name=partial_summoner.name,
+                region=constants_pb2.Region.Name(partial_summoner.region))
+        except riotwatcher.LoLException as e:
+            if e == riotwatcher.error_404:
+                self.cache_manager.save_missing(
+                    "summoner", partial_summoner.region, normalized_name)
+            raise
         summoner = self.converter.json_summoner_to_summoner_pb(
             summoner_data, partial_summoner.region)
 
@@ -1,5 +1,7 @@
+import gflags
 import grpc
 import json
+import logging
 import mock
 import os
 import requests
@@ -7,6 +9,7 @@ import unittest
 
 from powerspikegg.rawdata.fetcher import aggregator_test
 from powerspikegg.rawdata.fetcher import converter
+from powerspikegg.rawdata.fetcher import monitoring
 from powerspikegg.rawdata.fetcher import service_pb2
 from powerspikegg.rawdata.fetcher.converter import JSONConverter
 from powerspikegg.rawdata.fetcher.server import MatchFetcher
@@ -17,6 +20,8 @@ from third_party.python.riotwatcher import riotwatcher
 from third_party.python.riotwatcher.rwmock import RiotWatcherMock
 from third_party.python.riotwatcher.rwmock import SAMPLES
 
+FLAGS = gflags.FLAGS
+
 
 class MatchFetcherTest(unittest.TestCase):
     """Test the behavior of the MatchFetcher gRPC server."""
@@ -49,6 +54,9 @@ class MatchFetcherTest(unittest.TestCase):
         """Generates a new magic mock in the handler for each tests."""
         self.service.riot_api_handler = RiotWatcherMock()
         self.service.cache_manager = mock.MagicMock()
+        cache_manager = self.service.cache_manager
+        cache_manager.find_summoner_last_match_time.return_value = None
+        self.service.cache_manager.is_known_missing.return_value = False
 
     def test_match_fetching(self):
         """Check if the server handle correctly a normal request."""
@@ -86,6 +94,39 @@ class MatchFetcherTest(unittest.TestCase):
             id=4242, region=constants_pb2.EUW))
         self.assertEqual(response, match_pb2.MatchReference())
 
+    def test_match_not_found_is_remembered(self):
+        """Check if a match missing from the Riot API is negatively cached."""
+        self.service.cache_manager.find_match.return_value = None
+        self.service.riot_api_handler.get_match.side_effect = (
+            riotwatcher.LoLException(riotwatcher.error_404,
+                                     requests.Response()))
+
+        response = self.stub.Match(service_pb2.MatchRequest(
+            id=4242, region=constants_pb2.EUW))
+        self.assertEqual(response, match_pb2.MatchReference())
+        self.service.cache_manager.save_missing.assert_called_once_with(
+            "match", constants_pb2.EUW, 4242)
+
+    def test_match_known_missing(self):
+        """Check if a match known to be missing is not requested again."""
+        self.service.cache_manager.find_match.return_value = None
+        self.service.cache_manager.is_known_missing.return_value = True
+
+        response = self.stub.Match(service_pb2.MatchRequest(
+            id=4242, region=constants_pb2.EUW))
+        self.assertEqual(response, match_pb2.MatchReference())
+        self.assertFalse(self.service.riot_api_handler.get_match.called)
+
+    def test_summoner_known_missing(self):
+        """Check if a summoner known to be missing is not requested again."""
+        self.service.cache_manager.find_summoner.return_value = None
+        self.service.cache_manager.is_known_missing.return_value = True
+
+        with self.assertRaises(grpc.RpcError):
+            next(self.stub.UpdateSummoner(constants_pb2.Summoner(
+                name="Foo Bar", region=constants_pb2.EUW)))
+        self.assertFalse(self.service.riot_api_handler.get_summoner.called)
+
     def test_bad_requests(self):
         """Check if the server correctly raise error on bad request."""
         # Match endpoint
@@ -150,6 +191,84 @@ class MatchFetcherTest(unittest.TestCase):
         self.assertFalse(self.service.riot_api_handler.get_summoner.called)
         self.assertFalse(self.service.cache_manager.save_summoner.called)
 
+    def test_update_summoner_saves_last_match_time(self):
+        """Ensures the summoner high-water mark is moved after an update."""
+        self.service.cache_manager.find_match.return_value = None
+
+        list(self.stub.UpdateSummoner(constants_pb2.Summoner(
+            id=4242, region=constants_pb2.EUW)))
+
+        timestamps = [m["timestamp"] for m in SAMPLES["match_list"]["matches"]]
+        save = self.service.cache_manager.save_summoner_last_match_time
+        self.assertTrue(save.called)
+        self.assertEqual(save.call_args[0][1], max(timestamps))
+
+        _, kwargs = self.service.riot_api_handler.get_match_list.call_args
+        self.assertIsNone(kwargs["begin_time"])
+
+    def test_update_summoner_failed_fetch(self):
+        """Ensures the high-water mark stays below a match which could not be
+        fetched, so it is requested again on the next refresh."""
+        self.service.cache_manager.find_match.return_value = None
+        self.service.riot_api_handler.get_match_list.return_value = {
+            "matches": [
+                {"matchId": 3, "timestamp": 3000},
+                {"matchId": 2, "timestamp": 2000},
+                {"matchId": 1, "timestamp": 1000},
+            ]}
+
+        def get_match(match_id, region):
+            if match_id == 2:
+                raise riotwatcher.LoLException(
+                    riotwatcher.error_429, mock.Mock(headers={}))
+            return SAMPLES["match"]
+        self.service.riot_api_handler.get_match.side_effect = get_match
+
+        responses = list(self.stub.UpdateSummoner(constants_pb2.Summoner(
+            id=4242, region=constants_pb2.EUW)))
+
+        self.assertEqual(len(responses), 3)
+        self.assertEqual(responses[1], match_pb2.MatchReference())
+        save = self.service.cache_manager.save_summoner_last_match_time
+        self.assertTrue(save.called)
+        self.assertEqual(save.call_args[0][1], 1000)
+
+    def test_update_summoner_traced(self):
+        """Ensures the matches of an update are part of its trace."""
+        self.service.cache_manager.find_match.return_value = None
+
+        FLAGS.trace_sample_rate = 1.
+        try:
+            with self.assertLogs(monitoring.trace_logger,
+                                 logging.INFO) as logs:
+                list(self.stub.UpdateSummoner(constants_pb2.Summoner(
+                    id=4242, region=constants_pb2.EUW)))
+        finally:
+            FLAGS.trace_sample_rate = 0.
+
+        self.assertEqual(1, len(logs.output))
+        self.assertIn("UpdateSummoner", logs.output[0])
+        self.assertIn("json_match_to_match_pb", logs.output[0])
+
+    def test_update_summoner_incremental(self):
+        """Ensures only matches newer than the last refresh are requested."""
+        self.service.cache_manager.find_match.return_value = None
+        timestamps = [m["timestamp"] for m in SAMPLES["match_list"]["matches"]]
+        cache_manager = self.service.cache_manager
+        cache_manager.find_summoner_last_match_time.return_value = max(
+            timestamps)
+        self.service.riot_api_handler.get_match_list.return_value = {
+            "totalGames": 0}
+
+        responses = list(self.stub.UpdateSummoner(constants_pb2.Summoner(
+            id=4242, region=constants_pb2.EUW)))
+
+        self.assertEqual(responses, [])
+        _, kwargs = self.service.riot_api_handler.get_match_list.call_args
+        self.assertEqual(kwargs["begin_time"], max(timestamps) + 1)
+        self.assertFalse(
+            self.service.cache_manager.save_summoner_last_match_time.called)
+
     def test_query_cache_correctly_forwarded(self):
         """Ensure query is correctly forwarded."""
         expected = [SAMPLES["match"]]
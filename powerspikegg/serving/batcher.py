@@ -0,0 +1,101 @@
+""" Dynamic batching of concurrent requests
+
+Items submitted by concurrent request handlers are queued and processed
+together by a single thread: a batch is closed once it reaches its maximum
+size, or once its first item waited for the maximum latency.
+
+"""
+
+import threading
+import time
+
+from concurrent import futures
+
+try:
+    import queue  # Python 3.x
+except ImportError:
+    import Queue as queue  # Python 2.x
+
+
+class DynamicBatcher:
+    """Group concurrently submitted items into batches.
+
+    Batches are processed by calling a function with the list of items, which
+    returns the list of their results in the same order. An exception raised
+    by the function is set on the result of every item of the batch.
+    """
+
+    def __init__(self, process_batch, max_batch_size=64, max_latency=0.005):
+        """Constructor. Start the batching thread.
+
+        Parameters:
+            process_batch: function computing the results of a list of items.
+            max_batch_size: maximum number of items per batch.
+            max_latency: maximum time, in seconds, an item waits for other
+                items to be batched with.
+        """
+        self.process_batch = process_batch
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency
+        self.batch_count = 0
+        self.item_count = 0
+
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def submit(self, item):
+        """Queue an item to be processed in the next batch.
+
+        Returns:
+            A concurrent.futures.Future holding the result of the item.
+        """
+        future = futures.Future()
+        self._queue.put((item, future))
+        return future
+
+    def _run(self):
+        """Batching loop, exiting when the batcher is closed."""
+        running = True
+        while running:
+            entry = self._queue.get()
+            if entry is None:
+                return
+
+            batch = [entry]
+            deadline = time.time() + self.max_latency
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - time.time()
+                if timeout <= 0:
+                    break
+                try:
+                    entry = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if entry is None:
+                    running = False
+                    break
+                batch.append(entry)
+
+            self._process(batch)
+
+    def _process(self, batch):
+        """Process a batch and set the result of its items."""
+        self.batch_count += 1
+        self.item_count += len(batch)
+
+        try:
+            results = self.process_batch([item for item, _ in batch])
+        except Exception as e:  # Forwarded to the request handlers.
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
+
+    def close(self):
+        """Stop the batching thread once the queued items are processed."""
+        self._queue.put(None)
+        self._thread.join()
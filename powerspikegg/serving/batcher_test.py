@@ -0,0 +1,76 @@
+import threading
+import time
+import unittest
+
+from powerspikegg.serving import batcher
+
+
+class SomeException(Exception):
+    """Some specific exception raised by a batch processing."""
+
+
+class TestDynamicBatcher(unittest.TestCase):
+    """Tests concurrent items are processed in batches."""
+
+    def test_results_follow_items(self):
+        """Tests every item gets its own result."""
+        dynamic_batcher = batcher.DynamicBatcher(
+            lambda items: [item * 2 for item in items])
+        try:
+            results = [dynamic_batcher.submit(item) for item in range(10)]
+            self.assertEqual([result.result() for result in results],
+                             [item * 2 for item in range(10)])
+        finally:
+            dynamic_batcher.close()
+
+    def test_batch_size_is_bounded(self):
+        """Tests queued items are split in batches of the maximum size."""
+        sizes = []
+        release = threading.Event()
+
+        def process(items):
+            release.wait()
+            sizes.append(len(items))
+            return items
+
+        dynamic_batcher = batcher.DynamicBatcher(process, max_batch_size=4,
+                                                 max_latency=0.05)
+        try:
+            results = [dynamic_batcher.submit(item) for item in range(10)]
+            release.set()
+            for result in results:
+                result.result()
+        finally:
+            dynamic_batcher.close()
+
+        self.assertEqual(sum(sizes), 10)
+        self.assertTrue(all(size <= 4 for size in sizes))
+        self.assertEqual(dynamic_batcher.item_count, 10)
+
+    def test_deadline_closes_batch(self):
+        """Tests a lonely item is processed once its deadline expires."""
+        dynamic_batcher = batcher.DynamicBatcher(lambda items: items,
+                                                 max_batch_size=100,
+                                                 max_latency=0.01)
+        try:
+            start = time.time()
+            self.assertEqual(dynamic_batcher.submit(42).result(timeout=1), 42)
+            self.assertLess(time.time() - start, 1)
+        finally:
+            dynamic_batcher.close()
+
+    def test_exception_forwarded(self):
+        """Tests an exception raised by the processing reaches the items."""
+        def process(items):
+            raise SomeException("Whoops!")
+
+        dynamic_batcher = batcher.DynamicBatcher(process)
+        try:
+            with self.assertRaises(SomeException):
+                dynamic_batcher.submit(None).result()
+        finally:
+            dynamic_batcher.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,46 @@
+""" Frozen models loaded for inference
+
+Load the graphs exported by computation_models/match/freeze.py in their own
+session, without the training operations of GraphTrainer.
+
+"""
+
+import tensorflow as tf
+
+
+class FrozenModel:
+    """A frozen graph and the session evaluating it."""
+
+    def __init__(self, path, input_name="placeholder", output_name="logits",
+                 session_config=None):
+        """Constructor. Load the graph in a new session.
+
+        Parameters:
+            path: path of the frozen graph.
+            input_name: name of the input placeholder.
+            output_name: name of the predicted value.
+            session_config: Optional tf.ConfigProto of the session.
+        """
+        self.path = path
+        self.graph = tf.Graph()
+        with self.graph.as_default():
+            graph_def = tf.GraphDef()
+            with tf.gfile.GFile(path, "rb") as f:
+                graph_def.ParseFromString(f.read())
+            tf.import_graph_def(graph_def, name="")
+
+        self.inputs = self.graph.get_tensor_by_name(input_name + ":0")
+        self.logits = self.graph.get_tensor_by_name(output_name + ":0")
+        self.sess = tf.Session(graph=self.graph, config=session_config)
+
+    def predict(self, inputs):
+        """Predict the statistic of every input row.
+
+        Returns:
+            An array of shape (rows, 1).
+        """
+        return self.sess.run(self.logits, feed_dict={self.inputs: inputs})
+
+    def close(self):
+        """Close the session (the model becomes unusable afterward)."""
+        self.sess.close()
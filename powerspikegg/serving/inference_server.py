@@ -0,0 +1,178 @@
+""" Python inference server of the MatchComputation service
+
+Serve the models exported by computation_models/match/export_weights.py with
+the NumPy runtime, so the server does not load TensorFlow. The models are
+indexed by a registry.ModelRegistry. The model name of a request is the
+variant of the models to use: empty for the models trained on every
+participant, or a variant directory such as "league_GOLD" or "champion_42".
+Concurrent requests on the same variant are batched, so the models are
+evaluated on a matrix of participants rather than once per request.
+
+Example:
+    bazel run //powerspikegg/serving:inference_server -- \\
+        --models_directory /tmp/powerspikegg/models
+
+"""
+
+import gflags
+import grpc
+import sys
+import threading
+import time
+
+from concurrent import futures
+
+from powerspikegg.computation_models.fetcher import fetcher
+from powerspikegg.computation_models.match import numpy_model
+from powerspikegg.lib.monitoring import rpc
+from powerspikegg.lib.monitoring.server import prometheus_monitoring
+from powerspikegg.serving import batcher
+from powerspikegg.serving import models
+from powerspikegg.serving import registry
+from powerspikegg.serving.public import match_computation_pb2
+
+
+FLAGS = gflags.FLAGS
+
+gflags.DEFINE_integer("port", 50051, "port on which the server will listen")
+gflags.DEFINE_integer("max_workers", 10,
+                      "number of threads handling the requests")
+gflags.DEFINE_string("models_directory", "/tmp/powerspikegg/models",
+                     "Directory containing the exported models, indexed by "
+                     "the model registry")
+gflags.DEFINE_integer("model_memory_budget_mb", 0,
+                      "Maximum size of the loaded models. If 0, loaded "
+                      "models are never evicted")
+gflags.DEFINE_list("warm_models", [],
+                   "Models loaded on startup, as directories relative to "
+                   "the models directory (e.g. kills/league_GOLD)")
+gflags.DEFINE_integer("max_batch_size", 64,
+                      "Maximum number of requests evaluated at once")
+gflags.DEFINE_integer("batch_timeout_ms", 5,
+                      "Maximum time a request waits to be batched with "
+                      "others")
+
+
+def find_participant(match, summoner_id):
+    """Find the participant of a summoner in a match.
+
+    Parameters:
+        match: a MatchReference containing the match details.
+        summoner_id: global identifier of the summoner.
+    Raises:
+        ValueError: If the summoner did not play the match.
+    """
+    for team in match.detail.teams:
+        for participant in team.participants:
+            if participant.summoner.id == summoner_id:
+                return participant
+    raise ValueError("Summoner %d did not play the match." % summoner_id)
+
+
+def create_feature(predictions):
+    """Convert the predicted values of the labels to a feature message."""
+    feature = match_computation_pb2.MatchComputationFeature()
+    for label, value in predictions.items():
+        statistic = getattr(feature.expected_statistics,
+                            models.STATISTICS_FIELDS[label])
+        statistic.value = int(round(value))
+    return feature
+
+
+class MatchComputation(match_computation_pb2.MatchComputationServicer):
+    """Implementation of the MatchComputation service."""
+
+    def __init__(self, model_registry, max_batch_size, max_latency):
+        """Constructor.
+
+        Parameters:
+            model_registry: the registry.ModelRegistry of the models.
+            max_batch_size: maximum number of requests evaluated at once.
+            max_latency: maximum time, in seconds, a request waits to be
+                batched with others.
+        """
+        self.model_registry = model_registry
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency
+
+        self._batchers = {}
+        self._batchers_lock = threading.Lock()
+
+    def _GetBatcher(self, model_name):
+        """Get the batcher of a model variant.
+
+        Raises:
+            ValueError: If the model name is not a variant of the registry.
+        """
+        variant = registry.parse_variant(model_name)
+
+        with self._batchers_lock:
+            if variant not in self._batchers:
+                model_set = models.ModelSet(self.model_registry, *variant)
+                self._batchers[variant] = batcher.DynamicBatcher(
+                    model_set.predict, self.max_batch_size, self.max_latency)
+            return self._batchers[variant]
+
+    @rpc.endpoint_monitoring()
+    def GetFeature(self, request, context):
+        """Predict the statistics of a summoner in a match.
+
+        Parameters:
+            request: A MatchComputationRequest containing the match details.
+            context: Context of the request, injected by grpc.
+        Returns:
+            A MatchComputationFeature with the statistics expected for a
+            winning match, for every label the variant can predict.
+        """
+        participant = find_participant(request.match, request.summoner_id)
+        statistics = fetcher.participant_statistics(participant)
+
+        predictions = self._GetBatcher(request.model_name).submit(statistics)
+        return create_feature(predictions.result())
+
+    def close(self):
+        """Stop the batchers."""
+        with self._batchers_lock:
+            for dynamic_batcher in self._batchers.values():
+                dynamic_batcher.close()
+            self._batchers.clear()
+
+
+def start_server(listening_port, max_workers):
+    """Starts a server."""
+    memory_budget = None
+    if FLAGS.model_memory_budget_mb:
+        memory_budget = FLAGS.model_memory_budget_mb * 1024 * 1024
+    model_registry = registry.ModelRegistry(
+        FLAGS.models_directory, numpy_model.NumpyModel, memory_budget,
+        numpy_model.WEIGHTS_FILENAME)
+    model_registry.warm(FLAGS.warm_models)
+
+    service = MatchComputation(model_registry, FLAGS.max_batch_size,
+                               FLAGS.batch_timeout_ms / 1000.)
+
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=max_workers))
+    match_computation_pb2.add_MatchComputationServicer_to_server(
+        service, server)
+    server.add_insecure_port('[::]:%s' % listening_port)
+    server.start()
+
+    return server, service
+
+
+def main():
+    """Start the server."""
+    server, service = start_server(FLAGS.port, FLAGS.max_workers)
+
+    try:
+        while True:
+            time.sleep(60 * 60 * 24)
+    except KeyboardInterrupt:
+        server.stop(0)
+        service.close()
+
+
+if __name__ == '__main__':
+    FLAGS(sys.argv)
+    with prometheus_monitoring():
+        main()
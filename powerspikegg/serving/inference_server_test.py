@@ -0,0 +1,103 @@
+import mock
+import numpy
+import os
+import shutil
+import tempfile
+import unittest
+
+from powerspikegg.computation_models.fetcher import fetcher
+from powerspikegg.computation_models.match import numpy_model
+from powerspikegg.rawdata.public import match_pb2
+from powerspikegg.serving import inference_server
+from powerspikegg.serving import models
+from powerspikegg.serving import registry
+from powerspikegg.serving.public import match_computation_pb2
+
+
+def _create_model(directory, relative_directory, value):
+    """Write a NumPy model always predicting the same value."""
+    model_directory = os.path.join(directory, relative_directory)
+    os.makedirs(model_directory)
+    input_size = len(fetcher.STATISTIC_LABELS) - 1
+    numpy_model.save_weights(
+        os.path.join(model_directory, numpy_model.WEIGHTS_FILENAME),
+        [(numpy.zeros((input_size, 1)), numpy.array([value]))])
+
+
+def _create_request(model_name, summoner_id):
+    """Create a request on a match played by the summoners 1 to 10."""
+    match = match_pb2.MatchReference(id=4242)
+    for team_index in range(2):
+        team = match.detail.teams.add()
+        for index in range(5):
+            participant = team.participants.add()
+            participant.summoner.id = team_index * 5 + index + 1
+    return match_computation_pb2.MatchComputationRequest(
+        model_name=model_name, match=match, summoner_id=summoner_id)
+
+
+class TestMatchComputation(unittest.TestCase):
+    """Tests the inference server predicts the statistics of a variant."""
+
+    def setUp(self):
+        """Create a models directory and a service."""
+        self.directory = tempfile.mkdtemp()
+        _create_model(self.directory, "kills", 3.4)
+        _create_model(self.directory, "deaths", 5.)
+        _create_model(self.directory, "deaths/league_GOLD", 7.)
+
+        self.registry = registry.ModelRegistry(
+            self.directory, numpy_model.NumpyModel,
+            filename=numpy_model.WEIGHTS_FILENAME)
+        self.service = inference_server.MatchComputation(self.registry, 4,
+                                                         .001)
+
+    def tearDown(self):
+        """Stop the service and remove the models directory."""
+        self.service.close()
+        shutil.rmtree(self.directory)
+
+    def test_get_feature(self):
+        """Tests every label of the variant is predicted."""
+        feature = self.service.GetFeature(_create_request("", 3),
+                                          mock.Mock())
+        statistics = feature.expected_statistics
+        self.assertEqual(statistics.kills.value, 3)
+        self.assertEqual(statistics.deaths.value, 5)
+        self.assertFalse(statistics.HasField("assists"))
+
+        feature = self.service.GetFeature(
+            _create_request("league_GOLD", 7), mock.Mock())
+        statistics = feature.expected_statistics
+        self.assertEqual(statistics.deaths.value, 7)
+        self.assertFalse(statistics.HasField("kills"))
+
+    def test_unknown_participant(self):
+        """Tests a summoner who did not play the match is rejected."""
+        with self.assertRaises(ValueError):
+            self.service.GetFeature(_create_request("", 42), mock.Mock())
+
+    def test_unknown_variant(self):
+        """Tests the variants without any model are rejected."""
+        with self.assertRaises(ValueError):
+            self.service.GetFeature(_create_request("unknown_variant", 3),
+                                    mock.Mock())
+        with self.assertRaises(ValueError):
+            self.service.GetFeature(_create_request("champion_42", 3),
+                                    mock.Mock())
+
+    def test_model_set(self):
+        """Tests a model set predicts the labels of its variant only."""
+        model_set = models.ModelSet(self.registry)
+        self.assertEqual(model_set.labels, ["kills", "deaths"])
+
+        statistics = numpy.zeros((2, len(fetcher.STATISTIC_LABELS)))
+        predictions = model_set.predict(statistics)
+        self.assertEqual(len(predictions), 2)
+        for prediction in predictions:
+            self.assertAlmostEqual(prediction["kills"], 3.4, places=5)
+            self.assertEqual(prediction["deaths"], 5.)
+
+
+if __name__ == "__main__":
+    unittest.main()
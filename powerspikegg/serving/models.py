@@ -0,0 +1,93 @@
+""" Models of every statistic label
+
+A model set gathers the models of every statistic label trained on the same
+participants (e.g. the models restricted to a league), loaded from a
+registry.ModelRegistry.
+
+"""
+
+import collections
+import numpy
+
+from powerspikegg.computation_models.fetcher import fetcher
+
+# Fields of serving.Statistics filled by the model of each statistic label.
+# Labels without a field (e.g. the champion id) are only used as inputs.
+STATISTICS_FIELDS = collections.OrderedDict([
+    ("kills", "kills"),
+    ("deaths", "deaths"),
+    ("assists", "assists"),
+    ("minions_killed", "minion_killed"),
+    ("total_damages", "total_damages"),
+    ("total_heal", "total_heal"),
+    ("wards_placed", "wards_placed"),
+    ("tower_kills", "tower_kills"),
+    ("champion_level", "champion_level"),
+])
+
+
+class ModelSet:
+    """The models of every statistic label of a variant."""
+
+    def __init__(self, registry, league=None, champion=0):
+        """Constructor.
+
+        Models are fetched from the registry at each prediction, so the
+        registry keeps track of their use.
+
+        Parameters:
+            registry: the registry.ModelRegistry of the models.
+            league: Optional league the models are restricted to.
+            champion: Optional champion id the models are restricted to.
+        Raises:
+            ValueError: If the registry contains no model of the variant.
+        """
+        self.registry = registry
+        self.league = league
+        self.champion = champion
+
+        self.labels = []
+        for label in STATISTICS_FIELDS:
+            try:
+                registry.latest_version(label, league, champion)
+            except KeyError:
+                continue
+            self.labels.append(label)
+
+        if not self.labels:
+            raise ValueError("No model for league %s and champion %d."
+                             % (league, champion))
+
+    def predict_columns(self, statistics):
+        """Predict every label from participants statistics.
+
+        Parameters:
+            statistics: (participants x statistics) matrix, with columns
+                ordered as fetcher.STATISTIC_LABELS.
+        Returns:
+            An OrderedDict mapping the labels to the array of their predicted
+            value for each participant.
+        """
+        statistics = numpy.asarray(statistics, dtype=numpy.float32)
+        predictions = collections.OrderedDict()
+        for label in self.labels:
+            model = self.registry.get(label, self.league, self.champion)
+            inputs, _ = fetcher.leave_one_out(
+                statistics, fetcher.STATISTIC_LABELS.index(label))
+            predictions[label] = model.predict(inputs)[:, 0]
+        return predictions
+
+    def predict(self, statistics):
+        """Predict every label from participants statistics.
+
+        Parameters:
+            statistics: (participants x statistics) matrix, with columns
+                ordered as fetcher.STATISTIC_LABELS.
+        Returns:
+            A list with, for each participant, a dictionary mapping the
+            labels to their predicted value.
+        """
+        columns = self.predict_columns(statistics)
+        return [dict((label, float(values[index]))
+                     for label, values in columns.items())
+                for index in range(len(statistics))]
@@ -0,0 +1,24 @@
+from prometheus_client import core
+
+"""Monitoring logic of the serving models."""
+
+model_load_latency = core.Histogram(
+    "serving_model_load_seconds",
+    "Time spent loading a model",
+)
+
+resident_models = core.Gauge(
+    "serving_resident_models",
+    "Number of models loaded in memory",
+)
+
+resident_bytes = core.Gauge(
+    "serving_resident_bytes",
+    "Size of the models loaded in memory",
+)
+
+model_lookups = core.Counter(
+    "serving_model_lookups",
+    "Lookups of models in the registry",
+    ["result"],
+)
@@ -0,0 +1,226 @@
+""" Registry of exported models
+
+Index the exported models of a models directory by statistic label, league,
+champion and version, and load them on first use. The directories follow the
+layout of computation_models/match/train_all.py, with an optional version
+directory holding the exported model (the output of freeze.py or
+export_weights.py):
+
+    <models directory>/<label>/<version>/frozen_model.pb
+    <models directory>/<label>/league_<LEAGUE>/<version>/frozen_model.pb
+    <models directory>/<label>/champion_<ID>/<version>/frozen_model.pb
+
+A model without version directory has the version 0. The loaded models are
+kept in a least recently used order: once their total size exceeds the
+memory budget, the oldest ones are dropped.
+
+"""
+
+import collections
+import os
+import threading
+import time
+
+from powerspikegg.rawdata.public import constants_pb2
+from powerspikegg.serving import monitoring
+
+
+FROZEN_GRAPH_NAME = "frozen_model.pb"
+
+ModelKey = collections.namedtuple("ModelKey", [
+    "label", "league", "champion", "version"])
+
+
+def parse_variant(variant):
+    """Parse the league and champion restrictions of a variant directory.
+
+    Parameters:
+        variant: relative directory of the variant, such as "league_GOLD",
+            "champion_42" or "league_GOLD/champion_42". Empty for the model
+            trained on every participant.
+    Returns:
+        A tuple (league, champion), where league is None and champion 0 if
+        they are not restricted.
+    Raises:
+        ValueError: If the variant is not understood.
+    """
+    league, champion = None, 0
+    for part in variant.split("/"):
+        if not part:
+            continue
+        elif part.startswith("league_"):
+            league = constants_pb2.League.Value(part[len("league_"):])
+        elif part.startswith("champion_"):
+            champion = int(part[len("champion_"):])
+        else:
+            raise ValueError("Invalid model variant %r." % variant)
+    return league, champion
+
+
+def parse_model_directory(relative_directory):
+    """Parse the key of a model from its directory.
+
+    Parameters:
+        relative_directory: directory of the model file, relative to the
+            models directory.
+    Returns:
+        The ModelKey of the model.
+    Raises:
+        ValueError: If the directory does not follow the registry layout.
+    """
+    parts = relative_directory.replace(os.sep, "/").split("/")
+    version = 0
+    if len(parts) > 1 and parts[-1].isdigit():
+        version = int(parts.pop())
+
+    label = parts[0]
+    if not label or label == ".":
+        raise ValueError("Model without label in %r." % relative_directory)
+    league, champion = parse_variant("/".join(parts[1:]))
+    return ModelKey(label, league, champion, version)
+
+
+class ModelRegistry:
+    """Lazily loaded models, bounded by a memory budget.
+
+    The size of a model is estimated from the size of its file, made of its
+    weights.
+    """
+
+    def __init__(self, directory, load_model, memory_budget=None,
+                 filename=FROZEN_GRAPH_NAME):
+        """Constructor. Index the models directory.
+
+        Parameters:
+            directory: the models directory.
+            load_model: function loading a model from its path, such as
+                frozen_model.FrozenModel.
+            memory_budget: Optional maximum size, in bytes, of the loaded
+                models.
+            filename: name of the model files.
+        """
+        self.directory = directory
+        self.load_model = load_model
+        self.memory_budget = memory_budget
+        self.filename = filename
+
+        self._paths = {}
+        self._models = collections.OrderedDict()
+        self._sizes = {}
+        self._lock = threading.Lock()
+        self.refresh()
+
+    def refresh(self):
+        """Index the models of the directory.
+
+        Directories not following the registry layout are ignored.
+        """
+        paths = {}
+        for root, _, filenames in os.walk(self.directory):
+            if self.filename not in filenames:
+                continue
+            try:
+                key = parse_model_directory(
+                    os.path.relpath(root, self.directory))
+            except ValueError:
+                continue
+            paths[key] = os.path.join(root, self.filename)
+
+        with self._lock:
+            self._paths = paths
+
+    def keys(self):
+        """Get the keys of the indexed models."""
+        with self._lock:
+            return sorted(self._paths, key=lambda key: (
+                key.label, key.league or 0, key.champion, key.version))
+
+    def latest_version(self, label, league=None, champion=0):
+        """Get the latest version of a model.
+
+        Raises:
+            KeyError: If no version of the model is indexed.
+        """
+        with self._lock:
+            versions = [key.version for key in self._paths
+                        if key[:3] == (label, league, champion)]
+        if not versions:
+            raise KeyError((label, league, champion))
+        return max(versions)
+
+    def get(self, label, league=None, champion=0, version=None):
+        """Get a model, loading it if required.
+
+        Parameters:
+            label: statistic label predicted by the model.
+            league: Optional league the model is restricted to.
+            champion: Optional champion id the model is restricted to.
+            version: Optional version of the model. Defaults to the latest.
+        Raises:
+            KeyError: If the model is not indexed.
+        """
+        if version is None:
+            version = self.latest_version(label, league, champion)
+        key = ModelKey(label, league, champion, version)
+
+        with self._lock:
+            if key in self._models:
+                self._models[key] = self._models.pop(key)
+                monitoring.model_lookups.labels("hit").inc()
+                return self._models[key]
+            path = self._paths[key]
+        monitoring.model_lookups.labels("miss").inc()
+
+        # Load without holding the lock, so cached models are still served.
+        start = time.time()
+        model = self.load_model(path)
+        monitoring.model_load_latency.observe(time.time() - start)
+
+        with self._lock:
+            if key in self._models:  # Loaded concurrently.
+                return self._models[key]
+            self._models[key] = model
+            self._sizes[key] = os.path.getsize(path)
+            self._evict(keep=key)
+            monitoring.resident_models.set(len(self._models))
+            monitoring.resident_bytes.set(self.resident_bytes)
+        return model
+
+    def _evict(self, keep):
+        """Drop the least recently used models exceeding the budget.
+
+        Evicted models are not closed, as they can still be used by a
+        request; their session is released once they are not referenced
+        anymore. Must be called with the lock held.
+        """
+        if self.memory_budget is None:
+            return
+        for key in list(self._models):
+            if self.resident_bytes <= self.memory_budget:
+                break
+            if key != keep:
+                del self._models[key]
+                del self._sizes[key]
+
+    @property
+    def resident_count(self):
+        """Number of loaded models."""
+        return len(self._models)
+
+    @property
+    def resident_bytes(self):
+        """Size of the loaded models."""
+        return sum(self._sizes.values())
+
+    def warm(self, models):
+        """Load the latest version of models.
+
+        Parameters:
+            models: models relative directories, without their version (e.g.
+                "kills" or "kills/league_GOLD").
+        Raises:
+            KeyError: If a model is not indexed.
+        """
+        for model in models:
+            key = parse_model_directory(model)
+            self.get(key.label, key.league, key.champion)
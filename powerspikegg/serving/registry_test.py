@@ -0,0 +1,99 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from powerspikegg.rawdata.public import constants_pb2
+from powerspikegg.serving import registry
+
+
+def _create_model(directory, relative_directory, size):
+    """Write a fake frozen graph of the given size."""
+    model_directory = os.path.join(directory, relative_directory)
+    os.makedirs(model_directory)
+    with open(os.path.join(model_directory, registry.FROZEN_GRAPH_NAME),
+              "wb") as f:
+        f.write(b"\0" * size)
+
+
+class TestModelRegistry(unittest.TestCase):
+    """Tests the registry indexes and loads the frozen models."""
+
+    def setUp(self):
+        """Create a models directory."""
+        self.directory = tempfile.mkdtemp()
+        _create_model(self.directory, "kills", 10)
+        _create_model(self.directory, "kills/league_GOLD/1", 10)
+        _create_model(self.directory, "kills/league_GOLD/2", 10)
+        _create_model(self.directory, "deaths/champion_42", 10)
+        _create_model(self.directory, "deaths/unknown_variant", 10)
+
+        self.loaded = []
+
+        def load_model(path):
+            self.loaded.append(path)
+            return path
+
+        self.registry = registry.ModelRegistry(self.directory, load_model,
+                                               memory_budget=25)
+
+    def tearDown(self):
+        """Remove the models directory."""
+        shutil.rmtree(self.directory)
+
+    def test_index(self):
+        """Tests models are indexed from their directory."""
+        gold = constants_pb2.GOLD
+        self.assertEqual(self.registry.keys(), [
+            registry.ModelKey("deaths", None, 42, 0),
+            registry.ModelKey("kills", None, 0, 0),
+            registry.ModelKey("kills", gold, 0, 1),
+            registry.ModelKey("kills", gold, 0, 2),
+        ])
+        self.assertEqual(self.registry.latest_version("kills", gold), 2)
+        with self.assertRaises(KeyError):
+            self.registry.latest_version("assists")
+
+    def test_lazy_loading(self):
+        """Tests models are loaded once, on first use."""
+        self.assertEqual(self.registry.resident_count, 0)
+
+        path = self.registry.get("kills", constants_pb2.GOLD)
+        self.assertEqual(path, os.path.join(
+            self.directory, "kills/league_GOLD/2", registry.FROZEN_GRAPH_NAME))
+        self.registry.get("kills", constants_pb2.GOLD, version=2)
+
+        self.assertEqual(self.loaded, [path])
+        self.assertEqual(self.registry.resident_count, 1)
+
+    def test_least_recently_used_eviction(self):
+        """Tests the least recently used models are dropped."""
+        self.registry.get("kills")
+        self.registry.get("deaths", champion=42)
+        self.registry.get("kills")
+        self.registry.get("kills", constants_pb2.GOLD)
+        self.assertEqual(self.registry.resident_count, 2)
+        self.assertEqual(self.registry.resident_bytes, 20)
+
+        # The champion model was the least recently used: it is reloaded.
+        self.registry.get("deaths", champion=42)
+        self.assertEqual(len(self.loaded), 4)
+
+    def test_warm(self):
+        """Tests the hot set is loaded."""
+        self.registry.warm(["kills", "deaths/champion_42"])
+        self.assertEqual(self.registry.resident_count, 2)
+        with self.assertRaises(KeyError):
+            self.registry.warm(["assists"])
+
+    def test_parse_variant(self):
+        """Tests variants are parsed from model names."""
+        self.assertEqual(registry.parse_variant(""), (None, 0))
+        self.assertEqual(registry.parse_variant("league_GOLD/champion_42"),
+                         (constants_pb2.GOLD, 42))
+        with self.assertRaises(ValueError):
+            registry.parse_variant("../kills")
+
+
+if __name__ == "__main__":
+    unittest.main()
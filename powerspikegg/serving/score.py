@@ -0,0 +1,333 @@
+""" Offline scoring of the cached participants
+
+Predict the expected statistics of every participant of the cache, or of an
+export of the cache (see computation_models/fetcher/export.py), and write them
+to a Mongo DB collection, one document per (matchId, participantId,
+modelVariant):
+
+    {"matchId": ..., "participantId": ..., "region": ...,
+     "modelVariant": ..., "expected": {"kills": ..., "deaths": ..., ...}}
+
+The participants are split in shards (the exported chunks, or _id ranges of
+the cache) scored by a pool of processes. Every model of the variant is
+evaluated on large batches of participants with the NumPy runtime.
+
+The shards and the ones already scored are saved in a checkpoint file, so an
+interrupted job resumes where it stopped. The checkpoint records the variant
+and the versions of the models: a job is not resumed with other models.
+Remove the checkpoint to rescore everything, e.g. after a new release of the
+models.
+
+Example:
+    bazel run //powerspikegg/serving:score -- \\
+        --scoring_source export --export_directory /tmp/powerspikegg/export \\
+        --models_directory /tmp/powerspikegg/models \\
+        --scoring_checkpoint /tmp/powerspikegg/scoring.json
+
+"""
+
+import collections
+import gflags
+import logging
+import multiprocessing
+import numpy
+import os
+import pymongo
+import sys
+
+from bson import json_util
+
+from powerspikegg.computation_models.fetcher import export
+from powerspikegg.computation_models.fetcher import fetcher
+from powerspikegg.computation_models.match import numpy_model
+from powerspikegg.rawdata.public import constants_pb2
+from powerspikegg.serving import models
+from powerspikegg.serving import registry
+
+
+FLAGS = gflags.FLAGS
+
+gflags.DEFINE_enum("scoring_source", "cache", ["cache", "export"],
+                   "Participants to score: the whole cache, or the chunks of "
+                   "the export directory.")
+gflags.DEFINE_string("models_directory", "/tmp/powerspikegg/models",
+                     "Directory containing the exported models, indexed by "
+                     "the model registry")
+gflags.DEFINE_string("model_variant", "",
+                     "Variant of the models evaluated (e.g. league_GOLD). "
+                     "Empty for the models trained on every participant.")
+gflags.DEFINE_string("predictions_collection", "predictions",
+                     "Collection of the cache database receiving the "
+                     "predictions.")
+gflags.DEFINE_string("scoring_checkpoint", "/tmp/powerspikegg/scoring.json",
+                     "File recording the scored shards.")
+gflags.DEFINE_integer("scoring_workers", multiprocessing.cpu_count(),
+                      "Number of processes scoring the participants.")
+gflags.DEFINE_integer("scoring_shards", 64,
+                      "Number of _id ranges the cache is split in.")
+gflags.DEFINE_integer("scoring_batch_size", 65536,
+                      "Number of participants evaluated at once.")
+
+# Columns required to score and store the participants.
+_COLUMNS = ["match_id", "participant_id", "region"] + list(
+    fetcher.STATISTIC_LABELS)
+
+# A shard to score. shard is a chunk path for the export source, or a
+# (lower, upper) _id range for the cache source.
+ScoringTask = collections.namedtuple("ScoringTask", [
+    "index", "source", "shard", "address", "database_name", "collection",
+    "mongo_filter", "league", "champion", "batch_size"])
+
+# Unique index of the predictions before they were keyed by variant.
+_LEGACY_PREDICTIONS_INDEX = "matchId_1_participantId_1"
+
+# Models of the worker process and their variant, see _init_worker.
+_model_set = None
+_variant = None
+
+
+def rows_to_columns(rows):
+    """Convert exported rows to a dictionary of columns, as export chunks."""
+    return dict((column, numpy.array([row[column] for row in rows],
+                                     dtype=export.COLUMNS[column]))
+                for column in _COLUMNS)
+
+
+def iter_shard_batches(task, client):
+    """Iterate over the participants of a shard, by batches.
+
+    Returns:
+        A generator of dictionaries mapping the columns to arrays.
+    """
+    if task.source == "export":
+        chunk = export.load_chunk(task.shard, _COLUMNS)
+        for start in range(0, len(chunk["match_id"]), task.batch_size):
+            yield dict((column, values[start:start + task.batch_size])
+                       for column, values in chunk.items())
+        return
+
+    lower, upper = task.shard
+    rows = []
+    for row in export.iter_range_rows(
+            client[task.database_name].matches, task.mongo_filter, lower,
+            upper, task.league, task.champion):
+        rows.append(row)
+        if len(rows) >= task.batch_size:
+            yield rows_to_columns(rows)
+            rows = []
+    if rows:
+        yield rows_to_columns(rows)
+
+
+def create_updates(batch, predictions, variant):
+    """Create the upserts of the predictions of a batch of participants.
+
+    Parameters:
+        batch: dictionary of columns of the participants.
+        predictions: dictionary mapping the labels to their predicted values.
+        variant: name of the variant of the models.
+    Returns:
+        A list of pymongo.UpdateOne.
+    """
+    updates = []
+    for index in range(len(batch["match_id"])):
+        key = {
+            "matchId": int(batch["match_id"][index]),
+            "participantId": int(batch["participant_id"][index]),
+            "modelVariant": variant,
+        }
+        document = {
+            "region": str(batch["region"][index]),
+            "expected": dict((label, float(values[index]))
+                             for label, values in predictions.items()),
+        }
+        updates.append(pymongo.UpdateOne(key, {"$set": document},
+                                         upsert=True))
+    return updates
+
+
+def _load_model_set(models_directory, variant):
+    """Load the models of a variant."""
+    model_registry = registry.ModelRegistry(
+        models_directory, numpy_model.NumpyModel,
+        filename=numpy_model.WEIGHTS_FILENAME)
+    return models.ModelSet(model_registry, *registry.parse_variant(variant))
+
+
+def model_versions(model_set):
+    """Get the versions of the models of a model set, by label."""
+    return dict(
+        (label, model_set.registry.latest_version(
+            label, model_set.league, model_set.champion))
+        for label in model_set.labels)
+
+
+def _init_worker(models_directory, variant):
+    """Load the models of the variant in a worker process."""
+    global _model_set, _variant
+    _model_set = _load_model_set(models_directory, variant)
+    _variant = variant
+
+
+def score_shard(task):
+    """Score the participants of a shard. Run in a pool of processes.
+
+    Returns:
+        A tuple (shard index, number of scored participants).
+    """
+    row_count = 0
+
+    # Clients must not be shared between processes.
+    client = pymongo.MongoClient("mongodb://%s/" % task.address)
+    try:
+        collection = client[task.database_name][task.collection]
+        for batch in iter_shard_batches(task, client):
+            statistics = numpy.stack(
+                [batch[label] for label in fetcher.STATISTIC_LABELS], axis=1)
+            predictions = _model_set.predict_columns(statistics)
+            collection.bulk_write(
+                create_updates(batch, predictions, _variant),
+                ordered=False)
+            row_count += len(statistics)
+    finally:
+        client.close()
+
+    return task.index, row_count
+
+
+def load_checkpoint(path):
+    """Load a scoring checkpoint, or None if there is none."""
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json_util.loads(f.read())
+
+
+def save_checkpoint(path, checkpoint):
+    """Atomically write a scoring checkpoint."""
+    directory = os.path.dirname(path)
+    if directory and not os.path.isdir(directory):
+        os.makedirs(directory)
+
+    temporary_path = path + ".tmp"
+    with open(temporary_path, "w") as f:
+        f.write(json_util.dumps(checkpoint))
+    os.rename(temporary_path, path)
+
+
+def create_checkpoint(source, variant, versions, client, mongo_filter):
+    """List the shards of a new scoring job.
+
+    Parameters:
+        source: source of the participants, "cache" or "export".
+        variant: name of the variant of the models.
+        versions: versions of the models, by label, see model_versions.
+        client: client of the cache.
+        mongo_filter: filter of the scored matches of the cache.
+    Returns:
+        A checkpoint without any shard scored.
+    """
+    if source == "export":
+        shards = export.exported_chunk_paths(FLAGS.export_directory)
+    else:
+        shards = export.compute_id_ranges(
+            client[FLAGS.rawdata_cache_database_name].matches, mongo_filter,
+            FLAGS.scoring_shards)
+    return {"source": source, "variant": variant,
+            "model_versions": versions, "shards": shards, "scored": []}
+
+
+def check_checkpoint(checkpoint, source, variant, versions):
+    """Check a job can be resumed from a checkpoint.
+
+    Raises:
+        ValueError: If the checkpoint scores another source, or with other
+            models.
+    """
+    if checkpoint["source"] != source:
+        raise ValueError("The checkpoint scores the %s source." %
+                         checkpoint["source"])
+    if checkpoint.get("variant") != variant:
+        raise ValueError("The checkpoint scores the %r variant." %
+                         checkpoint.get("variant"))
+    if checkpoint.get("model_versions") != versions:
+        raise ValueError("The checkpoint scores the models %r, not %r." %
+                         (checkpoint.get("model_versions"), versions))
+
+
+def create_predictions_index(collection):
+    """Create the unique index of the predictions.
+
+    The index of the predictions stored before they were keyed by variant is
+    dropped, as it forbids storing several variants of a participant.
+    """
+    collection.create_index(
+        [("matchId", pymongo.ASCENDING),
+         ("participantId", pymongo.ASCENDING),
+         ("modelVariant", pymongo.ASCENDING)], unique=True)
+    if _LEGACY_PREDICTIONS_INDEX in collection.index_information():
+        collection.drop_index(_LEGACY_PREDICTIONS_INDEX)
+
+
+def main():
+    league = None
+    if FLAGS.restrict_league is not None:
+        league = constants_pb2.League.Value(FLAGS.restrict_league)
+    mongo_filter = export.create_mongo_filter(
+        league, FLAGS.restrict_champion, FLAGS.restrict_patch)
+
+    versions = model_versions(_load_model_set(FLAGS.models_directory,
+                                              FLAGS.model_variant))
+
+    client = pymongo.MongoClient(
+        "mongodb://%s/" % FLAGS.rawdata_cache_server_address)
+    try:
+        create_predictions_index(client[FLAGS.rawdata_cache_database_name][
+            FLAGS.predictions_collection])
+
+        checkpoint = load_checkpoint(FLAGS.scoring_checkpoint)
+        if checkpoint is None:
+            checkpoint = create_checkpoint(FLAGS.scoring_source,
+                                           FLAGS.model_variant, versions,
+                                           client, mongo_filter)
+            save_checkpoint(FLAGS.scoring_checkpoint, checkpoint)
+        else:
+            check_checkpoint(checkpoint, FLAGS.scoring_source,
+                             FLAGS.model_variant, versions)
+    finally:
+        client.close()
+
+    scored = set(checkpoint["scored"])
+    tasks = [ScoringTask(index, FLAGS.scoring_source, shard,
+                         FLAGS.rawdata_cache_server_address,
+                         FLAGS.rawdata_cache_database_name,
+                         FLAGS.predictions_collection, mongo_filter, league,
+                         FLAGS.restrict_champion, FLAGS.scoring_batch_size)
+             for index, shard in enumerate(checkpoint["shards"])
+             if index not in scored]
+    logging.info("%d shards scored, %d remaining.", len(scored), len(tasks))
+
+    pool = multiprocessing.Pool(
+        FLAGS.scoring_workers, _init_worker,
+        (FLAGS.models_directory, FLAGS.model_variant))
+    try:
+        total_rows = 0
+        for index, row_count in pool.imap_unordered(score_shard, tasks):
+            total_rows += row_count
+            checkpoint["scored"].append(index)
+            save_checkpoint(FLAGS.scoring_checkpoint, checkpoint)
+            logging.info("Shard %d: %d participants scored.", index,
+                         row_count)
+    finally:
+        pool.close()
+        pool.join()
+
+    print("%d participants scored into %s.%s." % (
+        total_rows, FLAGS.rawdata_cache_database_name,
+        FLAGS.predictions_collection))
+
+
+if __name__ == '__main__':
+    FLAGS(sys.argv)
+    logging.getLogger().setLevel(logging.INFO)
+    main()
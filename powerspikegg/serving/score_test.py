@@ -0,0 +1,117 @@
+import mock
+import numpy
+import os
+import shutil
+import tempfile
+import unittest
+
+from bson.objectid import ObjectId
+
+from powerspikegg.computation_models.fetcher import export
+from powerspikegg.serving import score
+from third_party.python.riotwatcher.rwmock import SAMPLES
+
+
+class TestScoring(unittest.TestCase):
+    """Tests the participants are batched and their predictions stored."""
+
+    def setUp(self):
+        """Export the match sample."""
+        self.directory = tempfile.mkdtemp()
+        self.rows = list(export.participant_rows(SAMPLES["match"]))
+
+        writer = export.ChunkWriter(os.path.join(self.directory, "part"), 100)
+        for row in self.rows:
+            writer.append(row)
+        writer.flush()
+        self.chunk_path = writer.paths[0]
+
+    def tearDown(self):
+        """Remove the export."""
+        shutil.rmtree(self.directory)
+
+    def test_export_batches(self):
+        """Tests an exported chunk is split in batches."""
+        task = score.ScoringTask(0, "export", self.chunk_path, None, None,
+                                 None, {}, None, 0, 3)
+        batches = list(score.iter_shard_batches(task, None))
+
+        self.assertEqual(len(batches), (len(self.rows) + 2) // 3)
+        match_ids = numpy.concatenate([batch["match_id"] for batch in batches])
+        self.assertEqual(list(match_ids),
+                         [row["match_id"] for row in self.rows])
+
+    def test_rows_to_columns(self):
+        """Tests rows from the cache are converted to exported columns."""
+        columns = score.rows_to_columns(self.rows)
+        self.assertEqual(list(columns["kills"]),
+                         [row["kills"] for row in self.rows])
+        self.assertEqual(columns["kills"].dtype, numpy.float32)
+
+    def test_updates(self):
+        """Tests predictions are upserted by match, participant and
+        variant."""
+        batch = score.rows_to_columns(self.rows[:2])
+        predictions = {"kills": numpy.array([1.5, 2.5], numpy.float32)}
+
+        updates = score.create_updates(batch, predictions, "league_GOLD")
+
+        self.assertEqual(len(updates), 2)
+        document = updates[1]._doc["$set"]
+        self.assertEqual(updates[1]._filter, {
+            "matchId": self.rows[1]["match_id"],
+            "participantId": self.rows[1]["participant_id"],
+            "modelVariant": "league_GOLD",
+        })
+        self.assertEqual(document["expected"], {"kills": 2.5})
+
+    def test_checkpoint_round_trip(self):
+        """Tests the shards and their progress are saved and loaded."""
+        path = os.path.join(self.directory, "checkpoint", "scoring.json")
+        self.assertIsNone(score.load_checkpoint(path))
+
+        checkpoint = {"source": "cache", "scored": [1],
+                      "shards": [(None, ObjectId()), (ObjectId(), None)]}
+        score.save_checkpoint(path, checkpoint)
+
+        loaded = score.load_checkpoint(path)
+        self.assertEqual(loaded["scored"], [1])
+        self.assertEqual([tuple(shard) for shard in loaded["shards"]],
+                         checkpoint["shards"])
+
+    def test_checkpoint_models(self):
+        """Tests a job is only resumed with the models of its checkpoint."""
+        checkpoint = {"source": "export", "variant": "league_GOLD",
+                      "model_versions": {"kills": 2}, "shards": [],
+                      "scored": []}
+        score.check_checkpoint(checkpoint, "export", "league_GOLD",
+                               {"kills": 2})
+
+        with self.assertRaises(ValueError):
+            score.check_checkpoint(checkpoint, "cache", "league_GOLD",
+                                   {"kills": 2})
+        with self.assertRaises(ValueError):
+            score.check_checkpoint(checkpoint, "export", "champion_42",
+                                   {"kills": 2})
+        with self.assertRaises(ValueError):
+            score.check_checkpoint(checkpoint, "export", "league_GOLD",
+                                   {"kills": 3})
+
+    def test_predictions_index(self):
+        """Tests the predictions are unique by variant, and the index
+        forbidding several variants is dropped."""
+        collection = mock.Mock()
+        collection.index_information.return_value = {
+            "_id_": {}, "matchId_1_participantId_1": {}}
+
+        score.create_predictions_index(collection)
+
+        keys = collection.create_index.call_args[0][0]
+        self.assertEqual([key for key, _ in keys],
+                         ["matchId", "participantId", "modelVariant"])
+        collection.drop_index.assert_called_once_with(
+            "matchId_1_participantId_1")
+
+
+if __name__ == "__main__":
+    unittest.main()